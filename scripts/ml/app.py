@@ -9,6 +9,17 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 
+from artifacts import PERSONAS, resolve_path
+from dataset_store import REQUIRED_COLS, DatasetStore, load_dashboard_data
+from filter_index import today_epoch_day
+from ids import readable
+from instrumentation import load_last_run
+from paging import (PAGE_SIZES, export_csv, page_count, page_positions, quick_filter, remove_export,
+                    sweep_exports)
+from result_cache import ResultCache, compact_ranks, normalize_filters
+from summary_cube import cube_path, load_cube
+from targeting import cap_codes, expected_revenue, plan_summary, select_targets
+
 # AgGrid é opcional. Se não estiver instalado, o app cai no fallback st.dataframe.
 try:
     from st_aggrid import AgGrid, GridOptionsBuilder
@@ -119,32 +130,56 @@ st.markdown("---")
 # -----------------------------
 # Leitura e preparação de dados
 # -----------------------------
-REQUIRED_COLS = {
-    "customer_id",
-    "segment",
-    "ticket_medio",
-    "prob_repurchase_7d",
-    "prob_repurchase_30d",
-    "score_priority"
-}
+# O DataFrame (memory-mapped) e o índice de filtros (dataset_store.load_dashboard_data)
+# são montados uma vez por versão do artefato e compartilhados entre sessões;
+# são tratados como somente leitura.
+
+# Cache de filtros/KPIs compartilhado entre todas as sessões do servidor
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    return ResultCache()
+
+
+# Recarga orientada a mudança: a cada rerun só um os.stat; quando a versão do
+# artefato muda, o dataset é trocado e os resultados da versão antiga descartados.
+@st.cache_resource(show_spinner=False)
+def get_dataset_store() -> DatasetStore:
+    return DatasetStore(load_dashboard_data, on_swap=lambda old: get_result_cache().drop_version(old["version"]))
+
+# Cubo de resumo (summary_cube.arrow) por versão do artefato. Só cubos
+# encontrados ficam guardados: o pipeline grava o cubo logo depois do artefato.
+@st.cache_resource(show_spinner=False)
+def get_cubes() -> dict:
+    return {}
+
+
+def get_cube(path: str, version: str):
+    cubes = get_cubes()
+    cube = cubes.get(version)
+    if cube is None:
+        cube = load_cube(cube_path(path), version)
+        if cube is not None:
+            cubes.clear()
+            cubes[version] = cube
+    return cube
 
-@st.cache_data(show_spinner=False, ttl=300)
-def load_data(path: str) -> pd.DataFrame:
-    if not os.path.exists(path):
-        return pd.DataFrame()
-    df_local = pd.read_csv(path)
-    if "last_purchase" in df_local.columns:
-        df_local["last_purchase"] = pd.to_datetime(df_local["last_purchase"], errors="coerce")
-    for col in ["ticket_medio", "prob_repurchase_7d", "prob_repurchase_30d", "score_priority"]:
-        if col in df_local.columns:
-            df_local[col] = pd.to_numeric(df_local[col], errors="coerce")
-    return df_local
-
-DATA_PATH = "predictions.csv"
-df = load_data(DATA_PATH)
+# Personas (ajustado conforme análise)
+mapa_segmentos = PERSONAS
+
+# Artefato colunar (predictions.arrow) com fallback para predictions.csv
+DATA_PATH = resolve_path()
+if not os.path.exists(DATA_PATH):
+    st.error(f"Arquivo '{DATA_PATH}' não encontrado ou sem registros.")
+    st.stop()
+
+dataset = get_dataset_store().get(DATA_PATH)
+df, fidx, data_version = dataset["df"], dataset["index"], dataset["version"]
+result_cache = get_result_cache()
+# KPIs e chips saem do cubo quando ele cobre o filtro; sem cubo, do FilterIndex
+cube = get_cube(DATA_PATH, data_version)
 
 if df.empty:
-    st.error("Arquivo 'predictions.csv' não encontrado ou sem registros.")
+    st.error(f"Arquivo '{DATA_PATH}' não encontrado ou sem registros.")
     st.stop()
 
 missing = REQUIRED_COLS - set(df.columns)
@@ -152,33 +187,21 @@ if missing:
     st.error(f"Colunas ausentes no dataset: {sorted(list(missing))}.")
     st.stop()
 
-# Sanitização
-for col in ["prob_repurchase_7d", "prob_repurchase_30d", "score_priority"]:
-    df[col] = df[col].fillna(0.0).clip(0, 1)
-df["ticket_medio"] = df["ticket_medio"].fillna(0.0).clip(lower=0)
-df["customer_id"] = df["customer_id"].astype(str)
-
-# Personas (ajustado conforme análise)
-mapa_segmentos = {
-    0: "Clientes Regulares de Baixo Ticket",
-    1: "Clientes de Alto Ticket e Baixa Frequência",
-    2: "Clientes Frequentes e Fiéis",
-    3: "Clientes Inativos ou Perdidos"
-}
-if "persona" not in df.columns:
-    df["persona"] = df["segment"].map(mapa_segmentos).fillna("n/a")
-
 # -----------------------------
 # Sidebar meta
 # -----------------------------
 with st.sidebar:
     st.info("RoadWise • Enterprise Challenge FIAP | ClickBus")
     st.caption(f"Registros: **{df.shape[0]:,}**".replace(",", "."))
+    # Versão efetivamente carregada (não a do arquivo em disco no momento)
     try:
-        mtime = os.path.getmtime(DATA_PATH)
-        st.caption("Atualizado em: **" + time.strftime("%d/%m/%Y %H:%M", time.localtime(mtime)) + "**")
+        created = time.strptime(dataset["info"]["created_at"], "%Y-%m-%dT%H:%M:%S")
+        st.caption("Atualizado em: **" + time.strftime("%d/%m/%Y %H:%M", created) + "**")
     except Exception:
         pass
+    st.caption(f"Versão: `{data_version[:12]}`")
+    if cube is not None:
+        st.caption(f"Resumo pré-agregado: **{len(cube)} células** (ref. {cube.meta['as_of']})")
     if not AGGRID_OK:
         st.warning("Para a tabela PRO, instale: `pip install streamlit-aggrid`")
 
@@ -187,10 +210,14 @@ with st.sidebar:
 # -----------------------------
 st.subheader("📊 Visão Geral")
 col1, col2, col3, col4 = st.columns(4)
+kpis = result_cache.get_or_compute(
+    (data_version, "kpis"),
+    lambda: cube.summary() if cube is not None else fidx.summary(np.arange(fidx.n))
+)
 total_cli = int(df.shape[0])
-ticket_med = float(df["ticket_medio"].mean())
-pct_quentes = float((df["score_priority"] >= 0.7).mean() * 100)
-receita_pot = float((df["ticket_medio"] * df["prob_repurchase_30d"]).sum())
+ticket_med = kpis["ticket_medio"]
+pct_quentes = kpis["pct_quentes"]
+receita_pot = kpis["receita_pot"]
 
 col1.metric("Clientes Totais", f"{total_cli}", help="Tamanho da base em análise.")
 col2.metric("Ticket Médio", f"R$ {ticket_med:.2f}", help="Média do valor de compras por cliente.")
@@ -238,21 +265,25 @@ score_default = float(get_param(params_in, "score_min", "0.70"))
 ticket_min_default = float(get_param(params_in, "ticket_min", "0.0"))
 search_default = get_param(params_in, "search", "")
 topn_default = int(get_param(params_in, "topn", "300"))
+modo_default = get_param(params_in, "modo", "ranking")
+budget_default = int(get_param(params_in, "budget", "5000"))
+min_value_default = float(get_param(params_in, "min_value", "0.0"))
 days_last_purchase_default = int(get_param(params_in, "days_last_purchase_max", "9999"))
 
 f1, f2, f3, f4, f5 = st.columns([2, 2, 2, 2, 2])
 
-personas_disp = sorted(df["persona"].dropna().unique().tolist())
+personas_disp = sorted(fidx.personas)
 sel_personas = f1.multiselect("Persona", personas_disp, default=persona_default)
 
 score_min = f2.slider("Score mínimo", 0.0, 1.0, value=score_default, step=0.05)
 ticket_min = f3.number_input("Ticket mínimo (R$)", min_value=0.0, value=ticket_min_default, step=10.0, format="%.2f")
-search_id = f4.text_input("Buscar por Customer ID", value=search_default, help="Busca parcial. Ex.: 123 ou john")
-top_n = f5.number_input("Top N para exibir", min_value=10, max_value=10000, value=topn_default, step=10)
+search_id = f4.text_input("Buscar por Customer ID", value=search_default, help="Busca pelo início do ID. Ex.: 0000a")
+top_n = f5.number_input("Top N para exibir", min_value=10, max_value=10000, value=topn_default, step=10,
+                        help="No modo campanha a tabela mostra a seleção inteira (até o orçamento).")
 
 # Filtro opcional por recência
 if "last_purchase" in df.columns:
-    max_days = int((pd.Timestamp.today() - df["last_purchase"].min()).days) if df["last_purchase"].notna().any() else 3650
+    max_days = fidx.max_days()
     days_last_purchase_max = st.slider(
         "Máx. dias desde a última compra (opcional)",
         min_value=0, max_value=max(30, max_days), value=min(days_last_purchase_default, max_days), step=10,
@@ -281,35 +312,92 @@ if pcol4.button("💤 Inativos"):
     top_n = 300
 
 # -----------------------------
-# Aplicação de filtros
+# Modo campanha (targeting.py)
 # -----------------------------
-fdf = df.copy()
-if sel_personas:
-    fdf = fdf[fdf["persona"].isin(sel_personas)]
+# Em vez do Top N por score, escolhe dentro do conjunto filtrado os clientes
+# que somam a maior receita esperada (ticket × prob. 30d), com orçamento de
+# contatos e limite por persona. A seleção substitui o ranking abaixo
+# (chips, tabela e CSV), na ordem de receita esperada.
+MODO_RANKING, MODO_CAMPANHA = "🏅 Ranking por score", "🎯 Campanha com orçamento"
+modo = st.radio("Modo", [MODO_RANKING, MODO_CAMPANHA], horizontal=True,
+                index=1 if modo_default == "campanha" else 0)
+campanha = None
+if modo == MODO_CAMPANHA:
+    c1, c2 = st.columns(2)
+    budget = c1.number_input("Orçamento (contatos)", min_value=1, max_value=max(1, fidx.n),
+                             value=max(1, min(budget_default, fidx.n)), step=100)
+    min_value = c2.number_input("Receita esperada mínima por contato (R$)", min_value=0.0,
+                                value=min_value_default, step=1.0, format="%.2f",
+                                help="Ex.: custo do contato. Abaixo disso o contato não se paga.")
+    st.caption("Limite por persona (% do orçamento)")
+    caps = {}
+    for ccol, p in zip(st.columns(len(personas_disp)), personas_disp):
+        pct = ccol.number_input(p, min_value=0, max_value=100, value=100, step=5, key=f"cap_{p}")
+        if pct < 100:
+            caps[p] = int(budget * pct / 100)
+    campanha = dict(budget=int(budget), caps=caps, min_value=float(min_value))
 
-fdf = fdf[
-    (fdf["score_priority"].fillna(0) >= float(score_min)) &
-    (fdf["ticket_medio"].fillna(0) >= float(ticket_min))
-]
-
-if search_id:
-    s = search_id.strip().lower()
-    fdf = fdf[fdf["customer_id"].str.lower().str.contains(s)]
+# -----------------------------
+# Aplicação de filtros
+# -----------------------------
+# Índice pré-calculado: corte binário por score, bitmaps de persona, recência
+# inteira e busca por prefixo. As posições já saem ordenadas por score.
+# Os chips vêm do cubo quando o filtro cai nas faixas dele; aí só o Top N do
+# ranking é buscado nas linhas. Fora da grade do cubo (ex.: busca por ID), o
+# conjunto filtrado inteiro é varrido. Tudo fica no cache compartilhado por filtro.
+filtros = dict(
+    personas=sel_personas,
+    score_min=float(score_min),
+    ticket_min=float(ticket_min),
+    search=search_id,
+    days_max=days_last_purchase_max if "last_purchase" in df.columns else None,
+    today_day=today_epoch_day(),
+)
 
-if "last_purchase" in fdf.columns and pd.api.types.is_datetime64_any_dtype(fdf["last_purchase"]):
-    days_since = (pd.Timestamp.today().normalize() - fdf["last_purchase"].dt.normalize()).dt.days
-    days_since = days_since.fillna(10**9)
-    fdf = fdf[days_since <= days_last_purchase_max]
+def _filtrar():
+    resumo = cube.summary(**filtros) if cube is not None else None
+    if resumo is not None:
+        return {"ranks": None, "summary": resumo}
+    r = compact_ranks(fidx.query_ranks(**filtros))
+    return {"ranks": r, "summary": fidx.summary(r)}
+
+filtro_key = (data_version, normalize_filters(**filtros))
+resultado = result_cache.get_or_compute(filtro_key, _filtrar)
+
+def _campanha():
+    base = resultado["ranks"] if resultado["ranks"] is not None else fidx.query_ranks(**filtros)
+    values = expected_revenue(fidx.ticket_rank, fidx.prob30_rank)
+    groups = fidx.persona_codes_rank
+    caps = cap_codes(campanha["caps"], fidx.personas)
+    sel = select_targets(values, groups, campanha["budget"], caps, campanha["min_value"], candidates=base)
+    # base já está em ordem de score: o Top B dele é o que o ranking contataria
+    plano = plan_summary(values, groups, fidx.personas, sel, caps, baseline=base[:campanha["budget"]])
+    return {"ranks": compact_ranks(sel), "summary": fidx.summary(sel), "plano": plano}
+
+if campanha is not None:
+    filtro_key = filtro_key + ("campanha", campanha["budget"], tuple(sorted(campanha["caps"].items())),
+                               round(campanha["min_value"], 2))
+    resultado = result_cache.get_or_compute(filtro_key, _campanha)
+
+def top_ranks(limit: int) -> np.ndarray:
+    if resultado["ranks"] is not None:
+        return resultado["ranks"][:limit]
+    return result_cache.get_or_compute(
+        filtro_key + ("top", limit), lambda: compact_ranks(fidx.query_ranks(**filtros, limit=limit))
+    )
 
-fdf = fdf.sort_values("score_priority", ascending=False)
+def all_positions() -> np.ndarray:
+    ranks = resultado["ranks"]
+    return fidx.positions(fidx.query_ranks(**filtros) if ranks is None else ranks)
 
 # -----------------------------
 # Resumo dos filtros
 # -----------------------------
-filtrados = int(fdf.shape[0])
-pct_quentes_f = float((fdf["score_priority"] >= 0.7).mean() * 100) if filtrados else 0.0
-ticket_med_f = float(fdf["ticket_medio"].mean()) if filtrados else 0.0
-receita_pot_f = float((fdf["ticket_medio"] * fdf["prob_repurchase_30d"]).sum()) if filtrados else 0.0
+resumo = resultado["summary"]
+filtrados = resumo["count"]
+pct_quentes_f = resumo["pct_quentes"]
+ticket_med_f = resumo["ticket_medio"]
+receita_pot_f = resumo["receita_pot"]
 
 st.markdown(
     f"""
@@ -323,8 +411,25 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+if campanha is not None:
+    plano = resultado["plano"]
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Contatos selecionados", f"{plano['contacts']}", help=f"Orçamento: {campanha['budget']} contatos.")
+    k2.metric("Receita esperada (30d)", f"R$ {plano['expected_revenue']:,.0f}".replace(",", "."),
+              help="Soma de ticket × prob. 30d dos selecionados.")
+    ganho = "n/a" if plano.get("lift_pct") is None else f"{plano['lift_pct']:+.1f}%"
+    k3.metric("Ganho vs Top por score", ganho,
+              help=f"Top {campanha['budget']} do conjunto filtrado por score: "
+                   f"R$ {plano.get('baseline_revenue', 0):,.0f}".replace(",", "."))
+    st.dataframe(
+        pd.DataFrame(plano["personas"]).rename(columns={
+            "persona": "Persona", "contacts": "Contatos", "expected_revenue": "Receita esperada (R$)",
+            "cap": "Limite"}),
+        use_container_width=True, hide_index=True,
+    )
+
 conv = st.slider("Se o time converter (%) deste conjunto filtrado", 0, 50, 8, step=1)
-impacto = (fdf["ticket_medio"] * (conv / 100.0)).sum() if filtrados else 0.0
+impacto = resumo["ticket_sum"] * (conv / 100.0)
 st.caption(f"Impacto estimado se {conv}% converterem: **R$ {impacto:,.0f}**".replace(",", "."))
 
 st.markdown("")
@@ -333,31 +438,119 @@ st.markdown("")
 # Tabela PRO (AgGrid) ou fallback
 # -----------------------------
 cols_show = ["customer_id", "persona", "ticket_medio", "prob_repurchase_7d", "prob_repurchase_30d", "score_priority"]
-cols_show = [c for c in cols_show if c in fdf.columns]
-view = fdf[cols_show].head(int(top_n)).copy()
-
-st.download_button(
-    label="⬇️ Baixar CSV do conjunto filtrado",
-    data=fdf[cols_show].to_csv(index=False).encode("utf-8"),
-    file_name="roadwise_ranking_filtrado.csv",
-    mime="text/csv",
-    use_container_width=True
-)
+cols_show = [c for c in cols_show if c in df.columns]
+headers = {
+    "customer_id": "Cliente",
+    "persona": "Persona",
+    "ticket_medio": "Ticket Médio",
+    "prob_repurchase_7d": "Prob. Recompra 7d",
+    "prob_repurchase_30d": "Prob. Recompra 30d",
+    "score_priority": "Score Prioridade",
+}
+
+# CSV do conjunto filtrado: gerado só quando pedido, em blocos, num arquivo temporário.
+# Com server.enableStaticServing o arquivo fica em static/exports e o navegador o
+# baixa direto do disco (o Tornado envia em blocos, nada passa pela memória do
+# script). Sem isso, ou acima do limite do static serving, o st.download_button
+# carrega o arquivo inteiro a cada rerun: ele só aparece depois do pedido e some
+# após o primeiro download.
+STATIC_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+STATIC_MAX_BYTES = 200 * 2**20   # limite de arquivo do static serving do Streamlit
+CSV_NAME = "roadwise_ranking_filtrado.csv"
+
+def _drop_export():
+    export = st.session_state.pop("csv_export", None)
+    if export is not None:
+        remove_export(export["path"])
+
+export_key = filtro_key
+export = st.session_state.get("csv_export")
+if export and (export["key"] != export_key or not os.path.exists(export["path"])):
+    _drop_export()
+    export = None
+
+if export is None:
+    if st.button("⬇️ Preparar CSV do conjunto filtrado", use_container_width=True):
+        static = bool(st.get_option("server.enableStaticServing"))
+        directory = STATIC_EXPORT_DIR if static else None
+        if static:
+            os.makedirs(directory, exist_ok=True)
+        sweep_exports(directory)
+        with st.spinner("Gerando CSV..."):
+            path = export_csv(df, cols_show, all_positions(), directory=directory)
+        static = static and os.path.getsize(path) <= STATIC_MAX_BYTES
+        export = {"key": export_key, "path": path, "static": static}
+        st.session_state["csv_export"] = export
+if export is not None:
+    if export["static"]:
+        name = os.path.basename(export["path"])
+        st.markdown(
+            f'<a href="app/static/exports/{name}" download="{CSV_NAME}">⬇️ Baixar CSV do conjunto filtrado</a>',
+            unsafe_allow_html=True,
+        )
+    else:
+        with open(export["path"], "rb") as fh:
+            st.download_button(
+                label="⬇️ Baixar CSV do conjunto filtrado",
+                data=fh,
+                file_name=CSV_NAME,
+                mime="text/csv",
+                on_click=_drop_export,
+                use_container_width=True
+            )
+
+# Paginação no servidor: ordenação e busca rodam sobre o Top N ranqueado
+# (no modo campanha, sobre a seleção inteira), e só a página corrente é
+# enviada para a tabela.
+limite = campanha["budget"] if campanha is not None else int(top_n)
+ranked = fidx.positions(top_ranks(limite))
+q = st.text_input("🔎 Busca rápida (na tabela)", "")
+ranked = quick_filter(df, ranked, q, ["customer_id", "persona"])
+
+# No modo campanha a seleção já vem em ordem de receita esperada
+headers["receita_esperada"] = "Receita Esperada"
+sort_options = (["receita_esperada"] if campanha is not None else []) + cols_show
+p1, p2, p3, p4 = st.columns([3, 2, 2, 2])
+sort_col = p1.selectbox("Ordenar por", sort_options,
+                        index=0 if campanha is not None else sort_options.index("score_priority"),
+                        format_func=lambda c: headers.get(c, c))
+sort_asc = p2.selectbox("Ordem", ["Decrescente", "Crescente"]) == "Crescente"
+page_size = p3.selectbox("Linhas por página", PAGE_SIZES)
+n_pages = page_count(len(ranked), page_size)
+page = p4.number_input(f"Página (de {n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+
+# Ordem natural das posições (score ou receita esperada, decrescente): a página é só um slice
+natural = "receita_esperada" if campanha is not None else "score_priority"
+sort_by = None if sort_col == natural else sort_col
+if sort_by is None and sort_asc:
+    ranked = ranked[::-1]
+page_pos = page_positions(df, ranked, int(page) - 1, page_size, sort_by=sort_by, ascending=sort_asc)
+view = readable(df.iloc[page_pos][cols_show])   # customer_id em hex só nas linhas da página
+if campanha is not None:
+    view.insert(view.columns.get_loc("prob_repurchase_30d") + 1, "receita_esperada",
+                expected_revenue(view["ticket_medio"], view["prob_repurchase_30d"]))
+if campanha is not None:
+    st.caption(f"Exibindo {len(view)} de {len(ranked)} clientes selecionados para a campanha "
+               f"(orçamento de {campanha['budget']} contatos).")
+else:
+    st.caption(f"Exibindo {len(view)} de {len(ranked)} clientes do Top {int(top_n)}.")
 
 if AGGRID_OK:
     gb = GridOptionsBuilder.from_dataframe(view)
-    gb.configure_default_column(filter=True, floatingFilter=True, sortable=True, resizable=True)
+    # Ordenação/filtro ficam no servidor; o grid só exibe a página
+    gb.configure_default_column(filter=False, sortable=False, resizable=True)
     gb.configure_column("customer_id", header_name="Cliente", width=140)
     if "persona" in view.columns:
         gb.configure_column("persona", header_name="Persona", width=220)
-    if "ticket_medio" in view.columns:
-        gb.configure_column(
-            "ticket_medio",
-            header_name="Ticket Médio",
-            type=["rightAligned", "numericColumn"],
-            valueFormatter="value == null ? '' : 'R$ ' + Number(value).toFixed(2)",
-            width=140
-        )
+    for colm, headerm in [("ticket_medio", "Ticket Médio"), ("receita_esperada", "Receita Esperada")]:
+        if colm in view.columns:
+            gb.configure_column(
+                colm,
+                header_name=headerm,
+                type=["rightAligned", "numericColumn"],
+                valueFormatter="value == null ? '' : 'R$ ' + Number(value).toFixed(2)",
+                width=140
+            )
     for colp, headerp in [
         ("prob_repurchase_7d", "Prob. Recompra 7d"),
         ("prob_repurchase_30d", "Prob. Recompra 30d"),
@@ -372,13 +565,8 @@ if AGGRID_OK:
                 width=160
             )
     gb.configure_selection(selection_mode="multiple", use_checkbox=True)
-    gb.configure_pagination(paginationAutoPageSize=False, paginationPageSize=25)
     grid_options = gb.build()
 
-    q = st.text_input("🔎 Busca rápida (na tabela)", "")
-    if q:
-        grid_options["quickFilterText"] = q
-
     grid = AgGrid(
         view,
         gridOptions=grid_options,
@@ -389,7 +577,7 @@ if AGGRID_OK:
     )
 
     selected = grid.get("selected_rows", [])
-    if selected:
+    if selected is not None and len(selected):
         st.success(f"{len(selected)} clientes selecionados para ação")
         st.download_button(
             "⬇️ Baixar seleção",
@@ -409,6 +597,27 @@ st.write(
     "Pronto para o time agir sem achismo."
 )
 
+# -----------------------------
+# Última execução do pipeline (run_metrics.json, gravado por predictions.py)
+# -----------------------------
+ultima = load_last_run()
+if ultima and ultima.get("stages"):
+    status = "✅" if ultima.get("status") == "ok" else "⚠️"
+    with st.expander(f"⏱️ Última execução do pipeline: {ultima.get('started_at', '')} {status} "
+                     f"({ultima.get('total_seconds') or 0:.1f}s)"):
+        etapas = pd.DataFrame(ultima["stages"])
+        st.bar_chart(etapas.set_index("name")["wall_seconds"], horizontal=True)
+        colunas_etapas = {
+            "name": "Etapa", "wall_seconds": "Tempo (s)", "cpu_seconds": "CPU (s)",
+            "rss_peak_mb": "Pico RSS (MB)", "tracemalloc_peak_mb": "Pico Python (MB)",
+            "rows_in": "Linhas (entrada)", "rows_out": "Linhas (saída)",
+            "rows_per_sec": "Linhas/s", "status": "Status",
+        }
+        etapas = etapas[[c for c in colunas_etapas if c in etapas.columns]].rename(columns=colunas_etapas)
+        st.dataframe(etapas, use_container_width=True, hide_index=True)
+        if ultima.get("error"):
+            st.error(ultima["error"])
+
 # -----------------------------
 # Persistência dos filtros em URL
 # -----------------------------
@@ -419,5 +628,7 @@ st.query_params.update({
     "ticket_min": str(ticket_min),
     "search": search_id,
     "topn": str(top_n),
+    "modo": "campanha" if campanha is not None else "ranking",
+    **({"budget": str(campanha["budget"]), "min_value": str(campanha["min_value"])} if campanha is not None else {}),
     "days_last_purchase_max": str(days_last_purchase_max),
 })
@@ -0,0 +1,341 @@
+# ============================================
+# RoadWise - ClickBus | Artefato do Dashboard
+# Exportação colunar tipada (Arrow IPC) + leitura memory-mapped
+# ============================================
+#
+# predictions.arrow é o formato principal: arquivo Arrow IPC sem
+# compressão, lido via memory map (os buffers vêm direto do page cache,
+# sem parse). Parquet também é aceito; predictions.csv continua como
+# fallback para ambientes sem o artefato colunar.
+#
+# customer_id vai como binário fixo de 32 bytes (ids.py) e top_destination
+# como dicionário (códigos int32 + destinos em hex); o CSV continua em hex.
+#
+# Cada exportação grava também <artefato>.version.json com o hash do conteúdo;
+# o dashboard usa (mtime, tamanho) como checagem barata e só relê o artefato
+# quando a versão de fato muda.
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from ids import BINARY, compact, hex_categorical, is_compact, readable, to_binary, types_mapper
+
+ARROW_PATH = "predictions.arrow"
+CSV_PATH = "predictions.csv"
+
+# Personas (ajustado conforme análise)
+PERSONAS = {
+    0: "Clientes Regulares de Baixo Ticket",
+    1: "Clientes de Alto Ticket e Baixa Frequência",
+    2: "Clientes Frequentes e Fiéis",
+    3: "Clientes Inativos ou Perdidos"
+}
+
+# Schema explícito do artefato. Colunas fora daqui são gravadas com o tipo inferido.
+_DICT8 = pa.dictionary(pa.int8(), pa.string())
+_DICT32 = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMA_FIELDS = {
+    "customer_id": BINARY,
+    "last_purchase": pa.timestamp("s"),
+    "days_since_last_purchase": pa.int32(),
+    "purchases_last_30d": pa.int32(),
+    "purchases_last_90d": pa.int32(),
+    "purchases_last_180d": pa.int32(),
+    "total_purchases_lifetime": pa.int32(),
+    "top_destination": _DICT32,
+    "last_purchase_month": pa.int8(),
+    "last_purchase_week": pa.int8(),
+    "last_purchase_dayofweek": pa.int8(),
+    "last_purchase_period": _DICT8,
+    "ticket_medio": pa.float64(),
+    "segment": pa.int8(),
+    "persona": _DICT8,
+    "label_7d": pa.int8(),
+    "label_30d": pa.int8(),
+    "prob_repurchase_7d": pa.float32(),
+    "prob_repurchase_30d": pa.float32(),
+    "score_priority": pa.float32(),
+}
+
+_PANDAS_INT = {pa.int8(): "Int8", pa.int16(): "Int16", pa.int32(): "Int32", pa.int64(): "Int64"}
+
+
+def _to_arrow(series: pd.Series, typ) -> pa.Array:
+    if typ == BINARY:
+        return pa.array(to_binary(series))
+    if pa.types.is_dictionary(typ):
+        if is_compact(series):
+            values = hex_categorical(series)
+        else:
+            values = series.astype("string").astype("category")
+        return pa.array(values, from_pandas=True).cast(typ)
+    if pa.types.is_timestamp(typ):
+        values = pd.to_datetime(series, errors="coerce").dt.floor("s")
+        return pa.array(values, type=typ, from_pandas=True)
+    if typ in _PANDAS_INT:
+        values = pd.to_numeric(series, errors="coerce").round().astype(_PANDAS_INT[typ])
+        return pa.array(values, type=typ, from_pandas=True)
+    if pa.types.is_floating(typ):
+        values = pd.to_numeric(series, errors="coerce")
+        return pa.array(values.to_numpy(dtype=typ.to_pandas_dtype()), type=typ, from_pandas=True)
+    return pa.array(series.astype(object).where(series.notna(), None), type=typ, from_pandas=True)
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    """Converte o resultado do pipeline para uma tabela Arrow com o schema do artefato."""
+    if "persona" not in df.columns and "segment" in df.columns:
+        df = df.assign(persona=df["segment"].map(PERSONAS).fillna("n/a"))
+    arrays, fields = [], []
+    for col in df.columns:
+        typ = SCHEMA_FIELDS.get(col)
+        if typ is None:
+            arr = pa.array(df[col], from_pandas=True)
+        else:
+            arr = _to_arrow(df[col], typ)
+        arrays.append(arr)
+        fields.append(pa.field(col, arr.type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def _replace_atomic(tmp_path, path, info: dict = None):
+    # Troca atômica: o dashboard nunca enxerga um arquivo pela metade. A versão
+    # é calculada sobre o tmp e gravada antes da troca; o rename preserva
+    # mtime e tamanho, então o .version.json só passa a valer quando o arquivo
+    # novo está no lugar (antes disso a assinatura não bate e artifact_version
+    # calcula o hash do arquivo antigo).
+    _save_version(info or _version_info(tmp_path), version_path(path))
+    os.replace(tmp_path, path)
+
+
+# -----------------------------
+# Versionamento do artefato
+# -----------------------------
+def version_path(path: str) -> str:
+    return path + ".version.json"
+
+
+def content_hash(path: str, block=1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _version_info(path: str) -> dict:
+    """Hash e assinatura (mtime, tamanho) de `path`, no formato do .version.json."""
+    stat = os.stat(path)
+    return {
+        "version": content_hash(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _save_version(info: dict, target: str) -> dict:
+    tmp = target + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(info, fh)
+    os.replace(tmp, target)
+    return info
+
+
+def artifact_version(path: str, known: dict = None) -> dict:
+    """Versão do artefato em disco.
+
+    Checagem barata primeiro: se (mtime, tamanho) não mudou desde `known`,
+    devolve `known` sem abrir o arquivo. Caso contrário usa o hash gravado
+    pelo pipeline no .version.json, se ele descreve exatamente este arquivo
+    (mesmo mtime e tamanho); senão calcula o hash do conteúdo (arquivo de
+    outra fonte, ou troca em andamento).
+    """
+    stat = os.stat(path)
+    signature = [stat.st_mtime_ns, stat.st_size]
+    if known is not None and known.get("stat") == signature:
+        return known
+
+    info = None
+    try:
+        with open(version_path(path), encoding="utf-8") as fh:
+            info = json.load(fh)
+        if info.get("size") != stat.st_size or info.get("mtime_ns") != stat.st_mtime_ns:
+            info = None
+    except (OSError, ValueError):
+        info = None
+    if info is None:
+        info = {
+            "version": content_hash(path),
+            "size": stat.st_size,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(stat.st_mtime)),
+        }
+    return {**info, "path": path, "stat": signature}
+
+
+class ArtifactStream:
+    """Exportação em blocos: cada bloco pontuado é gravado assim que fica pronto.
+
+    No Arrow IPC os dicionários (persona, top_destination, ...) crescem de
+    forma incremental entre blocos e são emitidos como deltas, então o
+    arquivo final é o mesmo que uma exportação única geraria. O arquivo só
+    substitui o artefato anterior no close(), que é finish() (fecha o tmp e
+    calcula a versão: a parte que pode falhar) + publish() (só a troca);
+    score_stream separa os dois para confirmar o Gold entre eles.
+    """
+
+    def __init__(self, path: str = ARROW_PATH):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.rows = 0
+        self._writer = None
+        self._sink = None
+        self._schema = None
+        self._dicts = {}
+        self._closed = False
+        self._version = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _unify(self, table: pa.Table) -> pa.RecordBatch:
+        arrays = []
+        for field, col in zip(self._schema, table.columns):
+            arr = col.combine_chunks()
+            if pa.types.is_dictionary(field.type):
+                arr = self._remap(field, arr)
+            elif arr.type != field.type:
+                arr = arr.cast(field.type)
+            arrays.append(arr)
+        return pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+
+    def _remap(self, field, arr: pa.DictionaryArray) -> pa.DictionaryArray:
+        # Dicionário global por coluna: valores novos vão para o fim (delta)
+        values, lookup = self._dicts.setdefault(field.name, ([], {}))
+        local = arr.dictionary.to_pylist()
+        mapping = np.empty(len(local), dtype=np.int64)
+        for i, v in enumerate(local):
+            code = lookup.get(v)
+            if code is None:
+                code = lookup[v] = len(values)
+                values.append(v)
+            mapping[i] = code
+        indices = arr.indices.to_numpy(zero_copy_only=False)
+        valid = ~np.asarray(arr.is_null())
+        out = np.zeros(len(arr), dtype=np.int64)
+        out[valid] = mapping[indices[valid].astype(np.int64)]
+        index_type = field.type.index_type
+        return pa.DictionaryArray.from_arrays(
+            pa.array(out, type=index_type, mask=~valid),
+            pa.array(values, type=field.type.value_type),
+        )
+
+    def write(self, df: pd.DataFrame):
+        if self.path.endswith(".csv"):
+            mode = "w" if self._writer is None else "a"
+            readable(df).to_csv(self.tmp_path, index=False, mode=mode, header=(mode == "w"))
+            self._writer = True
+            self.rows += len(df)
+            return
+
+        table = to_table(df)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.path.endswith(".parquet"):
+                self._writer = pq.ParquetWriter(self.tmp_path, self._schema)
+            else:
+                # Sem compressão: é o que permite ler com memory map sem cópia
+                self._sink = pa.OSFile(self.tmp_path, "wb")
+                self._writer = ipc.new_file(
+                    self._sink, self._schema,
+                    options=ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                )
+        self._writer.write_batch(self._unify(table))
+        self.rows += len(df)
+
+    def _close_writer(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer not in (None, True):
+            self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+    def finish(self):
+        """Fecha o arquivo temporário e calcula a versão, sem trocar o artefato."""
+        if self._writer is None:
+            raise ValueError("Nenhum bloco foi gravado no artefato.")
+        self._close_writer()
+        self._version = _version_info(self.tmp_path)
+
+    def publish(self):
+        """Troca o artefato pelo arquivo terminado em finish()."""
+        if self._version is None:
+            self.finish()
+        _replace_atomic(self.tmp_path, self.path, self._version)
+
+    def close(self):
+        self.finish()
+        self.publish()
+
+    def abort(self):
+        self._close_writer()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def export_predictions(df: pd.DataFrame, path: str = ARROW_PATH):
+    """Grava o artefato no formato indicado pela extensão (.arrow/.feather, .parquet ou .csv)."""
+    with ArtifactStream(path) as stream:
+        stream.write(df)
+
+
+def read_table(path: str) -> pa.Table:
+    if path.endswith(".parquet"):
+        return pq.read_table(path, memory_map=True)
+    source = pa.memory_map(path, "r")
+    return ipc.open_file(source).read_all()
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    # Fallback legado: parse de texto + ajuste de tipos
+    df = pd.read_csv(path, dtype={"customer_id": str, "top_destination": "category"})
+    compact(df, ["customer_id"])
+    if "last_purchase" in df.columns:
+        df["last_purchase"] = pd.to_datetime(df["last_purchase"], errors="coerce")
+    for col in ["ticket_medio", "prob_repurchase_7d", "prob_repurchase_30d", "score_priority"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def read_predictions(path: str) -> pd.DataFrame:
+    """Lê o artefato (Arrow/Parquet memory-mapped ou CSV) já tipado, com customer_id no binário."""
+    if path.endswith(".csv"):
+        return _read_csv(path)
+    # split_blocks evita consolidar colunas em blocos 2D (menos cópias)
+    df = read_table(path).to_pandas(split_blocks=True, self_destruct=True, types_mapper=types_mapper)
+    return compact(df, ["customer_id"])   # artefatos antigos, com customer_id em texto
+
+
+def resolve_path(candidates=(ARROW_PATH, CSV_PATH)) -> str:
+    """Primeiro artefato existente na ordem de preferência (colunar antes do CSV)."""
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return candidates[0]
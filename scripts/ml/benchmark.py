@@ -0,0 +1,413 @@
+# ============================================
+# RoadWise - ClickBus | Benchmark do Pipeline e do Dashboard
+# Tempo e pico de memória por etapa, com baseline em JSON
+# ============================================
+#
+# Roda sobre uma base de synthetic_data.py (gerada na hora se não existir) e
+# mede, etapa a etapa, o mesmo código usado em produção:
+#
+#   ingest           ingest.py sobre as compras exportadas como df_t.csv bruto
+#                    (só com --stages; o CSV ocupa ~400 bytes por compra)
+#   feature_build    feature_engine sobre o Parquet de compras
+#   feature_load     leitura de clients_features (stand-in da Silver)
+#   labels           conjunto de treino point-in-time (labels.py)
+#   segmentation     scaler + KMeans + atribuição (segmentation.py)
+#   fit_<h>          um booster por horizonte (training.py), cada um isolado
+#   scoring          InferenceEngine sobre a base inteira
+#   gold_write       GoldWriter (carga completa) num SQLite temporário
+#   artifact_export  predictions.arrow
+#   dashboard_load   loader do dashboard (artefato + FilterIndex)
+#   filter:<combo>   consulta + resumo do dashboard para cada combinação de
+#                    filtros (persona, score, ticket, busca, recência)
+#   summary_cube     cubo de resumo dos KPIs (summary_cube.py)
+#   cube:<combo>     resumo pelo cubo para as combinações que ele cobre
+#                    (sem busca; score e recência nas bordas das faixas)
+#
+# Para cada etapa: tempo de parede, CPU, pico de memória Python/NumPy
+# (tracemalloc), RSS máximo do processo e linhas/s. O resultado vai para
+# benchmarks/last_<escala>.json; --save-baseline grava benchmarks/baseline_<escala>.json
+# e, nas rodadas seguintes, etapas acima da tolerância são marcadas como
+# regressão (código de saída 1).
+#
+# Uso: python benchmark.py --scale 10k|1m|20m [--stages scoring,filters] [--save-baseline]
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from ids import compact, read_parquet
+from instrumentation import peak_rss_mb
+from synthetic_data import OUT_DIR, SCALES, generate, load_manifest
+
+BENCH_DIR = "benchmarks"
+TOLERANCE = 0.25            # +25% de tempo ou memória sobre o baseline = regressão
+MIN_DELTA_SECONDS = 0.005   # abaixo disso é ruído de medição
+MIN_DELTA_MB = 8.0
+FILTER_REPEAT = 5           # consultas do dashboard: melhor de N execuções
+
+STAGES = ["ingest", "feature_build", "feature_load", "labels", "segmentation", "fit", "scoring",
+          "gold_write", "artifact_export", "dashboard_load", "filters", "summary_cube", "cube_filters"]
+DEFAULT_STAGES = STAGES[1:]   # ingest precisa gravar o CSV bruto inteiro no disco
+
+# Valores usados quando o filtro está ligado. O score é um quantil da base
+# (0.8 = 20% mais bem pontuados), para o corte não ficar vazio em nenhuma escala.
+FILTER_VALUES = {"persona": None, "score": 0.8, "ticket": 150.0, "search": "a", "recency": 365}
+
+
+# -----------------------------
+# Medição
+# -----------------------------
+class Bench:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def measure(self, name: str, fn, rows=None, repeat=1):
+        """Roda fn (melhor tempo de `repeat` execuções) e registra a etapa."""
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        times, cpu = [], []
+        result = None
+        for _ in range(repeat):
+            t0, c0 = time.perf_counter(), time.process_time()
+            result = fn()
+            times.append(time.perf_counter() - t0)
+            cpu.append(time.process_time() - c0)
+        seconds = min(times)
+        entry = {
+            "seconds": round(seconds, 6),
+            "cpu_seconds": round(cpu[times.index(seconds)], 6),
+            "peak_mb": None,
+            "max_rss_mb": round(peak_rss_mb(), 1),
+            "rows": rows,
+            "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+        }
+        if self.trace_memory:
+            entry["peak_mb"] = round((tracemalloc.get_traced_memory()[1] - base) / 2**20, 2)
+        self.results[name] = entry
+        peak = f"{entry['peak_mb']:.1f} MB" if entry["peak_mb"] is not None else "n/a"
+        print(f">> {name:<44} {seconds:>10.4f}s  pico {peak:>10}  RSS {entry['max_rss_mb']:.0f} MB")
+        return result
+
+
+# -----------------------------
+# Etapas
+# -----------------------------
+def _filter_combos() -> list:
+    names = list(FILTER_VALUES)
+    combos = []
+    for r in range(len(names) + 1):
+        for on in itertools.combinations(names, r):
+            combos.append(on)
+    return combos
+
+
+def _filter_kwargs(on, persona, score_min, today_day) -> dict:
+    return {
+        "personas": [persona] if "persona" in on else [],
+        "score_min": score_min if "score" in on else 0.0,
+        "ticket_min": FILTER_VALUES["ticket"] if "ticket" in on else 0.0,
+        "search": FILTER_VALUES["search"] if "search" in on else "",
+        "days_max": FILTER_VALUES["recency"] if "recency" in on else None,
+        "today_day": today_day,
+    }
+
+
+class Suite:
+    def __init__(self, manifest: dict, bench: Bench, workdir: str, threads=None):
+        from training import THREADS
+
+        self.manifest = manifest
+        self.bench = bench
+        self.workdir = workdir
+        self.threads = threads or THREADS
+        self.ctx = {}
+
+    def _need(self, key, stage):
+        # Dependência de uma etapa não selecionada: roda sem medir
+        if key not in self.ctx:
+            getattr(self, stage)(measure=False)
+        return self.ctx[key]
+
+    def _run(self, name, fn, rows=None, repeat=1, measure=True):
+        return self.bench.measure(name, fn, rows, repeat) if measure else fn()
+
+    def ingest(self, measure=True):
+        from ingest import ingest as run_ingest
+        from synthetic_data import write_raw_csv
+
+        csv_path = os.path.join(self.workdir, "df_t.csv")
+        if not os.path.exists(csv_path):
+            write_raw_csv(self.manifest["purchases_path"], csv_path, self.manifest["seed"])
+        out = os.path.join(self.workdir, "purchases_clean")
+        self._run("ingest", lambda: run_ingest(csv_path, out, self.threads),
+                  self.manifest["purchases"], measure=measure)
+
+    def feature_build(self, measure=True):
+        from feature_engine import features_from_parquet
+
+        def run():
+            return sum(len(b) for b in features_from_parquet(
+                self.manifest["purchases_path"], today=self.manifest["today"], workdir=self.workdir))
+        self._run("feature_build", run, self.manifest["purchases"], measure=measure)
+
+    def feature_load(self, measure=True):
+        df = self._run("feature_load", lambda: compact(read_parquet(self.manifest["features_path"])),
+                       self.manifest["customers"], measure=measure)
+        self.ctx["features"] = df
+
+    def labels(self, measure=True):
+        from labels import training_set_from_parquet
+
+        ts = self._run("labels", lambda: training_set_from_parquet(self.manifest["purchases_path"]),
+                       self.manifest["purchases"], measure=measure)
+        self.ctx["training_set"] = ts
+
+    def segmentation(self, measure=True):
+        from segmentation import fit_centroids, nearest_centroid
+        from sklearn.preprocessing import StandardScaler
+        from train import FEATURES_CLUSTER
+
+        df = self._need("features", "feature_load")
+
+        def run():
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(df[FEATURES_CLUSTER].fillna(0))
+            centroids = fit_centroids(X_scaled)
+            nearest_centroid(X_scaled, centroids)
+            return scaler, centroids
+        scaler, centroids = self._run("segmentation", run, len(df), measure=measure)
+        self.ctx["segmentation"] = {"scaler_mean": scaler.mean_, "scaler_scale": scaler.scale_,
+                                    "centroids": centroids}
+
+    def fit(self, measure=True):
+        from train import FEATURES_ML, LABELS
+        from training import train_horizons
+
+        ts = self._need("training_set", "labels")
+        boosters = {}
+        for horizon, label in LABELS.items():
+            fitted, _ = self._run(f"fit_{horizon}",
+                                  lambda: train_horizons(ts, FEATURES_ML, {horizon: label},
+                                                         threads=self.threads),
+                                  len(ts), measure=measure)
+            boosters.update(fitted)
+        self.ctx["boosters"] = boosters
+
+    def _bundle(self) -> dict:
+        from train import FEATURES_CLUSTER, FEATURES_ML
+
+        return {**self._need("segmentation", "segmentation"),
+                "boosters": self._need("boosters", "fit"),
+                "features_cluster": FEATURES_CLUSTER, "features_ml": FEATURES_ML,
+                "version": "benchmark"}
+
+    def scoring(self, measure=True):
+        from inference import InferenceEngine
+
+        bundle = self._bundle()
+        df = self._need("features", "feature_load")
+        engine = InferenceEngine(bundle, self.threads)
+        scored = self._run("scoring", lambda: engine.score_frame(df.copy()), len(df), measure=measure)
+        self.ctx["scored"] = scored
+
+    def gold_write(self, measure=True):
+        from gold_writer import GoldWriter, SqliteBackend
+        from score import GOLD_BATCH_SIZE
+
+        df = self._need("scored", "scoring")
+        path = os.path.join(self.workdir, "gold.db")
+
+        def run():
+            backend = SqliteBackend(path)
+            try:
+                return GoldWriter(backend, batch_size=GOLD_BATCH_SIZE).publish(df, mode="full")
+            finally:
+                backend.conn.close()
+        self._run("gold_write", run, len(df), measure=measure)
+
+    def artifact_export(self, measure=True):
+        from artifacts import export_predictions
+
+        df = self._need("scored", "scoring")
+        path = os.path.join(self.workdir, "predictions.arrow")
+        self._run("artifact_export", lambda: export_predictions(df, path), len(df), measure=measure)
+        self.ctx["artifact"] = path
+
+    def dashboard_load(self, measure=True):
+        from dataset_store import load_dashboard_data
+
+        path = self._need("artifact", "artifact_export")
+        df, index = self._run("dashboard_load", lambda: load_dashboard_data(path),
+                              self.manifest["customers"], measure=measure)
+        self.ctx["dashboard"] = (df, index)
+
+    def filters(self, measure=True):
+        from feature_engine import epoch_day
+
+        _, index = self._need("dashboard", "dashboard_load")
+        today_day = epoch_day(self.manifest["today"])
+        persona = index.personas[0]
+        score_min = float(np.quantile(index.score_rank, FILTER_VALUES["score"]))
+        for on in _filter_combos():
+            kwargs = _filter_kwargs(on, persona, score_min, today_day)
+
+            def run():
+                ranks = index.query_ranks(**kwargs)
+                return index.summary(ranks)
+            name = "filter:" + ("+".join(on) if on else "none")
+            self._run(name, run, index.n, repeat=FILTER_REPEAT, measure=measure)
+
+    def summary_cube(self, measure=True):
+        from summary_cube import build_cube
+
+        df = self._need("scored", "scoring")
+        cube = self._run("summary_cube", lambda: build_cube(df, as_of=self.manifest["today"]),
+                         len(df), measure=measure)
+        self.ctx["cube"] = cube
+
+    def cube_filters(self, measure=True):
+        from feature_engine import epoch_day
+        from summary_cube import RECENCY_EDGES
+
+        cube = self._need("cube", "summary_cube")
+        _, index = self._need("dashboard", "dashboard_load")
+        today_day = epoch_day(self.manifest["today"])
+        persona = index.personas[0]
+        # Mesmo corte de score dos filtros, descendo para a borda de 0.05 mais próxima
+        score_min = np.floor(float(np.quantile(index.score_rank, FILTER_VALUES["score"])) * 20) / 20
+        for on in _filter_combos():
+            if "search" in on:
+                continue
+            kwargs = _filter_kwargs(on, persona, score_min, today_day)
+            if kwargs["days_max"] is not None:
+                kwargs["days_max"] = int(RECENCY_EDGES[RECENCY_EDGES <= kwargs["days_max"]].max())
+            name = "cube:" + ("+".join(on) if on else "none")
+            self._run(name, lambda: cube.summary(**kwargs), index.n, repeat=FILTER_REPEAT, measure=measure)
+
+
+# -----------------------------
+# Baseline e regressões
+# -----------------------------
+def compare(results: dict, baseline: dict, tolerance=TOLERANCE) -> list:
+    """Etapas piores que o baseline além da tolerância (tempo e/ou pico de memória)."""
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        checks = [("seconds", MIN_DELTA_SECONDS), ("peak_mb", MIN_DELTA_MB)]
+        for metric, min_delta in checks:
+            old, new = before.get(metric), now.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append({"stage": name, "metric": metric, "baseline": old, "current": new,
+                                    "ratio": round(new / old, 2) if old else None})
+    return regressions
+
+
+def environment() -> dict:
+    import xgboost
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "xgboost": xgboost.__version__,
+    }
+
+
+def run_suite(scale, stages=DEFAULT_STAGES, data_dir=OUT_DIR, threads=None, trace_memory=True) -> dict:
+    try:
+        manifest = load_manifest(scale, data_dir)
+    except FileNotFoundError:
+        print(f">> Base sintética {scale} não encontrada em {data_dir}; gerando...")
+        manifest = generate(scale, data_dir)
+
+    bench = Bench(trace_memory)
+    workdir = tempfile.mkdtemp(prefix="rw_bench_")
+    start = time.perf_counter()
+    try:
+        suite = Suite(manifest, bench, workdir, threads)
+        for stage in stages:
+            getattr(suite, stage)()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        "scale": str(scale),
+        "customers": manifest["customers"],
+        "purchases": manifest["purchases"],
+        "seed": manifest["seed"],
+        "run_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "total_seconds": round(time.perf_counter() - start, 2),
+        "environment": environment(),
+        "stages": bench.results,
+    }
+
+
+def _write_json(payload: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline e do dashboard.")
+    parser.add_argument("--scale", default="10k", help=f"{', '.join(SCALES)} ou a quantidade de clientes")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES), help="etapas separadas por vírgula")
+    parser.add_argument("--data-dir", default=OUT_DIR, help="pasta das bases de synthetic_data.py")
+    parser.add_argument("--bench-dir", default=BENCH_DIR)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como baseline")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="mede só tempo (tracemalloc deixa etapas em Python puro mais lentas)")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = sorted(set(stages) - set(STAGES))
+    if unknown:
+        parser.error(f"etapas desconhecidas: {', '.join(unknown)} (use {', '.join(STAGES)})")
+
+    report = run_suite(args.scale, stages, args.data_dir, args.threads, not args.no_tracemalloc)
+    baseline_path = os.path.join(args.bench_dir, f"baseline_{args.scale}.json")
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        report["baseline_run_at"] = baseline.get("run_at")
+        report["regressions"] = compare(report["stages"], baseline["stages"], args.tolerance)
+    else:
+        report["regressions"] = []
+
+    _write_json(report, os.path.join(args.bench_dir, f"last_{args.scale}.json"))
+    print(f">> Benchmark {args.scale}: {len(report['stages'])} etapas em {report['total_seconds']:.1f}s "
+          f"-> {os.path.join(args.bench_dir, f'last_{args.scale}.json')}")
+    if args.save_baseline:
+        _write_json(report, baseline_path)
+        print(f">> Baseline gravado em {baseline_path}")
+
+    for reg in report["regressions"]:
+        print(f">> REGRESSÃO {reg['stage']} ({reg['metric']}): {reg['baseline']} -> {reg['current']} "
+              f"({reg['ratio']}x)")
+    if report["regressions"]:
+        raise SystemExit(1)
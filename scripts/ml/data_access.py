@@ -0,0 +1,409 @@
+# ============================================
+# RoadWise - ClickBus | Acesso a Dados
+# Configuração, pool de conexões, retry e leitura particionada da Silver Layer
+# ============================================
+#
+# Configuração por variáveis de ambiente ou arquivo .env (python-decouple):
+#   RW_DB_URL        mssql (padrão) | sqlite:///caminho.db | duckdb:///caminho.duckdb
+#   RW_DB_DRIVER     driver ODBC do SQL Server
+#   RW_DB_SERVER     servidor do SQL Server
+#   RW_DB_DATABASE   banco de dados
+#   RW_DB_USER       usuário (vazio = Trusted_Connection)
+#   RW_DB_PASSWORD   senha
+#   RW_DB_POOL_SIZE  conexões no pool = leituras em paralelo
+#   RW_DB_RETRIES    tentativas em falhas de conexão/consulta
+#   RW_DB_BACKOFF    espera inicial do retry em segundos (dobra a cada tentativa)
+#
+# SQLite/DuckDB servem de stand-in local para testes: as tabelas usam o nome
+# "schema_tabela" (ex.: silver_clients_features), como no SqliteBackend do Gold.
+#
+# Os leitores da Silver devolvem customer_id e os destinos já no binário de
+# 32 bytes (ids.py); o hex só aparece nos parâmetros de keyset/faixa do SQL.
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+from decouple import config
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from ids import compact
+
+DRIVER_NAME = "ODBC Driver 17 for SQL Server"
+SERVER_NAME = "marco"   # ajuste se necessário
+DATABASE_NAME = "EnterpriseChallengeClickBus"
+
+FEATURES_TABLE = "silver.clients_features"
+PURCHASES_TABLE = "silver.purchases_clean"
+
+
+# -----------------------------
+# Configuração
+# -----------------------------
+def load_settings(**overrides) -> dict:
+    url = overrides.pop("url", None) or config("RW_DB_URL", default="mssql")
+    dialect, _, path = url.partition(":///")
+    settings = {
+        "dialect": dialect,
+        "path": path,
+        "driver": config("RW_DB_DRIVER", default=DRIVER_NAME),
+        "server": config("RW_DB_SERVER", default=SERVER_NAME),
+        "database": config("RW_DB_DATABASE", default=DATABASE_NAME),
+        "user": config("RW_DB_USER", default=""),
+        "password": config("RW_DB_PASSWORD", default=""),
+        "pool_size": config("RW_DB_POOL_SIZE", default=4, cast=int),
+        "retries": config("RW_DB_RETRIES", default=3, cast=int),
+        "backoff": config("RW_DB_BACKOFF", default=1.0, cast=float),
+    }
+    settings.update(overrides)
+    if settings["dialect"] not in ("mssql", "sqlite", "duckdb"):
+        raise ValueError(f"RW_DB_URL inválido: {url!r} (use mssql, sqlite:///... ou duckdb:///...)")
+    return settings
+
+
+def connection_string(settings: dict) -> str:
+    if settings["user"]:
+        auth = f"UID={settings['user']};\nPWD={settings['password']};"
+    else:
+        auth = "Trusted_Connection=yes;"
+    return f"""
+DRIVER={{{settings['driver']}}};
+SERVER={settings['server']};
+DATABASE={settings['database']};
+{auth}
+"""
+
+
+def table_name(name: str, settings: dict) -> str:
+    # Stand-ins locais não têm schemas: silver.clients_features -> silver_clients_features
+    return name if settings["dialect"] == "mssql" else name.replace(".", "_")
+
+
+# -----------------------------
+# Retry com backoff exponencial
+# -----------------------------
+def _transient_errors(settings: dict) -> tuple:
+    if settings["dialect"] == "mssql":
+        import pyodbc
+        return (pyodbc.OperationalError, pyodbc.InterfaceError)
+    if settings["dialect"] == "sqlite":
+        import sqlite3
+        return (sqlite3.OperationalError,)
+    import duckdb
+    return (duckdb.IOException,)
+
+
+def _log_retry(state):
+    print(
+        f">> Falha transitória ({state.outcome.exception()}); "
+        f"tentativa {state.attempt_number + 1} em {state.next_action.sleep:.1f}s"
+    )
+
+
+def with_retry(fn, settings: dict):
+    """Executa fn() repetindo em erros transitórios, com espera exponencial."""
+    retrying = retry(
+        retry=retry_if_exception_type(_transient_errors(settings)),
+        stop=stop_after_attempt(max(1, settings["retries"])),
+        wait=wait_exponential(multiplier=settings["backoff"]),
+        before_sleep=_log_retry,
+        reraise=True,
+    )
+    return retrying(fn)()
+
+
+def _open(settings: dict):
+    if settings["dialect"] == "mssql":
+        import pyodbc
+        return pyodbc.connect(connection_string(settings))
+    if settings["dialect"] == "sqlite":
+        import sqlite3
+        return sqlite3.connect(settings["path"], check_same_thread=False)
+    import duckdb
+    return duckdb.connect(settings["path"])
+
+
+def connect(settings: dict = None):
+    settings = settings or load_settings()
+    conn = with_retry(lambda: _open(settings), settings)
+    print(">> Conexão bem sucedida.")
+    return conn
+
+
+# -----------------------------
+# Pool de conexões
+# -----------------------------
+class ConnectionPool:
+    """Pool thread-safe com até pool_size conexões, abertas sob demanda.
+
+    Quem pede uma conexão com o pool cheio espera outra ser devolvida.
+    Conexões que levantam erro dentro do bloco são descartadas.
+    """
+
+    def __init__(self, settings: dict = None):
+        self.settings = settings or load_settings()
+        self.size = max(1, int(self.settings["pool_size"]))
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            self._discard(conn)
+            raise
+        self._idle.put(conn)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+        try:
+            return with_retry(lambda: _open(self.settings), self.settings)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------
+# Leitura
+# -----------------------------
+def read_sql(conn, sql: str, params=None, settings: dict = None) -> pd.DataFrame:
+    """Executa a consulta num cursor DB-API e monta o DataFrame (sem SQLAlchemy)."""
+    settings = settings or load_settings()
+    if settings["dialect"] == "duckdb":
+        return conn.execute(sql, params or []).df()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params or [])
+        columns = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+
+def read_features(conn, settings: dict = None) -> pd.DataFrame:
+    # Ler tabela silver.clients_features
+    settings = settings or load_settings()
+    sql = f"SELECT * FROM {table_name(FEATURES_TABLE, settings)};"
+    df = compact(with_retry(lambda: read_sql(conn, sql, settings=settings), settings))
+    print(">> Dados carregados da Silver Layer:", df.shape)
+    return df
+
+
+def _top_query(table: str, key: str, n: int, after: bool, settings: dict) -> str:
+    where = f" WHERE {key} > ?" if after else ""
+    if settings["dialect"] == "mssql":
+        return f"SELECT TOP ({n}) * FROM {table}{where} ORDER BY {key};"
+    return f"SELECT * FROM {table}{where} ORDER BY {key} LIMIT {n};"
+
+
+def iter_feature_chunks(conn, chunk_size: int, key="customer_id", settings: dict = None):
+    """Lê silver.clients_features em blocos de chunk_size linhas, paginando por chave (keyset).
+
+    Cada consulta parte da última chave do bloco anterior (WHERE key > ?),
+    usando o índice da PK em vez de OFFSET; os blocos saem em ordem de key.
+    """
+    settings = settings or load_settings()
+    table = table_name(FEATURES_TABLE, settings)
+    last = None
+    chunk_size = int(chunk_size)
+    while True:
+        sql = _top_query(table, key, chunk_size, last is not None, settings)
+        params = None if last is None else [last]
+        chunk = with_retry(lambda: read_sql(conn, sql, params, settings), settings)
+        if chunk.empty:
+            return
+        last = chunk[key].iloc[-1]   # hex, antes da conversão: é o parâmetro da próxima página
+        yield compact(chunk)
+        if len(chunk) < chunk_size:
+            return
+
+
+def iter_sql_batches(conn, sql: str, params=None, batch_size: int = 100_000, settings: dict = None):
+    """Executa uma única consulta e devolve o resultado em DataFrames de até batch_size linhas."""
+    settings = settings or load_settings()
+    cursor = conn.cursor()
+    try:
+        with_retry(lambda: cursor.execute(sql, params or []), settings)
+        columns = [c[0] for c in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    finally:
+        cursor.close()
+
+
+def max_purchase_datetime(conn, settings: dict = None):
+    settings = settings or load_settings()
+    sql = f"SELECT MAX(purchase_datetime) AS max_dt FROM {table_name(PURCHASES_TABLE, settings)};"
+    return with_retry(lambda: read_sql(conn, sql, settings=settings), settings)["max_dt"].iloc[0]
+
+
+def silver_fingerprint(conn, settings: dict = None) -> dict:
+    """Resumo barato das tabelas da Silver (contagens e máximos) para detectar dados novos.
+
+    Não é um hash do conteúdo: uma correção que preserve contagens e máximos
+    passa despercebida (no pipeline.py, force a etapa extract nesse caso).
+    """
+    settings = settings or load_settings()
+    features = table_name(FEATURES_TABLE, settings)
+    purchases = table_name(PURCHASES_TABLE, settings)
+    sql = f"""
+SELECT
+    (SELECT COUNT(*) FROM {features}) AS features_rows,
+    (SELECT MAX(last_purchase) FROM {features}) AS features_last_purchase,
+    (SELECT SUM(CAST(total_purchases_lifetime AS BIGINT)) FROM {features}) AS features_purchases,
+    (SELECT COUNT(*) FROM {purchases}) AS purchases_rows,
+    (SELECT MAX(purchase_id) FROM {purchases}) AS purchases_max_id,
+    (SELECT MAX(purchase_datetime) FROM {purchases}) AS purchases_last_datetime;"""
+    row = with_retry(lambda: read_sql(conn, sql, settings=settings), settings).iloc[0]
+    return {key: str(value) for key, value in row.items()}
+
+
+def iter_purchase_batches(conn, batch_size: int, columns, settings: dict = None):
+    """Lê silver.purchases_clean em lotes ordenados por (customer_id, purchase_id), via keyset.
+
+    As compras de um cliente saem contíguas (podem atravessar dois lotes),
+    que é o que o feature_engine precisa para montar blocos de clientes completos.
+    """
+    settings = settings or load_settings()
+    table = table_name(PURCHASES_TABLE, settings)
+    select = ", ".join(dict.fromkeys(["customer_id", "purchase_id", *columns]))
+    order = "ORDER BY customer_id, purchase_id"
+    after = "WHERE customer_id > ? OR (customer_id = ? AND purchase_id > ?)"
+    batch_size = int(batch_size)
+    last = None
+    while True:
+        where = "" if last is None else f" {after}"
+        if settings["dialect"] == "mssql":
+            sql = f"SELECT TOP ({batch_size}) {select} FROM {table}{where} {order};"
+        else:
+            sql = f"SELECT {select} FROM {table}{where} {order} LIMIT {batch_size};"
+        params = None if last is None else [last[0], last[0], last[1]]
+        batch = with_retry(lambda: read_sql(conn, sql, params, settings), settings)
+        if batch.empty:
+            return
+        last = (batch["customer_id"].iloc[-1], int(batch["purchase_id"].iloc[-1]))
+        yield compact(batch)
+        if len(batch) < batch_size:
+            return
+
+
+def key_partitions(conn, n: int, key="customer_id", settings: dict = None) -> list:
+    """Divide a tabela em n faixas [início, fim) de key com o mesmo número de linhas.
+
+    Os limites saem de um NTILE sobre a chave (uma varredura só do índice da PK,
+    feita no servidor); cada faixa depois é lida por busca no índice. Faixas
+    por quantil ficam balanceadas mesmo se customer_id não for uniforme.
+    """
+    settings = settings or load_settings()
+    table = table_name(FEATURES_TABLE, settings)
+    sql = f"""
+SELECT MIN({key}) AS lower_key
+FROM (SELECT {key}, NTILE({int(n)}) OVER (ORDER BY {key}) AS tile FROM {table}) AS t
+GROUP BY tile
+ORDER BY lower_key;"""
+    bounds = with_retry(lambda: read_sql(conn, sql, settings=settings), settings)["lower_key"].tolist()[1:]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def _range_query(table: str, key: str, lower, upper):
+    where, params = [], []
+    if lower is not None:
+        where.append(f"{key} >= ?")
+        params.append(lower)
+    if upper is not None:
+        where.append(f"{key} < ?")
+        params.append(upper)
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + f" ORDER BY {key};", params
+
+
+def read_features_parallel(pool: ConnectionPool, partitions: int = None,
+                           key="customer_id") -> pd.DataFrame:
+    """Lê silver.clients_features em faixas de chave, uma por thread, pelo pool.
+
+    O paralelismo é limitado ao tamanho do pool; com mais partições que
+    conexões, as faixas restantes entram na fila. O resultado sai em ordem de key.
+    """
+    settings = pool.settings
+    table = table_name(FEATURES_TABLE, settings)
+    partitions = partitions or pool.size
+
+    def fetch(bounds):
+        sql, params = _range_query(table, key, *bounds)
+
+        def attempt():
+            with pool.connection() as conn:
+                return read_sql(conn, sql, params, settings)
+        return compact(with_retry(attempt, settings))
+
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        ranges = key_partitions(conn, partitions, key, settings)
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        parts = list(executor.map(fetch, ranges))
+    # Faixas em ordem de key: concatenar já devolve a tabela ordenada
+    df = pd.concat(parts, ignore_index=True)
+    elapsed = time.perf_counter() - start
+    print(
+        f">> Dados carregados da Silver Layer: {df.shape} em {elapsed:.2f}s "
+        f"({partitions} partições, {pool.size} conexões)"
+    )
+    return df
+
+
+def writer_backend(conn, settings: dict = None, schema="gold"):
+    """Backend do gold_writer compatível com a conexão (SQL Server ou stand-in SQLite)."""
+    from gold_writer import SqliteBackend, SqlServerBackend
+
+    settings = settings or load_settings()
+    if settings["dialect"] == "mssql":
+        return SqlServerBackend(conn, schema)
+    if settings["dialect"] == "sqlite":
+        return SqliteBackend(conn, schema)
+    raise ValueError("A escrita só é suportada em SQL Server ou no stand-in SQLite.")
@@ -0,0 +1,82 @@
+# ============================================
+# RoadWise - ClickBus | Dataset do Dashboard com Versão
+# Recarrega só quando o artefato realmente muda
+# ============================================
+#
+# Substitui o TTL fixo: a cada rerun, artifact_version() faz só um os.stat;
+# quando (mtime, tamanho) muda, a versão (hash do conteúdo) é conferida e,
+# se for nova, o dataset e o índice são recarregados e trocados de uma vez.
+# Sessões que já pegaram a versão anterior seguem com ela até o próximo rerun.
+
+import threading
+
+from artifacts import PERSONAS, artifact_version, read_predictions
+from filter_index import FilterIndex
+
+REQUIRED_COLS = {
+    "customer_id",
+    "segment",
+    "ticket_medio",
+    "prob_repurchase_7d",
+    "prob_repurchase_30d",
+    "score_priority"
+}
+
+
+def load_dashboard_data(path: str):
+    """Loader do dashboard: artefato sanitizado + FilterIndex (None se faltar coluna)."""
+    df_local = read_predictions(path)
+    if df_local.empty or REQUIRED_COLS - set(df_local.columns):
+        return df_local, None
+
+    # Sanitização
+    for col in ["prob_repurchase_7d", "prob_repurchase_30d", "score_priority"]:
+        df_local[col] = df_local[col].fillna(0.0).clip(0, 1)
+    df_local["ticket_medio"] = df_local["ticket_medio"].fillna(0.0).clip(lower=0)
+
+    if "persona" not in df_local.columns:
+        df_local["persona"] = df_local["segment"].map(PERSONAS).fillna("n/a")
+    return df_local, FilterIndex(df_local)
+
+
+class DatasetStore:
+    def __init__(self, loader, on_swap=None):
+        # loader(path) -> (df, índice); on_swap(antigo) limpa caches derivados
+        self._loader = loader
+        self._on_swap = on_swap
+        self._lock = threading.Lock()
+        self._current = None
+
+    def _fresh(self, path):
+        cur = self._current
+        if cur is None or cur["path"] != path:
+            return None, None
+        info = artifact_version(path, known=cur["info"])
+        if info is cur["info"]:
+            return cur, info
+        if info["version"] == cur["info"]["version"]:
+            # Arquivo tocado sem mudar o conteúdo: só atualiza a assinatura
+            cur = {**cur, "info": info}
+            self._current = cur
+            return cur, info
+        return None, info
+
+    def get(self, path: str) -> dict:
+        cur, _ = self._fresh(path)
+        if cur is not None:
+            return cur
+
+        with self._lock:
+            # Outra sessão pode ter recarregado enquanto esperávamos o lock
+            cur, info = self._fresh(path)
+            if cur is not None:
+                return cur
+            info = info or artifact_version(path)
+            df, index = self._loader(path)
+            new = {"path": path, "info": info, "version": info["version"],
+                   "df": df, "index": index}
+            old, self._current = self._current, new
+
+        if old is not None and self._on_swap is not None:
+            self._on_swap(old)
+        return new
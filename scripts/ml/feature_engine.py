@@ -0,0 +1,401 @@
+# ============================================
+# RoadWise - ClickBus | Feature Engine
+# silver.clients_features calculado em Python a partir de silver.purchases_clean
+# ============================================
+#
+# Reproduz as regras de silver.load_silver (scripts/silver/proc_load_silver.sql):
+#   @today             = data (sem hora) da compra mais recente de toda a base
+#   purchases_last_Nd  = compras com purchase_datetime > @today - N dias
+#   days_since_last    = DATEDIFF(DAY, last_purchase, @today)
+#   ticket_medio       = AVG(gmv_success) gravado como DECIMAL(12,2)
+#   last_purchase_*    = calendário da compra mais recente
+#   top_destination    = destino mais frequente; empate -> compra mais recente
+#
+# customer_id, destino e top_destination circulam no binário de 32 bytes
+# (ids.py); Parquet e SQL em hex são convertidos na leitura.
+#
+# Tudo sai de operações NumPy sobre as compras ordenadas por (cliente, data):
+# contagens por janela com searchsorted, somas por grupo com reduceat e a moda
+# do destino por grupo. As compras são processadas em blocos de clientes
+# completos, então a memória depende do bloco e não do total de compras.
+#
+# Fontes:
+#   - silver.purchases_clean (data_access, keyset por customer_id)
+#   - Parquet (arquivo ou pasta): espalhado antes em --buckets arquivos por hash
+#     de customer_id; com --buckets 0 o Parquet precisa vir agrupado por cliente.
+#
+# Uso: python feature_engine.py [--parquet compras.parquet] [--out clients_features.parquet]
+#                               [--buckets N] [--today AAAA-MM-DD] [--check]
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ids import (ID_COLUMNS, arrow_table, binary_array, compact, fixed_width, id_hash, read_parquet,
+                 to_binary)
+
+PURCHASE_COLUMNS = ["customer_id", "purchase_datetime", "place_destination_departure", "gmv_success"]
+FEATURE_COLUMNS = [
+    "customer_id", "last_purchase", "days_since_last_purchase",
+    "purchases_last_30d", "purchases_last_90d", "purchases_last_180d", "total_purchases_lifetime",
+    "top_destination",
+    "last_purchase_month", "last_purchase_week", "last_purchase_dayofweek", "last_purchase_period",
+    "ticket_medio",
+]
+WINDOWS = (30, 90, 180)
+
+BATCH_ROWS = 1_000_000   # compras por lote lido
+BUCKETS = 16             # arquivos de hash por customer_id na entrada Parquet
+OUT_PATH = "clients_features.parquet"
+
+_DAY = 86_400
+_TS_BITS = 33            # segundos relativos dentro do bloco (~270 anos) na chave composta
+
+
+# -----------------------------
+# Núcleo: um bloco com todas as compras de cada cliente
+# -----------------------------
+def epoch_seconds(values) -> np.ndarray:
+    return np.asarray(pd.to_datetime(values), dtype="datetime64[s]").view(np.int64)
+
+
+def epoch_day(value) -> int:
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+
+def _period(hour: np.ndarray) -> np.ndarray:
+    return np.where((hour >= 6) & (hour <= 11), "morning",
+                    np.where((hour >= 12) & (hour <= 17), "afternoon", "night")).astype(object)
+
+
+class CustomerTimeline:
+    """Compras ordenadas por (cliente, data) numa única chave int64.
+
+    O cliente ocupa os bits altos e os segundos (relativos ao início do bloco)
+    os baixos, então "primeira compra de cada cliente a partir de t" é um
+    searchsorted para todos os clientes de uma vez.
+    """
+
+    def __init__(self, customer_ids, ts: np.ndarray):
+        codes, customers = pd.factorize(customer_ids, sort=True)
+        self.customers = customers
+        self.codes = codes
+        self.base = int(ts.min())
+        rel = ts - self.base
+        if rel.max() >= 1 << _TS_BITS:
+            raise ValueError("Intervalo de datas grande demais para a chave composta do bloco.")
+        key = (codes.astype(np.int64) << _TS_BITS) + rel
+        self.order = np.argsort(key, kind="stable")
+        self.key = key[self.order]
+        self.ts = ts[self.order]
+
+        self.counts = np.bincount(codes, minlength=len(customers))
+        self.ends = np.cumsum(self.counts)
+        self.starts = self.ends - self.counts
+        self._group_base = np.arange(len(customers), dtype=np.int64) << _TS_BITS
+
+    def index_at(self, seconds, side="left") -> np.ndarray:
+        """Posição (na ordem ordenada) da primeira compra de cada cliente com data >= seconds.
+
+        side="right" troca para data > seconds. seconds pode ser escalar ou um
+        valor por cliente.
+        """
+        rel = np.clip(np.asarray(seconds, dtype=np.int64) - self.base, -1, (1 << _TS_BITS) - 1)
+        return np.searchsorted(self.key, self._group_base + rel, side=side)
+
+
+def compute_features(purchases: pd.DataFrame, today=None) -> pd.DataFrame:
+    """Features por cliente; o bloco precisa conter TODAS as compras de cada cliente.
+
+    today: data de referência (@today). Padrão = data da compra mais recente do
+    bloco, o que só bate com o SQL se o bloco for a base inteira.
+    """
+    if purchases.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+
+    ts = epoch_seconds(purchases["purchase_datetime"])
+    today_day = int(ts.max() // _DAY) if today is None else epoch_day(today)
+    tl = CustomerTimeline(purchases["customer_id"], ts)
+    ends = tl.ends
+
+    out = {"customer_id": to_binary(tl.customers)}
+
+    # Última compra (ordem estável: em empate de data vence a última linha lida)
+    last_ts = tl.ts[ends - 1]
+    last_dt = pd.DatetimeIndex(last_ts.astype("datetime64[s]")).as_unit("ns")
+    out["last_purchase"] = last_dt
+    out["days_since_last_purchase"] = today_day - last_ts // _DAY
+
+    # Janelas: primeira compra com data > corte via searchsorted na chave composta
+    for n in WINDOWS:
+        out[f"purchases_last_{n}d"] = ends - tl.index_at((today_day - n) * _DAY, side="right")
+    out["total_purchases_lifetime"] = tl.counts
+
+    # Moda do destino: corridas (cliente, destino) -> maior contagem, depois data mais recente
+    dest_codes, dests = pd.factorize(purchases["place_destination_departure"])
+    cust_sorted = tl.codes[tl.order]
+    dest_sorted = dest_codes[tl.order]
+    pair = np.lexsort((dest_sorted, cust_sorted))
+    run_cust = cust_sorted[pair]
+    run_dest = dest_sorted[pair]
+    run_starts = np.flatnonzero(np.r_[True, (run_cust[1:] != run_cust[:-1]) | (run_dest[1:] != run_dest[:-1])])
+    run_count = np.diff(np.r_[run_starts, len(pair)])
+    run_last = np.maximum.reduceat(tl.ts[pair], run_starts)
+    run_cust = run_cust[run_starts]
+    run_dest = run_dest[run_starts]
+    best = np.lexsort((-run_last, -run_count, run_cust))
+    best = best[np.r_[True, run_cust[best][1:] != run_cust[best][:-1]]]
+    # destino nulo também forma grupo no GROUP BY (código -1 -> nulo)
+    out["top_destination"] = to_binary(dests).take(run_dest[best], allow_fill=True)
+
+    # Calendário da última compra (mesmas regras de purchases_clean)
+    out["last_purchase_month"] = last_dt.month.to_numpy(dtype=np.int64)
+    out["last_purchase_week"] = last_dt.isocalendar().week.to_numpy(dtype=np.int64)
+    out["last_purchase_dayofweek"] = last_dt.dayofweek.to_numpy(dtype=np.int64) + 1  # segunda = 1
+    out["last_purchase_period"] = _period(last_dt.hour.to_numpy())
+
+    # ticket_medio: soma exata em centavos; AVG de DECIMAL(12,2) gravado em
+    # DECIMAL(12,2) arredonda meio centavo para cima (gmv_success >= 0)
+    gmv = pd.to_numeric(purchases["gmv_success"], errors="coerce").to_numpy(dtype=np.float64)[tl.order]
+    valid = ~np.isnan(gmv)
+    cents = np.where(valid, np.rint(gmv * 100), 0).astype(np.int64)
+    total = np.add.reduceat(cents, tl.starts)
+    n_valid = np.add.reduceat(valid.astype(np.int64), tl.starts)
+    avg_cents = (2 * total + n_valid) // np.maximum(2 * n_valid, 1)
+    out["ticket_medio"] = np.where(n_valid > 0, avg_cents / 100, np.nan)
+
+    return pd.DataFrame(out, columns=FEATURE_COLUMNS)
+
+
+# -----------------------------
+# Blocos de clientes completos
+# -----------------------------
+def iter_customer_blocks(batches, key="customer_id"):
+    """Reagrupa lotes com as compras contíguas por cliente em blocos de clientes completos.
+
+    Os lotes já vêm com customer_id no binário (compact). O último cliente de
+    cada lote pode continuar no lote seguinte, então ele fica retido e vai
+    junto com o próximo bloco.
+    """
+    carry = None
+    for batch in batches:
+        if carry is not None:
+            batch = pd.concat([carry, batch], ignore_index=True)
+        if batch.empty:
+            continue
+        ids = fixed_width(batch[key])
+        changes = np.flatnonzero(ids[1:] != ids[:-1])
+        if len(changes) == 0:
+            carry = batch
+            continue
+        cut = changes[-1] + 1
+        carry = batch.iloc[cut:].reset_index(drop=True)
+        yield batch.iloc[:cut]
+    if carry is not None and not carry.empty:
+        yield carry
+
+
+def build_features(blocks, today):
+    """Gera as features bloco a bloco (today precisa ser o da base inteira)."""
+    for block in blocks:
+        yield compute_features(block, today)
+
+
+# -----------------------------
+# Fontes
+# -----------------------------
+def partition_parquet(path: str, buckets: int, workdir: str, batch_size=BATCH_ROWS) -> list:
+    """Espalha as compras em `buckets` arquivos Parquet por hash de customer_id.
+
+    Cada arquivo fica com todas as compras dos seus clientes e cabe em memória.
+    Os IDs em hex são convertidos para o binário aqui, antes de gravar.
+    """
+    dataset = ds.dataset(path, format="parquet")
+    paths = [os.path.join(workdir, f"bucket_{i:04d}.parquet") for i in range(buckets)]
+    writers = {}
+    try:
+        for batch in dataset.to_batches(columns=PURCHASE_COLUMNS, batch_size=batch_size):
+            if batch.num_rows == 0:
+                continue
+            batch = _compact_batch(batch)
+            bucket = id_hash(batch.column("customer_id")) % np.uint64(buckets)
+            order = np.argsort(bucket, kind="stable")
+            bounds = np.searchsorted(bucket[order], np.arange(buckets + 1, dtype=np.uint64))
+            batch = batch.take(pa.array(order))
+            for i in range(buckets):
+                if bounds[i] == bounds[i + 1]:
+                    continue
+                if i not in writers:
+                    writers[i] = pq.ParquetWriter(paths[i], batch.schema)
+                writers[i].write_batch(batch.slice(bounds[i], bounds[i + 1] - bounds[i]))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return [paths[i] for i in sorted(writers)]
+
+
+def _compact_batch(batch: pa.RecordBatch) -> pa.RecordBatch:
+    columns = [binary_array(col) if name in ID_COLUMNS else col
+               for name, col in zip(batch.schema.names, batch.columns)]
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def parquet_max_datetime(path: str):
+    dataset = ds.dataset(path, format="parquet")
+    return pc.max(dataset.to_table(columns=["purchase_datetime"]).column("purchase_datetime")).as_py()
+
+
+def iter_parquet_batches(path: str, batch_size=BATCH_ROWS):
+    for batch in ds.dataset(path, format="parquet").to_batches(columns=PURCHASE_COLUMNS, batch_size=batch_size):
+        yield compact(batch.to_pandas())
+
+
+def parquet_blocks(path: str, buckets=BUCKETS, batch_size=BATCH_ROWS, workdir=None):
+    """Blocos de clientes completos de um Parquet de compras (arquivo ou pasta).
+
+    buckets > 0: particiona por hash de customer_id num diretório temporário e
+    devolve um arquivo por vez. buckets = 0: o Parquet já vem agrupado por cliente.
+    """
+    if buckets <= 0:
+        yield from iter_customer_blocks(iter_parquet_batches(path, batch_size))
+        return
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for file in partition_parquet(path, buckets, tmp, batch_size):
+            yield read_parquet(file)
+
+
+def sql_blocks(conn, settings=None, batch_size=BATCH_ROWS):
+    """Blocos de clientes completos lendo silver.purchases_clean ordenada por cliente."""
+    from data_access import iter_purchase_batches
+
+    yield from iter_customer_blocks(iter_purchase_batches(conn, batch_size, PURCHASE_COLUMNS, settings))
+
+
+def features_from_parquet(path: str, buckets=BUCKETS, today=None, batch_size=BATCH_ROWS, workdir=None):
+    """Features de um Parquet de compras, bloco a bloco."""
+    today = today if today is not None else parquet_max_datetime(path)
+    yield from build_features(parquet_blocks(path, buckets, batch_size, workdir), today)
+
+
+def features_from_sql(conn, settings=None, today=None, batch_size=BATCH_ROWS):
+    """Features lendo silver.purchases_clean em lotes ordenados por cliente."""
+    from data_access import max_purchase_datetime
+
+    today = today if today is not None else max_purchase_datetime(conn, settings)
+    yield from build_features(sql_blocks(conn, settings, batch_size), today)
+
+
+# -----------------------------
+# Paridade com o SQL
+# -----------------------------
+def compare_features(ours: pd.DataFrame, reference: pd.DataFrame, key="customer_id") -> dict:
+    """Compara com silver.clients_features; devolve divergências por coluna.
+
+    top_destination pode divergir em empates completos (mesma contagem e mesma
+    data máxima), onde o ROW_NUMBER do SQL Server não é determinístico.
+    """
+    merged = ours.merge(reference, on=key, how="outer", suffixes=("", "_sql"), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    mismatches = {}
+    for col in FEATURE_COLUMNS:
+        if col == key:
+            continue
+        a, b = both[col], both[f"{col}_sql"]
+        if col == "last_purchase":
+            diff = pd.to_datetime(a) != pd.to_datetime(b)
+        elif col == "ticket_medio":
+            a, b = a.astype(float), b.astype(float)
+            diff = ~(np.isclose(a, b, rtol=0, atol=1e-6) | (a.isna() & b.isna()))
+        elif col in ("top_destination", "last_purchase_period"):
+            diff = ~((a == b).fillna(False).astype(bool) | (a.isna() & b.isna()))
+        else:
+            diff = a.astype(np.int64) != b.astype(np.int64)
+        mismatches[col] = int(diff.sum())
+    return {
+        "rows": int(len(both)),
+        "only_python": int((merged["_merge"] == "left_only").sum()),
+        "only_sql": int((merged["_merge"] == "right_only").sum()),
+        "mismatches": mismatches,
+    }
+
+
+def print_parity(report: dict):
+    print(
+        f">> Paridade com silver.clients_features: {report['rows']} clientes em comum, "
+        f"{report['only_python']} só no Python, {report['only_sql']} só no SQL"
+    )
+    for col, n in report["mismatches"].items():
+        print(f"   {'OK ' if n == 0 else 'ERR'} {col}: {n} divergências")
+
+
+# -----------------------------
+# Gravação
+# -----------------------------
+def write_features(blocks, path: str = OUT_PATH) -> int:
+    """Grava os blocos num Parquet (arquivo temporário + troca atômica)."""
+    tmp = path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for features in blocks:
+            if features.empty:
+                continue
+            table = arrow_table(features)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            rows += len(features)
+    except Exception:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp)
+        raise
+    if writer is None:
+        return 0
+    writer.close()
+    os.replace(tmp, path)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcula silver.clients_features a partir das compras.")
+    parser.add_argument("--parquet", default=None,
+                        help="Parquet de compras (padrão: lê silver.purchases_clean)")
+    parser.add_argument("--out", default=OUT_PATH, help="Parquet de saída")
+    parser.add_argument("--buckets", type=int, default=BUCKETS,
+                        help="arquivos de hash por cliente (0 = Parquet já agrupado por customer_id)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_ROWS)
+    parser.add_argument("--today", default=None, help="data de referência (padrão: última compra)")
+    parser.add_argument("--check", action="store_true",
+                        help="compara o resultado com silver.clients_features")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    conn = None
+    if args.parquet:
+        blocks = features_from_parquet(args.parquet, args.buckets, args.today, args.batch_size)
+    else:
+        from data_access import connect, load_settings
+        settings = load_settings()
+        conn = connect(settings)
+        blocks = features_from_sql(conn, settings, args.today, args.batch_size)
+
+    rows = write_features(blocks, args.out)
+    print(f">> Features calculadas: {rows} clientes em {time.perf_counter() - start:.2f}s -> {args.out}")
+
+    if args.check:
+        from data_access import connect, load_settings, read_features
+        settings = load_settings()
+        conn = conn or connect(settings)
+        report = compare_features(read_parquet(args.out), read_features(conn, settings))
+        print_parity(report)
+    if conn is not None:
+        conn.close()
@@ -0,0 +1,163 @@
+# ============================================
+# RoadWise - ClickBus | Índice de Filtros do Dashboard
+# Estruturas montadas uma vez por dataset carregado
+# ============================================
+#
+# Em vez de copiar e varrer o DataFrame inteiro a cada rerun, o índice guarda:
+#   - a ordem dos clientes por score_priority (desc), já pré-ordenada:
+#     score mínimo vira um corte por busca binária e o Top N sai sem sort;
+#   - bitmaps por persona, alinhados à ordem de score;
+#   - a data da última compra como inteiro (dias desde 1970) para a recência;
+#   - um índice ordenado de customer_id (binário de 32 bytes, ids.py) para a
+#     busca por prefixo: o prefixo hex vira uma faixa [menor, maior] de bytes.
+#
+# query_ranks() devolve posições na ordem de score (o Top N é só um slice,
+# sem sort); com limit, a varredura para assim que o Top N está completo.
+# positions() converte para posições de linha (iloc).
+
+import numpy as np
+import pandas as pd
+
+from ids import fixed_width, prefix_bounds
+
+HOT_SCORE = 0.7          # limiar de "cliente quente"
+LIMIT_BLOCK = 65_536     # bloco inicial da varredura do Top N (query_ranks com limit)
+NO_DATE = np.iinfo(np.int32).min
+
+
+def epoch_days(values) -> np.ndarray:
+    ts = pd.to_datetime(values, errors="coerce")
+    days = ts.to_numpy(dtype="datetime64[D]").astype("int64")
+    days[pd.isna(ts)] = NO_DATE
+    return days.astype(np.int32)
+
+
+def today_epoch_day() -> int:
+    return int(np.datetime64(pd.Timestamp.today().normalize().date(), "D").astype("int64"))
+
+
+class FilterIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        score = df["score_priority"].to_numpy(dtype=np.float32)
+
+        # Ordem global por score desc; tudo abaixo fica alinhado a esta ordem ("rank")
+        self.order = np.argsort(-score, kind="stable")
+        self.score_rank = score[self.order]
+        self._neg_score_rank = -self.score_rank   # crescente, para searchsorted
+        self.ticket_rank = df["ticket_medio"].to_numpy(dtype=np.float64)[self.order]
+        self.prob30_rank = df["prob_repurchase_30d"].to_numpy(dtype=np.float64)[self.order]
+
+        personas = df["persona"].astype("category")
+        self.personas = [str(p) for p in personas.cat.categories]
+        codes_rank = personas.cat.codes.to_numpy()[self.order]
+        self.persona_codes_rank = codes_rank   # -1 = sem persona; usado pela seleção de campanha
+        self.persona_bitmaps = {p: codes_rank == i for i, p in enumerate(self.personas)}
+
+        if "last_purchase" in df.columns:
+            self.last_day_rank = epoch_days(df["last_purchase"])[self.order]
+            valid = self.last_day_rank[self.last_day_rank != NO_DATE]
+            self.min_last_day = int(valid.min()) if len(valid) else None
+        else:
+            self.last_day_rank = None
+            self.min_last_day = None
+
+        # Índice de prefixo: IDs binários ordenados (mesma ordem do hex) + posição no rank
+        ids = fixed_width(df["customer_id"])[self.order]
+        id_order = np.argsort(ids, kind="stable")
+        self.sorted_ids = ids[id_order]
+        self.sorted_id_rank = id_order
+
+    # -----------------------------
+    # Consultas
+    # -----------------------------
+    @property
+    def has_recency(self) -> bool:
+        return self.min_last_day is not None
+
+    def max_days(self, today_day=None, default=3650) -> int:
+        if not self.has_recency:
+            return default
+        today_day = today_epoch_day() if today_day is None else today_day
+        return int(today_day - self.min_last_day)
+
+    def score_cut(self, score_min) -> int:
+        """Quantidade de clientes com score >= score_min (busca binária na ordem pré-calculada)."""
+        return int(np.searchsorted(self._neg_score_rank, -np.float32(score_min), side="right"))
+
+    def prefix_ranks(self, prefix: str) -> np.ndarray:
+        """Posições (no rank) dos IDs cujo hex começa com o prefixo, em ordem de score."""
+        bounds = prefix_bounds(prefix)
+        if bounds is None:
+            return np.empty(0, dtype=np.int64)   # não é hex: nenhum ID casa
+        lo = np.searchsorted(self.sorted_ids, bounds[0], side="left")
+        hi = np.searchsorted(self.sorted_ids, bounds[1], side="right")
+        return np.sort(self.sorted_id_rank[lo:hi])
+
+    def _mask(self, sel, personas, ticket_min, days_max, today_day) -> np.ndarray:
+        """Filtros de persona, ticket e recência sobre sel (faixa do rank ou posições no rank)."""
+        n = sel.stop - sel.start if isinstance(sel, slice) else len(sel)
+        mask = np.ones(n, dtype=bool)
+        if personas:
+            chosen = np.zeros_like(mask)
+            for p in personas:
+                bitmap = self.persona_bitmaps.get(p)
+                if bitmap is not None:
+                    chosen |= bitmap[sel]
+            mask &= chosen
+        if ticket_min:
+            mask &= self.ticket_rank[sel] >= float(ticket_min)
+        if days_max is not None and self.last_day_rank is not None:
+            last_day = self.last_day_rank[sel]
+            mask &= (last_day != NO_DATE) & (last_day >= today_day - int(days_max))
+        return mask
+
+    def query_ranks(self, personas=(), score_min=0.0, ticket_min=0.0, search="",
+                    days_max=None, today_day=None, limit=None) -> np.ndarray:
+        """Posições no rank que passam nos filtros; com limit, só as `limit` primeiras (Top N)."""
+        k = self.score_cut(score_min)
+        if days_max is not None and today_day is None:
+            today_day = today_epoch_day()
+        filters = (personas, ticket_min, days_max, today_day)
+
+        if search and search.strip():
+            ranks = self.prefix_ranks(search)
+            ranks = ranks[ranks < k]
+            ranks = ranks[self._mask(ranks, *filters)]
+            return ranks if limit is None else ranks[:int(limit)]
+        if limit is None:
+            return np.flatnonzero(self._mask(slice(0, k), *filters))
+
+        # Top N: percorre o rank em blocos crescentes e para ao juntar `limit` posições
+        limit = int(limit)
+        parts, found, start = [], 0, 0
+        block = max(4 * limit, LIMIT_BLOCK)
+        while start < k and found < limit:
+            stop = min(start + block, k)
+            hits = start + np.flatnonzero(self._mask(slice(start, stop), *filters))
+            parts.append(hits)
+            found += len(hits)
+            start, block = stop, 2 * block
+        return np.concatenate(parts)[:limit] if parts else np.empty(0, dtype=np.int64)
+
+    def query(self, **filters) -> np.ndarray:
+        """Posições de linha (iloc) que passam nos filtros, ordenadas por score desc."""
+        return self.order[self.query_ranks(**filters)]
+
+    def positions(self, ranks: np.ndarray) -> np.ndarray:
+        return self.order[ranks]
+
+    def summary(self, ranks: np.ndarray) -> dict:
+        """Agregados dos chips de resumo para um conjunto filtrado."""
+        n = int(len(ranks))
+        if not n:
+            return {"count": 0, "pct_quentes": 0.0, "ticket_medio": 0.0,
+                    "receita_pot": 0.0, "ticket_sum": 0.0}
+        ticket = self.ticket_rank[ranks]
+        return {
+            "count": n,
+            "pct_quentes": float((self.score_rank[ranks] >= HOT_SCORE).mean() * 100),
+            "ticket_medio": float(ticket.mean()),
+            "receita_pot": float((ticket * self.prob30_rank[ranks]).sum()),
+            "ticket_sum": float(ticket.sum()),
+        }
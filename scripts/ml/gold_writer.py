@@ -0,0 +1,599 @@
+# ============================================
+# RoadWise - ClickBus | Gold Layer Writer
+# Escrita em lote (set-based) de gold.customer_predictions
+# ============================================
+#
+# Substitui o loop iterrows + INSERT linha a linha:
+#   1. cada coluna é convertida uma única vez, de forma vetorizada;
+#   2. as linhas vão para uma tabela de staging em lotes grandes
+#      (executemany / fast_executemany no pyodbc);
+#   3. a staging é trocada pela tabela final numa única transação,
+#      então quem lê o Gold nunca encontra a tabela vazia.
+#
+# Modo incremental (upsert): cada linha leva um row_hash das colunas
+# pontuadas; só clientes novos/alterados vão para a staging, e o MERGE +
+# DELETE dos clientes que saíram da base rodam numa única transação.
+#
+# O backend é plugável: SqlServerBackend (produção, pyodbc) e
+# SqliteBackend (stand-in local para rodar sem SQL Server).
+#
+# customer_id e top_destination chegam no binário de 32 bytes (ids.py): a
+# comparação com o snapshot anterior é feita no binário e o hex só é gerado
+# nas tuplas enviadas ao banco, que continua com NVARCHAR.
+
+import time
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from ids import compact, hex_categorical, to_binary, to_hex
+
+GOLD_SCHEMA = "gold"
+GOLD_TABLE = "customer_predictions"
+PUBLISH_LOG_TABLE = "publish_log"
+
+# (coluna, tipo SQL, conversão Python)
+# conversões: "str", "id" (binário -> hex), "datetime", "int", ou um inteiro = casas decimais (float)
+GOLD_COLUMNS = [
+    ("customer_id", "NVARCHAR(128) NOT NULL PRIMARY KEY", "id"),
+    ("last_purchase", "DATETIME2(0)", "datetime"),
+    ("days_since_last_purchase", "INT", "int"),
+    ("purchases_last_30d", "INT", "int"),
+    ("purchases_last_90d", "INT", "int"),
+    ("purchases_last_180d", "INT", "int"),
+    ("total_purchases_lifetime", "INT", "int"),
+    ("ticket_medio", "DECIMAL(12,2)", 2),
+    ("top_destination", "NVARCHAR(255)", "id"),
+    ("last_purchase_month", "TINYINT", "int"),
+    ("last_purchase_week", "TINYINT", "int"),
+    ("last_purchase_dayofweek", "TINYINT", "int"),
+    ("last_purchase_period", "VARCHAR(16)", "str"),
+    ("prob_repurchase_7d", "DECIMAL(6,4)", 4),
+    ("prob_repurchase_30d", "DECIMAL(6,4)", 4),
+    ("segment", "INT", "int"),
+    ("score_priority", "DECIMAL(6,4)", 4),
+    ("row_hash", "BIGINT", "int"),
+]
+
+PUBLISH_LOG_COLUMNS = [
+    ("run_at", "DATETIME2(0)", "datetime"),
+    ("mode", "VARCHAR(16)", "str"),
+    ("rows_inserted", "INT", "int"),
+    ("rows_updated", "INT", "int"),
+    ("rows_deleted", "INT", "int"),
+    ("rows_unchanged", "INT", "int"),
+    ("seconds", "DECIMAL(12,3)", 3),
+]
+
+DEFAULT_BATCH_SIZE = 50_000
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class SqlServerBackend:
+    """Backend de produção (pyodbc + fast_executemany)."""
+
+    datetime_as_text = False
+
+    def __init__(self, conn, schema=GOLD_SCHEMA):
+        self.conn = conn
+        self.schema = schema
+
+    def qualify(self, table):
+        return f"{self.schema}.{table}"
+
+    def drop_if_exists(self, cursor, table):
+        name = self.qualify(table)
+        cursor.execute(f"IF OBJECT_ID('{name}', 'U') IS NOT NULL DROP TABLE {name};")
+
+    def cursor(self):
+        cursor = self.conn.cursor()
+        cursor.fast_executemany = True
+        return cursor
+
+    def table_columns(self, cursor, table):
+        cursor.execute(
+            "SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?);",
+            (self.qualify(table),)
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+    def swap(self, cursor, stage, target):
+        # DROP + sp_rename na mesma transação: a troca é atômica para os leitores
+        self.drop_if_exists(cursor, target)
+        cursor.execute(f"EXEC sp_rename '{self.qualify(stage)}', '{target}';")
+
+    def upsert(self, cursor, stage, target, columns, key):
+        names = [name for name, _, _ in columns]
+        updates = ", ".join(f"t.{c} = s.{c}" for c in names if c != key)
+        cols = ", ".join(names)
+        vals = ", ".join(f"s.{c}" for c in names)
+        cursor.execute(f"""
+            MERGE {self.qualify(target)} WITH (HOLDLOCK) AS t
+            USING {self.qualify(stage)} AS s
+               ON t.{key} = s.{key}
+            WHEN MATCHED AND t.row_hash <> s.row_hash THEN UPDATE SET {updates}
+            WHEN NOT MATCHED BY TARGET THEN INSERT ({cols}) VALUES ({vals});
+        """)
+
+    def delete_keys(self, cursor, keys_table, target, key):
+        cursor.execute(f"""
+            DELETE t FROM {self.qualify(target)} AS t
+            JOIN {self.qualify(keys_table)} AS k ON k.{key} = t.{key};
+        """)
+
+    def refresh_recency(self, cursor, target, today):
+        cursor.execute(f"""
+            UPDATE {self.qualify(target)}
+               SET days_since_last_purchase = DATEDIFF(DAY, last_purchase, CAST(? AS DATE))
+             WHERE days_since_last_purchase <> DATEDIFF(DAY, last_purchase, CAST(? AS DATE));
+        """, (today, today))
+        return cursor.rowcount
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+class SqliteBackend:
+    """Stand-in local: mesmo fluxo de escrita sobre um arquivo SQLite."""
+
+    datetime_as_text = True
+
+    def __init__(self, conn, schema=GOLD_SCHEMA):
+        if isinstance(conn, str):
+            conn = sqlite3.connect(conn)
+        self.conn = conn
+        self.schema = schema
+
+    def qualify(self, table):
+        # SQLite não tem schemas; o prefixo vira parte do nome
+        return f"{self.schema}_{table}"
+
+    def drop_if_exists(self, cursor, table):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.qualify(table)};")
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def table_columns(self, cursor, table):
+        cursor.execute(f"PRAGMA table_info({self.qualify(table)});")
+        return [r[1] for r in cursor.fetchall()]
+
+    def swap(self, cursor, stage, target):
+        self.drop_if_exists(cursor, target)
+        cursor.execute(f"ALTER TABLE {self.qualify(stage)} RENAME TO {self.qualify(target)};")
+
+    def upsert(self, cursor, stage, target, columns, key):
+        names = [name for name, _, _ in columns]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in names if c != key)
+        cols = ", ".join(names)
+        # "WHERE true" evita a ambiguidade do parser do SQLite com ON CONFLICT
+        cursor.execute(f"""
+            INSERT INTO {self.qualify(target)} ({cols})
+            SELECT {cols} FROM {self.qualify(stage)} WHERE true
+            ON CONFLICT({key}) DO UPDATE SET {updates}
+            WHERE row_hash <> excluded.row_hash;
+        """)
+
+    def delete_keys(self, cursor, keys_table, target, key):
+        cursor.execute(f"""
+            DELETE FROM {self.qualify(target)}
+            WHERE {key} IN (SELECT {key} FROM {self.qualify(keys_table)});
+        """)
+
+    def refresh_recency(self, cursor, target, today):
+        days = "CAST(julianday(date(?)) - julianday(date(last_purchase)) AS INTEGER)"
+        cursor.execute(f"""
+            UPDATE {self.qualify(target)}
+               SET days_since_last_purchase = {days}
+             WHERE days_since_last_purchase <> {days};
+        """, (today, today))
+        return cursor.rowcount
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+# -----------------------------
+# Conversão vetorizada
+# -----------------------------
+def _column_values(series: pd.Series, kind, datetime_as_text=False) -> list:
+    mask = series.isna().to_numpy()
+
+    if kind == "str":
+        values = series.astype(object).to_numpy(copy=True)
+    elif kind == "id":
+        values = to_hex(series)
+    elif kind == "datetime":
+        ts = pd.to_datetime(series, errors="coerce")
+        mask = ts.isna().to_numpy()
+        if datetime_as_text:
+            values = ts.dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+        else:
+            values = ts.dt.floor("s").dt.to_pydatetime()
+            values = np.asarray(values, dtype=object)
+    elif kind == "int":
+        values = pd.to_numeric(series, errors="coerce")
+        mask = values.isna().to_numpy()
+        values = values.fillna(0).astype("int64").to_numpy().astype(object)
+    else:
+        values = pd.to_numeric(series, errors="coerce")
+        mask = values.isna().to_numpy()
+        values = values.fillna(0).astype("float64").round(kind).to_numpy().astype(object)
+
+    values[mask] = None
+    return values.tolist()
+
+
+def to_rows(df: pd.DataFrame, columns=GOLD_COLUMNS, datetime_as_text=False) -> list:
+    """Converte o DataFrame em tuplas prontas para executemany (uma passada por coluna)."""
+    cols = []
+    for name, _, kind in columns:
+        if name in df.columns:
+            cols.append(_column_values(df[name], kind, datetime_as_text))
+        else:
+            cols.append([None] * len(df))
+    return list(zip(*cols))
+
+
+def row_hash(df: pd.DataFrame, columns=GOLD_COLUMNS, key="customer_id") -> pd.Series:
+    """Hash de 64 bits por linha sobre os valores já normalizados para o Gold.
+
+    Probabilidades são arredondadas na mesma precisão do DECIMAL de destino,
+    então variações abaixo do que é gravado não contam como alteração.
+    """
+    norm = {}
+    for name, _, kind in columns:
+        if name in (key, "row_hash"):
+            continue
+        if name not in df.columns:
+            continue
+        col = df[name]
+        if kind == "str":
+            norm[name] = col.astype(object).where(col.notna(), None)
+        elif kind == "id":
+            # Hex por valor distinto: o hash fica igual ao da coluna em texto
+            norm[name] = hex_categorical(col)
+        elif kind == "datetime":
+            norm[name] = pd.to_datetime(col, errors="coerce").dt.floor("s")
+        elif kind == "int":
+            norm[name] = pd.to_numeric(col, errors="coerce").round().astype("Int64")
+        else:
+            norm[name] = pd.to_numeric(col, errors="coerce").round(kind)
+    hashed = pd.util.hash_pandas_object(pd.DataFrame(norm, index=df.index), index=False)
+    return pd.Series(hashed.to_numpy().view("int64"), index=df.index, name="row_hash")
+
+
+def create_table_sql(backend, table, columns=GOLD_COLUMNS) -> str:
+    body = ",\n    ".join(f"{name} {sql_type}" for name, sql_type, _ in columns)
+    return f"CREATE TABLE {backend.qualify(table)} (\n    {body}\n);"
+
+
+def insert_sql(backend, table, columns=GOLD_COLUMNS) -> str:
+    names = ", ".join(name for name, _, _ in columns)
+    marks = ", ".join("?" for _ in columns)
+    return f"INSERT INTO {backend.qualify(table)} ({names}) VALUES ({marks});"
+
+
+def _executemany_batches(cursor, sql, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def replace_rows(backend, table, df: pd.DataFrame, columns, key="customer_id",
+                 batch_size=DEFAULT_BATCH_SIZE) -> int:
+    """Troca as linhas das chaves presentes em df (DELETE + INSERT) numa única transação.
+
+    Para tabelas sem row_hash (ex.: silver.clients_features); as demais linhas
+    ficam intactas.
+    """
+    stage = f"{table}_stage"
+    names = ", ".join(name for name, _, _ in columns)
+    cursor = backend.cursor()
+    try:
+        backend.drop_if_exists(cursor, stage)
+        cursor.execute(create_table_sql(backend, stage, columns))
+        rows = to_rows(df, columns, backend.datetime_as_text)
+        _executemany_batches(cursor, insert_sql(backend, stage, columns), rows, batch_size)
+        backend.delete_keys(cursor, stage, table, key)
+        cursor.execute(f"INSERT INTO {backend.qualify(table)} ({names}) SELECT {names} FROM {backend.qualify(stage)};")
+        backend.drop_if_exists(cursor, stage)
+        backend.commit()
+    except Exception:
+        backend.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def replace_table(backend, table, df: pd.DataFrame, columns, batch_size=DEFAULT_BATCH_SIZE) -> int:
+    """Carga completa de uma tabela pequena sem chave (ex.: o cubo de resumo).
+
+    Mesmo fluxo da carga completa do Gold: staging em lote e troca numa
+    única transação, sem row_hash nem comparação com o snapshot anterior.
+    """
+    stage = f"{table}_stage"
+    cursor = backend.cursor()
+    try:
+        backend.drop_if_exists(cursor, stage)
+        cursor.execute(create_table_sql(backend, stage, columns))
+        rows = to_rows(df, columns, backend.datetime_as_text)
+        _executemany_batches(cursor, insert_sql(backend, stage, columns), rows, batch_size)
+        backend.swap(cursor, stage, table)
+        backend.commit()
+    except Exception:
+        backend.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def refresh_recency(backend, table, today) -> int:
+    """Recalcula só days_since_last_purchase = DATEDIFF(DAY, last_purchase, today), no banco."""
+    cursor = backend.cursor()
+    try:
+        changed = backend.refresh_recency(cursor, table, str(today))
+        backend.commit()
+    except Exception:
+        backend.rollback()
+        raise
+    finally:
+        cursor.close()
+    return changed
+
+
+# -----------------------------
+# Writer
+# -----------------------------
+class GoldWriter:
+    """Publicação do Gold: carga completa (staging + troca) ou incremental (upsert)."""
+
+    key = "customer_id"
+
+    def __init__(self, backend, table=GOLD_TABLE, columns=GOLD_COLUMNS,
+                 batch_size=DEFAULT_BATCH_SIZE, log_table=PUBLISH_LOG_TABLE):
+        self.backend = backend
+        self.table = table
+        self.columns = columns
+        self.batch_size = int(batch_size)
+        self.log_table = log_table
+        self._stream = None
+
+    @property
+    def stage_table(self):
+        return f"{self.table}_stage"
+
+    @property
+    def delete_table(self):
+        return f"{self.table}_delete"
+
+    def _create_stage(self, cursor, table, columns):
+        self.backend.drop_if_exists(cursor, table)
+        cursor.execute(create_table_sql(self.backend, table, columns))
+
+    def _append_stage(self, cursor, table, df, columns):
+        rows = to_rows(df, columns, self.backend.datetime_as_text)
+        _executemany_batches(cursor, insert_sql(self.backend, table, columns), rows, self.batch_size)
+        return len(rows)
+
+    def _with_hash(self, df):
+        out = compact(df.copy(), [self.key])
+        out["row_hash"] = row_hash(df, self.columns, self.key)
+        return out
+
+    def _has_snapshot(self, cursor):
+        return "row_hash" in self.backend.table_columns(cursor, self.table)
+
+    def _previous_hashes(self, cursor, lower=None, upper=None):
+        """Snapshot anterior (customer_id, row_hash) na faixa de chaves (lower, upper].
+
+        Os limites vêm no binário e vão como hex para o SQL; as chaves lidas
+        voltam para o binário antes do merge.
+        """
+        where, params = [], []
+        if lower is not None:
+            where.append(f"{self.key} > ?")
+            params.append(to_hex([lower])[0])
+        if upper is not None:
+            where.append(f"{self.key} <= ?")
+            params.append(to_hex([upper])[0])
+        sql = f"SELECT {self.key}, row_hash FROM {self.backend.qualify(self.table)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        cursor.execute(sql + ";", params)
+        prev = pd.DataFrame.from_records(cursor.fetchall(), columns=[self.key, "row_hash"])
+        prev[self.key] = to_binary(prev[self.key])
+        prev["row_hash"] = pd.to_numeric(prev["row_hash"]).astype("int64")
+        return prev
+
+    def _finish(self, stats, start):
+        elapsed = time.perf_counter() - start
+        touched = stats["rows_inserted"] + stats["rows_updated"] + stats["rows_deleted"]
+        stats["rows"] = touched
+        stats["seconds"] = elapsed
+        stats["rows_per_sec"] = touched / elapsed if elapsed > 0 else float("inf")
+        self._log(stats)
+        rate = f"{stats['rows_per_sec']:,.0f}".replace(",", ".")
+        print(
+            f">> Gold Layer ({stats['mode']}): {stats['rows_inserted']} inseridos, "
+            f"{stats['rows_updated']} atualizados, {stats['rows_deleted']} removidos, "
+            f"{stats['rows_unchanged']} inalterados em {elapsed:.2f}s ({rate} linhas/s)"
+        )
+        return stats
+
+    def _log(self, stats):
+        cursor = self.backend.cursor()
+        try:
+            if not self.backend.table_columns(cursor, self.log_table):
+                cursor.execute(create_table_sql(self.backend, self.log_table, PUBLISH_LOG_COLUMNS))
+            entry = pd.DataFrame([{**stats, "run_at": pd.Timestamp.now()}])
+            cursor.executemany(
+                insert_sql(self.backend, self.log_table, PUBLISH_LOG_COLUMNS),
+                to_rows(entry, PUBLISH_LOG_COLUMNS, self.backend.datetime_as_text)
+            )
+            self.backend.commit()
+        finally:
+            cursor.close()
+
+    # -----------------------------
+    # Publicação em blocos
+    # -----------------------------
+    # open_stream() -> write_chunk() ... -> close_stream(). Cada bloco vai
+    # para a staging assim que chega; a troca (full) ou o MERGE + DELETE
+    # (incremental) só acontecem no close_stream, numa única transação.
+    # No modo incremental os blocos devem vir em ordem de customer_id (keyset):
+    # cada um é comparado ao snapshot anterior na faixa (chave anterior, upper].
+    def open_stream(self, mode="incremental", delete_missing=True):
+        if mode not in ("full", "incremental"):
+            raise ValueError(f"Modo de publicação inválido: {mode!r} (use 'full' ou 'incremental').")
+        cursor = self.backend.cursor()
+        try:
+            if mode == "incremental" and not self._has_snapshot(cursor):
+                if not delete_missing:
+                    # Carga parcial virando completa apagaria os demais clientes
+                    raise ValueError(
+                        f"{self.backend.qualify(self.table)} sem row_hash: publique uma carga completa antes."
+                    )
+                # Primeira carga (ou tabela sem row_hash): não há snapshot para comparar
+                mode = "full"
+            self._create_stage(cursor, self.stage_table, self.columns)
+            if mode == "incremental":
+                self._create_stage(cursor, self.delete_table, self._key_columns)
+        except Exception:
+            cursor.close()
+            raise
+        self._stream = {
+            "mode": mode, "cursor": cursor, "delete_missing": delete_missing,
+            "start": time.perf_counter(), "lower": None, "covered": False,
+            "stats": {"mode": mode, "rows_inserted": 0, "rows_updated": 0,
+                      "rows_deleted": 0, "rows_unchanged": 0},
+        }
+
+    @property
+    def _key_columns(self):
+        return [c for c in self.columns if c[0] == self.key]
+
+    def write_chunk(self, df: pd.DataFrame, upper=None):
+        """Envia um bloco para a staging. `upper` = última chave do bloco (None = sem limite)."""
+        stream = self._stream
+        cursor, stats = stream["cursor"], stream["stats"]
+        df = self._with_hash(df)
+        try:
+            if stream["mode"] == "full":
+                stats["rows_inserted"] += self._append_stage(cursor, self.stage_table, df, self.columns)
+            elif not stream["delete_missing"]:
+                # Bloco parcial: a comparação de hash fica para o SQL (só as chaves do bloco)
+                self._append_stage(cursor, self.stage_table, df, self.columns)
+            else:
+                prev = self._previous_hashes(cursor, stream["lower"], upper)
+                self._stage_diff(cursor, df, prev, stream)
+        except Exception:
+            self.abort_stream()
+            raise
+        stream["lower"] = upper
+        stream["covered"] = upper is None
+
+    def _stage_diff(self, cursor, df, prev, stream):
+        stats = stream["stats"]
+        merged = df[[self.key, "row_hash"]].merge(
+            prev, on=self.key, how="outer", suffixes=("", "_prev"), indicator=True
+        )
+        is_new = (merged["_merge"] == "left_only").to_numpy()
+        is_both = (merged["_merge"] == "both").to_numpy()
+        is_changed = is_both & (merged["row_hash"].to_numpy() != merged["row_hash_prev"].to_numpy())
+
+        changed_keys = merged.loc[is_new | is_changed, self.key]
+        changed = df[df[self.key].isin(changed_keys)]
+        if len(changed):
+            self._append_stage(cursor, self.stage_table, changed, self.columns)
+        if stream["delete_missing"]:
+            gone = merged.loc[(merged["_merge"] == "right_only").to_numpy(), [self.key]]
+            if len(gone):
+                self._append_stage(cursor, self.delete_table, gone, self._key_columns)
+            stats["rows_deleted"] += int(len(gone))
+
+        stats["rows_inserted"] += int(is_new.sum())
+        stats["rows_updated"] += int(is_changed.sum())
+        stats["rows_unchanged"] += int(is_both.sum() - is_changed.sum())
+
+    def _count_partial(self, cursor, stats):
+        stage, target = self.backend.qualify(self.stage_table), self.backend.qualify(self.table)
+        cursor.execute(f"SELECT COUNT(*) FROM {stage};")
+        staged = int(cursor.fetchone()[0])
+        cursor.execute(f"""
+            SELECT COUNT(*), SUM(CASE WHEN t.row_hash = s.row_hash THEN 1 ELSE 0 END)
+            FROM {stage} AS s JOIN {target} AS t ON t.{self.key} = s.{self.key};
+        """)
+        existing, unchanged = cursor.fetchone()
+        existing, unchanged = int(existing or 0), int(unchanged or 0)
+        stats["rows_inserted"] += staged - existing
+        stats["rows_updated"] += existing - unchanged
+        stats["rows_unchanged"] += unchanged
+
+    def close_stream(self) -> dict:
+        stream = self._stream
+        cursor = stream["cursor"]
+        try:
+            if stream["mode"] == "full":
+                self.backend.swap(cursor, self.stage_table, self.table)
+            else:
+                if stream["delete_missing"] and not stream["covered"]:
+                    # Clientes do snapshot acima da última chave recebida saíram da base
+                    tail = self._previous_hashes(cursor, stream["lower"], None)
+                    self._stage_diff(cursor, tail.iloc[0:0], tail, stream)
+                if not stream["delete_missing"]:
+                    self._count_partial(cursor, stream["stats"])
+                # MERGE + DELETE na mesma transação: leitores veem o snapshot antigo ou o novo
+                self.backend.upsert(cursor, self.stage_table, self.table, self.columns, self.key)
+                self.backend.delete_keys(cursor, self.delete_table, self.table, self.key)
+                self.backend.drop_if_exists(cursor, self.stage_table)
+                self.backend.drop_if_exists(cursor, self.delete_table)
+            self.backend.commit()
+        except Exception:
+            self.abort_stream()
+            raise
+        cursor.close()
+        self._stream = None
+        return self._finish(stream["stats"], stream["start"])
+
+    def abort_stream(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            self.backend.rollback()
+            stream["cursor"].close()
+
+    # -----------------------------
+    # Publicação de um DataFrame inteiro
+    # -----------------------------
+    def write(self, df: pd.DataFrame) -> dict:
+        """Carga completa: staging em lote + troca atômica com a tabela final."""
+        self.open_stream("full")
+        self.write_chunk(df)
+        return self.close_stream()
+
+    def upsert(self, df: pd.DataFrame, delete_missing=True) -> dict:
+        """Publicação incremental: grava só clientes novos/alterados e remove os que saíram.
+
+        Com delete_missing=False o DataFrame é tratado como parcial (apenas os
+        clientes presentes são comparados) e nada é removido.
+        """
+        self.open_stream("incremental", delete_missing=delete_missing)
+        self.write_chunk(df)
+        return self.close_stream()
+
+    def publish(self, df: pd.DataFrame, mode="incremental") -> dict:
+        if mode == "full":
+            return self.write(df)
+        if mode == "incremental":
+            return self.upsert(df)
+        raise ValueError(f"Modo de publicação inválido: {mode!r} (use 'full' ou 'incremental').")
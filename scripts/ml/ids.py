@@ -0,0 +1,245 @@
+# ============================================
+# RoadWise - ClickBus | IDs Compactos
+# customer_id e destinos (hashes SHA-256) em binário de 32 bytes
+# ============================================
+#
+# Na base, customer_id, place_destination_departure e top_destination são
+# hashes SHA-256 em hex (64 caracteres). Como objetos str do Python cada um
+# ocupa ~120 bytes por linha; em binário fixo são 32 bytes, num único buffer
+# contíguo (fixed_size_binary[32] do Arrow, ArrowDtype no pandas).
+#
+# O hex só existe nas bordas:
+#   - entrada: leituras da Silver (data_access), Parquet/CSV externos e o
+#     parâmetro das APIs -> to_binary() / compact();
+#   - saída: linhas gravadas no SQL (gold_writer), CSV, tabela do dashboard e
+#     JSON do serviço -> to_hex() / readable().
+# Joins, deduplicação, ordenação e os índices de busca usam o binário. A ordem
+# dos bytes é a mesma do hex, então o keyset por customer_id não muda.
+#
+# No artefato do dashboard top_destination vai como dicionário (códigos
+# int32 + tabela de destinos em hex): hex_categorical() converte só os
+# valores distintos.
+
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+ID_BYTES = 32
+ID_HEX = 2 * ID_BYTES
+BINARY = pa.binary(ID_BYTES)
+ID_DTYPE = pd.ArrowDtype(BINARY)
+
+# Colunas com hashes SHA-256 (compras e features)
+ID_COLUMNS = ("customer_id", "top_destination", "place_destination_departure")
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_NIBBLE = np.full(256, 255, dtype=np.uint8)
+_NIBBLE[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+_NIBBLE[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+_NIBBLE[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+
+# -----------------------------
+# Arrow
+# -----------------------------
+def _raw(arr: pa.FixedSizeBinaryArray) -> np.ndarray:
+    """Bytes dos IDs como matriz (n, 32) de uint8, sem cópia (nulos ficam com lixo/zeros)."""
+    if len(arr) == 0:
+        return np.empty((0, ID_BYTES), dtype=np.uint8)
+    data = np.frombuffer(arr.buffers()[1], dtype=np.uint8)
+    start = arr.offset * ID_BYTES
+    return data[start:start + len(arr) * ID_BYTES].reshape(-1, ID_BYTES)
+
+
+def _validity(arr: pa.Array):
+    return arr.is_valid().buffers()[1] if arr.null_count else None
+
+
+def _from_raw(raw: np.ndarray, validity=None) -> pa.FixedSizeBinaryArray:
+    raw = np.ascontiguousarray(raw, dtype=np.uint8)
+    return pa.FixedSizeBinaryArray.from_buffers(BINARY, len(raw), [validity, pa.py_buffer(raw)])
+
+
+def _decode(arr: pa.Array) -> pa.FixedSizeBinaryArray:
+    """Texto hex (string/binary) -> binário; bytes crus de 32 posições só mudam de tipo."""
+    lengths = pc.binary_length(arr).to_numpy(zero_copy_only=False)
+    valid = ~np.asarray(arr.is_null())
+    if pa.types.is_binary(arr.type) and (lengths[valid] == ID_BYTES).all():
+        return arr.cast(BINARY)
+    bad = valid & (lengths != ID_HEX)
+    if bad.any():
+        raise ValueError(f"ID fora do formato hex de {ID_HEX} caracteres: {arr[int(np.argmax(bad))]}")
+
+    # Todos com 64 bytes: os caracteres ficam contíguos no buffer de dados
+    filled = pc.fill_null(arr, "0" * ID_HEX) if arr.null_count else arr
+    offset_type = np.int64 if pa.types.is_large_string(arr.type) or pa.types.is_large_binary(arr.type) else np.int32
+    first = int(np.frombuffer(filled.buffers()[1], dtype=offset_type)[filled.offset])
+    chars = np.frombuffer(filled.buffers()[2], dtype=np.uint8)[first:first + len(filled) * ID_HEX]
+    nibbles = _NIBBLE[chars].reshape(-1, ID_HEX)
+    if (nibbles == 255).any():
+        row = int(np.argmax((nibbles == 255).any(axis=1)))
+        raise ValueError(f"ID com caractere fora do hex: {arr[row]}")
+    raw = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    return _from_raw(raw, _validity(arr))
+
+
+def binary_array(values) -> pa.FixedSizeBinaryArray:
+    """IDs (hex, categorias, dicionário Arrow ou já binários) como fixed_size_binary[32]."""
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        # Converte só as categorias; as linhas são um take pelos códigos
+        codes = np.asarray(values.codes, dtype=np.int32)
+        return binary_array(values.categories).take(pa.array(codes, mask=codes < 0))
+    if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = pa.array(values, from_pandas=True)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    typ = values.type
+    if typ == BINARY:
+        return values
+    if pa.types.is_dictionary(typ):
+        return binary_array(values.dictionary).take(values.indices)
+    if pa.types.is_null(typ):
+        return pa.nulls(len(values), BINARY)
+    if len(values) == 0:
+        return pa.array([], type=BINARY)
+    if (pa.types.is_string(typ) or pa.types.is_large_string(typ)
+            or pa.types.is_binary(typ) or pa.types.is_large_binary(typ)):
+        return _decode(values)
+    raise TypeError(f"Tipo de ID não suportado: {typ}")
+
+
+def hex_array(values) -> pa.StringArray:
+    """Binário -> texto hex minúsculo (nulos continuam nulos)."""
+    arr = binary_array(values)
+    raw = _raw(arr)
+    chars = np.empty((len(arr), ID_HEX), dtype=np.uint8)
+    chars[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    chars[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+    large = len(arr) * ID_HEX >= 2**31
+    offsets = np.arange(len(arr) + 1, dtype=np.int64 if large else np.int32) * ID_HEX
+    return pa.Array.from_buffers(
+        pa.large_string() if large else pa.string(), len(arr),
+        [_validity(arr), pa.py_buffer(offsets), pa.py_buffer(chars)],
+    )
+
+
+# -----------------------------
+# pandas
+# -----------------------------
+def to_binary(values) -> pd.api.extensions.ExtensionArray:
+    """Coluna compacta (ArrowDtype fixed_size_binary[32]); já compacta volta sem cópia."""
+    if is_compact(values):
+        return values.array if isinstance(values, (pd.Series, pd.Index)) else values
+    return pd.arrays.ArrowExtensionArray(binary_array(values))
+
+
+def to_hex(values) -> np.ndarray:
+    """Hex como objetos str (None nos nulos): só para as bordas (SQL, CSV, tela, JSON)."""
+    return hex_array(values).to_numpy(zero_copy_only=False)
+
+
+def hex_categorical(values) -> pd.Categorical:
+    """Códigos + tabela de valores distintos em hex (o hex é gerado uma vez por valor)."""
+    encoded = binary_array(values).dictionary_encode()
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    codes = np.where(np.asarray(encoded.is_null()), -1, codes).astype(np.int32)
+    return pd.Categorical.from_codes(codes, categories=pd.Index(to_hex(encoded.dictionary), dtype=object))
+
+
+def is_compact(values) -> bool:
+    return getattr(values, "dtype", None) == ID_DTYPE
+
+
+def fixed_width(values) -> np.ndarray:
+    """IDs como array NumPy 'S32' (sem cópia): ordena e compara na mesma ordem do hex."""
+    return _raw(binary_array(values)).view(f"S{ID_BYTES}").ravel()
+
+
+def compact(df: pd.DataFrame, columns=ID_COLUMNS) -> pd.DataFrame:
+    """Converte as colunas de hash presentes para o binário, no próprio DataFrame."""
+    for col in columns:
+        if col in df.columns and not is_compact(df[col]):
+            df[col] = to_binary(df[col])
+    return df
+
+
+def readable(df: pd.DataFrame, columns=ID_COLUMNS) -> pd.DataFrame:
+    """Cópia com as colunas de hash em hex (CSV, tabela do dashboard)."""
+    binary = [col for col in columns if col in df.columns and is_compact(df[col])]
+    if not binary:
+        return df
+    return df.assign(**{col: to_hex(df[col]) for col in binary})
+
+
+def parse_id(text):
+    """Um ID vindo de fora (URL, busca) como 32 bytes; None se não for hex de 64 caracteres."""
+    try:
+        raw = bytes.fromhex(str(text).strip())
+    except ValueError:
+        return None
+    return raw if len(raw) == ID_BYTES else None
+
+
+def prefix_bounds(prefix: str):
+    """Faixa [menor, maior] de IDs binários cujo hex começa com o prefixo (None se não for hex)."""
+    prefix = prefix.strip().lower()
+    if len(prefix) > ID_HEX or any(c not in "0123456789abcdef" for c in prefix):
+        return None
+    pad = ID_HEX - len(prefix)
+    return bytes.fromhex(prefix + "0" * pad), bytes.fromhex(prefix + "f" * pad)
+
+
+def id_hash(values, seed=0) -> np.ndarray:
+    """Hash uint64 estável por ID (splitmix64 sobre as 4 palavras de 64 bits)."""
+    words = np.ascontiguousarray(_raw(binary_array(values))).view("<u8")
+    h = np.full(len(words), (int(seed) * 0x9E3779B97F4A7C15) % 2**64, dtype=np.uint64)
+    for i in range(words.shape[1]):
+        h = _mix64(h ^ words[:, i])
+    return h
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# -----------------------------
+# Parquet
+# -----------------------------
+def types_mapper(typ):
+    """types_mapper do to_pandas: fixed_size_binary[32] vira a coluna compacta (não objetos bytes)."""
+    return ID_DTYPE if typ == BINARY else None
+
+
+def read_parquet(path: str, columns=None) -> pd.DataFrame:
+    return pq.read_table(path, columns=columns).to_pandas(types_mapper=types_mapper)
+
+
+def arrow_table(df: pd.DataFrame) -> pa.Table:
+    """DataFrame -> Table sem índice, com metadados pandas legíveis por qualquer leitor.
+
+    O pandas anota a coluna compacta como 'fixed_size_binary[32][pyarrow]', que o
+    pd.read_parquet não sabe reconstruir; a anotação vira 'object' (bytes) e o
+    resto dos metadados (categorias etc.) é mantido. read_parquet() continua
+    devolvendo a coluna compacta pelo types_mapper.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = table.schema.pandas_metadata
+    binary = [c for c in (meta or {}).get("columns", []) if str(c["numpy_type"]).endswith("[pyarrow]")]
+    if not binary:
+        return table
+    for col in binary:
+        col["numpy_type"] = "object"
+    return table.replace_schema_metadata({**table.schema.metadata, b"pandas": json.dumps(meta).encode()})
+
+
+def write_parquet(df: pd.DataFrame, path: str, **kwargs):
+    """Parquet via arrow_table(): abre com pd.read_parquet e com read_parquet()."""
+    pq.write_table(arrow_table(df), path, **kwargs)
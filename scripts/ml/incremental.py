@@ -0,0 +1,241 @@
+# ============================================
+# RoadWise - ClickBus | Atualização Incremental (delta)
+# Recalcula features e scores só dos clientes que mudaram
+# ============================================
+#
+# Em vez de reconstruir silver.clients_features e re-pontuar a base inteira,
+# cada ciclo parte de uma marca d'água (watermark.json) com a última
+# purchase_datetime processada e a data de referência (@today) da rodada:
+#
+#   1. clientes com compras novas (purchase_datetime > watermark) e clientes
+#      com compras que saíram de alguma janela de 30/90/180 dias entre o
+#      @today anterior e o novo são recalculados (feature_engine) e pontuados;
+#   2. os demais só têm days_since_last_purchase atualizado, direto no banco
+#      (UPDATE set-based, sem trafegar linhas);
+#   3. o resultado parcial entra na Silver (DELETE + INSERT das chaves), no
+#      Gold (upsert por row_hash, sem remoção) e no artefato do dashboard;
+#   4. o cubo de resumo (gold.customer_summary_cube e summary_cube.arrow) é
+#      refeito a partir do artefato mesclado, com a versão nova do artefato.
+#
+# O custo por ciclo acompanha o volume de compras novas, não o tamanho da base.
+# Os scores dos clientes sem compra nova continuam os da última pontuação;
+# uma rodada completa de score.py de tempos em tempos realinha a base toda.
+#
+# Uso: python incremental.py --init    (grava a watermark após uma carga completa)
+#      python incremental.py [--version VERSÃO]
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ARROW_PATH, CSV_PATH, export_predictions, read_predictions
+from feature_engine import (BATCH_ROWS, PURCHASE_COLUMNS, WINDOWS, compute_features,
+                            epoch_day, iter_customer_blocks)
+from gold_writer import GoldWriter, refresh_recency, replace_rows
+from ids import compact
+from score import EXPORT_CSV, GOLD_BATCH_SIZE, publish_cube, score_customers
+from summary_cube import build_cube
+
+WATERMARK_PATH = "watermark.json"
+
+# silver.clients_features (scripts/silver/ddl_silver.sql), no formato do gold_writer
+FEATURE_SQL_COLUMNS = [
+    ("customer_id", "NVARCHAR(128) NOT NULL PRIMARY KEY", "id"),
+    ("last_purchase", "DATETIME2(0) NOT NULL", "datetime"),
+    ("days_since_last_purchase", "INT NOT NULL", "int"),
+    ("purchases_last_30d", "INT NOT NULL", "int"),
+    ("purchases_last_90d", "INT NOT NULL", "int"),
+    ("purchases_last_180d", "INT NOT NULL", "int"),
+    ("total_purchases_lifetime", "INT NOT NULL", "int"),
+    ("top_destination", "NVARCHAR(255)", "id"),
+    ("last_purchase_month", "TINYINT", "int"),
+    ("last_purchase_week", "TINYINT", "int"),
+    ("last_purchase_dayofweek", "TINYINT", "int"),
+    ("last_purchase_period", "VARCHAR(16)", "str"),
+    ("ticket_medio", "DECIMAL(12,2)", 2),
+]
+
+
+# -----------------------------
+# Watermark
+# -----------------------------
+def load_watermark(path: str = WATERMARK_PATH) -> dict:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def save_watermark(max_datetime, path: str = WATERMARK_PATH, **extra) -> dict:
+    max_datetime = pd.Timestamp(max_datetime)
+    mark = {
+        "max_datetime": max_datetime.isoformat(sep=" "),
+        "today": str(max_datetime.date()),
+        "updated_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        **extra,
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(mark, fh, indent=2)
+    os.replace(tmp, path)
+    return mark
+
+
+# -----------------------------
+# Clientes alterados
+# -----------------------------
+def _sql_datetime(value) -> str:
+    return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def changed_purchases_query(watermark: dict, today, table: str):
+    """Compras (todas) dos clientes que mudaram desde a watermark.
+
+    Um cliente muda se comprou depois da watermark ou se alguma compra dele
+    saiu de uma janela: corte antigo < purchase_datetime <= corte novo.
+    """
+    old_today = pd.Timestamp(watermark["today"])
+    new_today = pd.Timestamp(today).normalize()
+    conditions = ["purchase_datetime > ?"]
+    params = [_sql_datetime(watermark["max_datetime"])]
+    if new_today > old_today:
+        for n in WINDOWS:
+            conditions.append("(purchase_datetime > ? AND purchase_datetime <= ?)")
+            params += [_sql_datetime(old_today - pd.Timedelta(days=n)),
+                       _sql_datetime(new_today - pd.Timedelta(days=n))]
+    columns = ", ".join(f"p.{c}" for c in PURCHASE_COLUMNS)
+    sql = f"""
+SELECT {columns}
+FROM {table} AS p
+WHERE p.customer_id IN (
+    SELECT customer_id FROM {table}
+    WHERE {" OR ".join(conditions)}
+)
+ORDER BY p.customer_id;"""
+    return sql, params
+
+
+def recompute_changed(conn, settings, watermark: dict, today, batch_size=BATCH_ROWS) -> pd.DataFrame:
+    """Features (com o novo @today) dos clientes alterados, em blocos de clientes completos."""
+    from data_access import PURCHASES_TABLE, iter_sql_batches, table_name
+
+    sql, params = changed_purchases_query(watermark, today, table_name(PURCHASES_TABLE, settings))
+    batches = (compact(batch) for batch in iter_sql_batches(conn, sql, params, batch_size, settings))
+    parts = [compute_features(block, today) for block in iter_customer_blocks(batches)]
+    if not parts:
+        return compute_features(pd.DataFrame(columns=PURCHASE_COLUMNS))
+    return pd.concat(parts, ignore_index=True)
+
+
+# -----------------------------
+# Artefato do dashboard
+# -----------------------------
+def merge_artifact(scored: pd.DataFrame, today, path: str = ARROW_PATH):
+    """Substitui os clientes pontuados no artefato e atualiza a recência dos demais.
+
+    Devolve a base mesclada (None se o artefato não existir).
+    """
+    if not os.path.exists(path):
+        print(f">> {path} não encontrado; artefato não atualizado.")
+        return None
+    old = compact(read_predictions(path).drop(columns=["persona"], errors="ignore"))
+    keep = old[~old["customer_id"].isin(scored["customer_id"])]
+    merged = pd.concat([keep, scored.reindex(columns=old.columns)], ignore_index=True)
+    merged = merged.sort_values("customer_id", ignore_index=True)
+
+    last_day = pd.to_datetime(merged["last_purchase"]).to_numpy(dtype="datetime64[D]").astype(np.int64)
+    merged["days_since_last_purchase"] = epoch_day(today) - last_day
+    export_predictions(merged, path)
+    return merged
+
+
+# -----------------------------
+# Ciclo incremental
+# -----------------------------
+def run_delta(conn, settings, bundle: dict, watermark_path: str = WATERMARK_PATH,
+              batch_size=BATCH_ROWS) -> dict:
+    from data_access import max_purchase_datetime, writer_backend
+
+    watermark = load_watermark(watermark_path)
+    if watermark is None:
+        raise FileNotFoundError(
+            f"{watermark_path} não encontrado: rode uma carga completa e depois incremental.py --init."
+        )
+
+    start = time.perf_counter()
+    max_dt = max_purchase_datetime(conn, settings)
+    if pd.isna(max_dt):
+        print(">> Nenhuma compra em silver.purchases_clean.")
+        return {"changed": 0}
+    max_dt = pd.Timestamp(max_dt)
+    today = max_dt.normalize()
+    if max_dt <= pd.Timestamp(watermark["max_datetime"]) and str(today.date()) == watermark["today"]:
+        print(">> Nenhuma compra nova desde", watermark["max_datetime"])
+        return {"changed": 0}
+
+    # 1. Features e scores dos clientes alterados
+    features = recompute_changed(conn, settings, watermark, today, batch_size)
+    print(f">> Clientes alterados: {len(features)} em {time.perf_counter() - start:.2f}s")
+    scored = score_customers(features.copy(), bundle) if len(features) else features
+
+    # 2. Silver: troca as linhas alteradas + recência dos demais
+    silver = writer_backend(conn, settings, schema="silver")
+    replace_rows(silver, "clients_features", features, FEATURE_SQL_COLUMNS)
+    silver_recency = refresh_recency(silver, "clients_features", today.date())
+
+    # 3. Gold: upsert parcial (ninguém é removido) + recência dos demais.
+    # A recência atualizada no banco deixa o row_hash defasado; a próxima
+    # pontuação completa regrava essas linhas com o hash correto.
+    gold = writer_backend(conn, settings)
+    stats = {}
+    if len(scored):
+        stats = GoldWriter(gold, batch_size=GOLD_BATCH_SIZE).upsert(scored, delete_missing=False)
+    gold_recency = refresh_recency(gold, "customer_predictions", today.date())
+    print(f">> Recência atualizada: {silver_recency} linhas na Silver, {gold_recency} no Gold")
+
+    # 4. Artefato do dashboard
+    base, exported = None, []
+    for path in [ARROW_PATH] + ([CSV_PATH] if EXPORT_CSV else []):
+        merged = merge_artifact(scored, today, path)
+        if merged is not None:
+            print(f">> Arquivo {path} atualizado: {len(merged)} linhas")
+            base = merged if base is None else base
+            exported.append(path)
+
+    # 5. Cubo de resumo: KPIs do Gold e do dashboard na mesma versão do artefato
+    cube_cells = 0
+    if base is not None:
+        cube_cells = publish_cube(build_cube(base), gold, exported)
+        del base
+
+    save_watermark(max_dt, watermark_path, changed_customers=int(len(features)))
+    elapsed = time.perf_counter() - start
+    print(f">> Ciclo incremental concluído em {elapsed:.2f}s (watermark {max_dt})")
+    return {"changed": int(len(features)), "silver_recency": silver_recency,
+            "gold_recency": gold_recency, "gold": stats, "cube_cells": cube_cells, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    from data_access import connect, load_settings, max_purchase_datetime
+    from model_registry import load_models
+
+    parser = argparse.ArgumentParser(description="Atualiza features e scores só dos clientes alterados.")
+    parser.add_argument("--init", action="store_true",
+                        help="grava a watermark com a compra mais recente (após uma carga completa)")
+    parser.add_argument("--version", default=None, help="versão do registro (padrão: LATEST)")
+    parser.add_argument("--watermark", default=WATERMARK_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+
+    settings = load_settings()
+    conn = connect(settings)
+    if args.init:
+        mark = save_watermark(max_purchase_datetime(conn, settings), args.watermark)
+        print(f">> Watermark gravada: {mark['max_datetime']} (@today {mark['today']})")
+    else:
+        run_delta(conn, settings, load_models(version=args.version), args.watermark, args.batch_size)
+    conn.close()
@@ -0,0 +1,676 @@
+# ============================================
+# RoadWise - ClickBus | Ingestão Local
+# df_t.csv -> silver.purchases_clean em Parquet, em paralelo
+# ============================================
+#
+# Alternativa local a bronze.load_bronze (BULK INSERT) + primeira parte de
+# silver.load_silver (CTEs base/clean). O CSV bruto é dividido em faixas de
+# bytes; cada processo do pool lê a sua faixa (alinhada em fim de linha),
+# limpa com operações vetorizadas do Arrow/NumPy e grava Parquet particionado
+# por ano da compra (Hive: <saída>/purchase_year=AAAA/part-*.parquet).
+#
+# Regras (as mesmas do SQL):
+#   - leitura como o BULK INSERT: ',' sem aspas, linha termina em '\n', 1ª linha
+#     é o cabeçalho (FIRSTROW = 2), campo vazio -> NULL;
+#   - textos: LTRIM/RTRIM (só espaços); locais e empresas com NULLIF(..., '0');
+#   - purchase_datetime = TRY_CONVERT(DATETIME2(0), date + ' ' + time, 120):
+#     'AAAA-MM-DD', 'HH:MM[:SS[.fffffff]]' ou os dois (separados por espaço
+#     ou 'T'); frações arredondadas para o segundo; sem data -> 1900-01-01
+#     (texto vazio vira 1900-01-01 00:00:00, como no SQL Server); qualquer
+#     outra coisa -> NULL;
+#   - gmv_success = TRY_CONVERT(DECIMAL(12,2)) arredondado (meio para longe do
+#     zero), NULL se estourar a precisão ou se for negativo;
+#   - total_tickets_qty = TRY_CONVERT(INT);
+#   - descarta linhas sem customer_id, sem data válida ou sem destino;
+#   - mês, semana ISO, dia da semana (1 = segunda) e período (6-11 morning,
+#     12-17 afternoon, resto night).
+# Diferenças: linhas com número de campos diferente de 12 são descartadas e
+# contadas (o BULK INSERT falharia ou desalinharia as colunas) e o '\r' de
+# arquivos CRLF é removido. purchase_id (IDENTITY) fica a cargo do banco.
+#
+# Paridade: o T-SQL nunca é executado aqui. A referência é uma transcrição
+# escalar das regras (reference_row) e uma tabela de resultados esperados
+# escrita à mão para os casos de borda (EDGE_CASES / EDGE_EXPECTED).
+#   - self_test() confere a limpeza vetorizada contra as duas sobre os casos
+#     de borda e falha com AssertionError; roda antes de toda ingestão pelo
+#     CLI (milissegundos) e sozinho com --self-test;
+#   - --check repete a comparação com reference_row nas primeiras linhas do
+#     próprio arquivo.
+#
+# Uso: python ingest.py --csv df_t.csv [--out purchases_clean] [--workers N]
+#                       [--chunk-mb 64] [--check [--check-rows N]]
+#      python ingest.py --self-test
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+from instrumentation import stage
+
+CSV_PATH = "df_t.csv"
+OUT_DIR = "purchases_clean"
+CHUNK_BYTES = 64 * 2**20     # bytes do CSV por tarefa do pool
+WORKERS = os.cpu_count() or 1
+CHECK_ROWS = 100_000         # linhas do arquivo comparadas com a referência no --check
+REPORT_FILE = "_ingest.json"  # prefixo "_": ignorado pelos leitores de Parquet
+
+# Colunas de bronze.df_t, na ordem do arquivo
+RAW_COLUMNS = [
+    "nk_ota_localizer_id", "fk_contact", "date_purchase", "time_purchase",
+    "place_origin_departure", "place_destination_departure",
+    "place_origin_return", "place_destination_return",
+    "fk_departure_ota_bus_company", "fk_return_ota_bus_company",
+    "gmv_success", "total_tickets_quantity_success",
+]
+# Colunas de bronze que viram NULLIF(LTRIM(RTRIM(x)), '0') na Silver
+NULLIF_COLUMNS = {
+    "place_origin_departure": "place_origin_departure",
+    "place_destination_departure": "place_destination_departure",
+    "place_origin_return": "place_origin_return",
+    "place_destination_return": "place_destination_return",
+    "departure_bus_company": "fk_departure_ota_bus_company",
+    "return_bus_company": "fk_return_ota_bus_company",
+}
+# Colunas do INSERT em silver.purchases_clean
+CLEAN_SCHEMA = pa.schema([
+    ("customer_id", pa.string()),
+    ("purchase_datetime", pa.timestamp("s")),
+    ("place_origin_departure", pa.string()),
+    ("place_destination_departure", pa.string()),
+    ("place_origin_return", pa.string()),
+    ("place_destination_return", pa.string()),
+    ("departure_bus_company", pa.string()),
+    ("return_bus_company", pa.string()),
+    ("gmv_success", pa.float64()),
+    ("total_tickets_qty", pa.int32()),
+    ("purchase_month", pa.int8()),
+    ("purchase_week", pa.int8()),
+    ("purchase_dayofweek", pa.int8()),
+    ("purchase_period", pa.string()),
+])
+PARTITION_COLUMN = "purchase_year"
+
+_DAY = 86_400
+_DEFAULT_DAY = -25_567                # 1900-01-01 (data quando só vem a hora)
+_MAX_SECONDS = 253_402_300_800        # 10000-01-01: fora do DATETIME2
+_MAX_CENTS = 10**12 - 1               # DECIMAL(12,2)
+_INT_RANGE = (-(2**31), 2**31 - 1)
+
+_DATETIME_RE = (r"^ *(?:(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2}))?(?:T| *)"
+                r"(?:(?P<h>\d{1,2}):(?P<mi>\d{1,2})(?::(?P<s>\d{1,2})(?:\.(?P<f>\d{0,7}))?)?)? *$")
+_DECIMAL_RE = r"^ *(?P<sign>[+-]?)(?P<int>\d*)(?:\.(?P<frac>\d*))? *$"
+_INT_RE = r"^ *(?P<sign>[+-]?)(?P<int>\d+) *$"
+
+
+# -----------------------------
+# Faixas de bytes
+# -----------------------------
+def byte_ranges(path: str, chunk_bytes=CHUNK_BYTES) -> list:
+    """[início, fim) de cada tarefa; cada faixa fica com as linhas que COMEÇAM nela."""
+    size = os.path.getsize(path)
+    chunk_bytes = max(int(chunk_bytes), 1)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def read_range(path: str, start: int, end: int) -> bytes:
+    """Linhas completas que começam em [start, end); a 1ª linha do arquivo (cabeçalho) fica de fora."""
+    with open(path, "rb") as fh:
+        # Alinha no início da primeira linha que começa em >= start
+        fh.seek(max(start - 1, 0))
+        fh.readline()
+        first = fh.tell()
+        if first >= end:
+            return b""
+        data = fh.read(end - first)
+        if not data.endswith(b"\n"):
+            data += fh.readline()
+    return data
+
+
+# -----------------------------
+# Leitura (como o BULK INSERT)
+# -----------------------------
+def parse_csv(data: bytes):
+    """Campos de bronze.df_t como texto; devolve (tabela, linhas com nº de campos errado)."""
+    rejected = []
+
+    def on_invalid(row):
+        rejected.append(row.text)
+        return "skip"
+
+    if not data:
+        return pa.table({c: pa.array([], pa.string()) for c in RAW_COLUMNS}), rejected
+    table = pcsv.read_csv(
+        pa.py_buffer(data),
+        read_options=pcsv.ReadOptions(column_names=RAW_COLUMNS, use_threads=False,
+                                      block_size=max(len(data), 1 << 20)),
+        parse_options=pcsv.ParseOptions(delimiter=",", quote_char=False, escape_char=False,
+                                        newlines_in_values=False, invalid_row_handler=on_invalid),
+        convert_options=pcsv.ConvertOptions(column_types={c: pa.string() for c in RAW_COLUMNS},
+                                            strings_can_be_null=True, null_values=[""]),
+    )
+    return table, rejected
+
+
+# -----------------------------
+# Limpeza vetorizada (CTEs base/clean)
+# -----------------------------
+def _trim(arr):
+    return pc.utf8_trim(arr, characters=" ")
+
+
+def _nullif_zero(arr):
+    trimmed = _trim(arr)
+    return pc.if_else(pc.equal(trimmed, "0"), pa.scalar(None, pa.string()), trimmed)
+
+
+def _int_field(parts, name, ok=None) -> np.ndarray:
+    """Grupo numérico do extract_regex como int64 (grupo vazio ou fora de `ok` -> 0)."""
+    field = parts.field(name)
+    empty = pc.equal(pc.utf8_length(field), 0)
+    if ok is not None:
+        empty = pc.or_(empty, pc.invert(pa.array(ok)))
+    return pc.cast(pc.if_else(empty, "0", field), pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def _matched(parts) -> np.ndarray:
+    return parts.is_valid().to_numpy(zero_copy_only=False)
+
+
+def _field_length(parts, name) -> np.ndarray:
+    return pc.utf8_length(parts.field(name)).to_numpy(zero_copy_only=False)
+
+
+def _significant(parts, name):
+    """Dígitos sem os zeros à esquerda (para checar estouro antes de converter)."""
+    return pc.utf8_ltrim(parts.field(name), characters="0")
+
+
+def try_datetime2(date, time_) -> pa.TimestampArray:
+    """TRY_CONVERT(DATETIME2(0), CONCAT(date, ' ', time), 120)."""
+    text = pc.binary_join_element_wise(pc.fill_null(date, ""), pc.fill_null(time_, ""), " ")
+    parts = pc.extract_regex(text, _DATETIME_RE)
+    ok = _matched(parts)
+    year, month, day = (_int_field(parts, k) for k in ("y", "m", "d"))
+    hour, minute, second = (_int_field(parts, k) for k in ("h", "mi", "s"))
+    has_date = _field_length(parts, "y") > 0
+
+    ok &= ~has_date | ((year >= 1) & (month >= 1) & (month <= 12) & (day >= 1))
+    month_start = np.where(ok & has_date, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    first_day = month_start.astype("datetime64[D]").astype(np.int64)
+    days_in_month = (month_start + 1).astype("datetime64[D]").astype(np.int64) - first_day
+    ok &= ~has_date | (day <= days_in_month)
+    ok &= (hour < 24) & (minute < 60) & (second < 60)
+
+    days = np.where(has_date, first_day + day - 1, _DEFAULT_DAY)
+    # DATETIME2(0) arredonda a fração: .5 ou mais sobe um segundo
+    frac = parts.field("f")
+    round_up = pc.fill_null(pc.greater_equal(pc.utf8_slice_codeunits(frac, 0, 1), "5"), False)
+    seconds = days * _DAY + hour * 3600 + minute * 60 + second + round_up.to_numpy(zero_copy_only=False)
+    ok &= seconds < _MAX_SECONDS
+    return pa.array(np.where(ok, seconds, 0).astype("datetime64[s]"), mask=~ok)
+
+
+def try_decimal_12_2(arr) -> pa.DoubleArray:
+    """TRY_CONVERT(DECIMAL(12,2), x) em centavos inteiros, devolvido como float."""
+    parts = pc.extract_regex(arr, _DECIMAL_RE)
+    int_digits = _significant(parts, "int")
+    ok = _matched(parts) & (_field_length(parts, "int") + _field_length(parts, "frac") > 0)
+    ok &= pc.utf8_length(int_digits).to_numpy(zero_copy_only=False) <= 10
+    frac3 = pc.utf8_rpad(pc.utf8_slice_codeunits(parts.field("frac"), 0, 3), width=3, padding="0")
+    frac3 = pc.cast(frac3, pa.int64()).to_numpy(zero_copy_only=False)
+    cents = _int_field(parts, "int", ok) * 100 + frac3 // 10 + (frac3 % 10 >= 5)
+    ok &= cents <= _MAX_CENTS
+    negative = pc.equal(parts.field("sign"), "-").to_numpy(zero_copy_only=False)
+    # CASE WHEN valor >= 0: -0,001 arredonda para 0 e fica
+    ok &= ~(negative & (cents > 0))
+    return pa.array(np.where(ok, cents, 0) / 100.0, mask=~ok)
+
+
+def try_int(arr) -> pa.Int32Array:
+    """TRY_CONVERT(INT, x)."""
+    parts = pc.extract_regex(arr, _INT_RE)
+    ok = _matched(parts)
+    ok &= pc.utf8_length(_significant(parts, "int")).to_numpy(zero_copy_only=False) <= 10
+    value = _int_field(parts, "int", ok)
+    value = np.where(pc.equal(parts.field("sign"), "-").to_numpy(zero_copy_only=False), -value, value)
+    ok &= (value >= _INT_RANGE[0]) & (value <= _INT_RANGE[1])
+    return pa.array(np.where(ok, value, 0).astype(np.int32), mask=~ok)
+
+
+def clean_table(raw: pa.Table):
+    """Linhas de bronze.df_t -> linhas de silver.purchases_clean; devolve (tabela, descartes por motivo)."""
+    if raw.num_rows == 0:
+        return CLEAN_SCHEMA.empty_table(), {"no_customer": 0, "bad_datetime": 0, "no_destination": 0}
+    col = {name: raw.column(name).combine_chunks() for name in RAW_COLUMNS}
+    base = {
+        "customer_id": _trim(col["fk_contact"]),
+        "purchase_datetime": try_datetime2(col["date_purchase"], col["time_purchase"]),
+        **{out: _nullif_zero(col[src]) for out, src in NULLIF_COLUMNS.items()},
+        "gmv_success": try_decimal_12_2(col["gmv_success"]),
+        "total_tickets_qty": try_int(col["total_tickets_quantity_success"]),
+    }
+    missing = {
+        "no_customer": base["customer_id"].is_null(),
+        "bad_datetime": base["purchase_datetime"].is_null(),
+        "no_destination": base["place_destination_departure"].is_null(),
+    }
+    keep = pc.invert(pc.or_(pc.or_(missing["no_customer"], missing["bad_datetime"]),
+                            missing["no_destination"]))
+    dropped = {k: int(pc.sum(v).as_py() or 0) for k, v in missing.items()}
+    base = {k: pc.filter(v, keep) for k, v in base.items()}
+
+    ts = base["purchase_datetime"]
+    seconds = ts.cast(pa.int64()).to_numpy(zero_copy_only=False)
+    hour = (seconds % _DAY) // 3600
+    period = np.where((hour >= 6) & (hour <= 11), "morning",
+                      np.where((hour >= 12) & (hour <= 17), "afternoon", "night"))
+    table = pa.table({
+        **base,
+        "purchase_month": pc.cast(pc.month(ts), pa.int8()),
+        "purchase_week": pc.cast(pc.iso_week(ts), pa.int8()),
+        # 1970-01-01 foi quinta (4); segunda = 1 independentemente do @@DATEFIRST
+        "purchase_dayofweek": pa.array(((seconds // _DAY + 3) % 7 + 1).astype(np.int8)),
+        "purchase_period": pa.array(period, pa.string()),
+    })
+    return table.cast(CLEAN_SCHEMA), dropped
+
+
+# -----------------------------
+# Execução em paralelo
+# -----------------------------
+def write_partitions(clean: pa.Table, out_dir: str, index: int):
+    """Um arquivo por ano da compra: <out>/purchase_year=AAAA/part-<faixa>.parquet (Hive)."""
+    if clean.num_rows == 0:
+        return
+    years = pc.year(clean.column("purchase_datetime")).to_numpy(zero_copy_only=False)
+    for year in np.unique(years):
+        folder = os.path.join(out_dir, f"{PARTITION_COLUMN}={year}")
+        os.makedirs(folder, exist_ok=True)
+        pq.write_table(clean.filter(pa.array(years == year)),
+                       os.path.join(folder, f"part-{index:05d}.parquet"))
+
+
+def _ingest_range(task: dict) -> dict:
+    """Tarefa do pool: lê, limpa e grava uma faixa de bytes."""
+    t0, c0 = time.perf_counter(), time.process_time()
+    data = read_range(task["path"], task["start"], task["end"])
+    raw, rejected = parse_csv(data)
+    clean, dropped = clean_table(raw)
+    write_partitions(clean, task["out"], task["index"])
+    return {
+        "index": task["index"], "pid": os.getpid(),
+        "bytes": task["end"] - task["start"], "rows_read": raw.num_rows + len(rejected),
+        "rows_kept": clean.num_rows, "bad_lines": len(rejected), "dropped": dropped,
+        "seconds": time.perf_counter() - t0, "cpu_seconds": time.process_time() - c0,
+    }
+
+
+def ingest(csv_path=CSV_PATH, out_dir=OUT_DIR, workers=WORKERS, chunk_bytes=CHUNK_BYTES) -> dict:
+    """Grava silver.purchases_clean em Parquet (pasta temporária + troca no final)."""
+    tmp = out_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    tasks = [{"path": csv_path, "out": tmp, "index": i, "start": s, "end": e}
+             for i, (s, e) in enumerate(byte_ranges(csv_path, chunk_bytes))]
+    workers = max(1, min(int(workers), len(tasks) or 1))
+
+    start = time.perf_counter()
+    try:
+        with stage("ingest") as s:
+            if workers == 1:
+                results = [_ingest_range(t) for t in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_ingest_range, tasks))
+            s.rows_out = sum(r["rows_kept"] for r in results)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    wall = time.perf_counter() - start
+
+    report = summarize(results, csv_path, workers, wall)
+    with open(os.path.join(tmp, REPORT_FILE), "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    report["out_dir"] = out_dir
+    return report
+
+
+def summarize(results: list, csv_path: str, workers: int, wall: float) -> dict:
+    """Totais, descartes e vazão (geral e por núcleo = por processo do pool)."""
+    total_bytes = sum(r["bytes"] for r in results)
+    per_worker = {}
+    for r in results:
+        w = per_worker.setdefault(r["pid"], {"tasks": 0, "bytes": 0, "rows": 0, "seconds": 0.0, "cpu_seconds": 0.0})
+        w["tasks"] += 1
+        w["bytes"] += r["bytes"]
+        w["rows"] += r["rows_read"]
+        w["seconds"] += r["seconds"]
+        w["cpu_seconds"] += r["cpu_seconds"]
+    for w in per_worker.values():
+        w["mb_per_sec"] = round(w["bytes"] / 2**20 / w["cpu_seconds"], 2) if w["cpu_seconds"] else None
+        w["rows_per_sec"] = round(w["rows"] / w["cpu_seconds"], 1) if w["cpu_seconds"] else None
+        w["seconds"], w["cpu_seconds"] = round(w["seconds"], 3), round(w["cpu_seconds"], 3)
+
+    busy = sum(r["cpu_seconds"] for r in results)
+    rows_read = sum(r["rows_read"] for r in results)
+    return {
+        "source": os.path.abspath(csv_path),
+        "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "bytes": total_bytes,
+        "tasks": len(results),
+        "workers": workers,
+        "rows_read": rows_read,
+        "rows_kept": sum(r["rows_kept"] for r in results),
+        "bad_lines": sum(r["bad_lines"] for r in results),
+        "dropped": {k: sum(r["dropped"][k] for r in results) for k in ("no_customer", "bad_datetime", "no_destination")},
+        "seconds": round(wall, 3),
+        "mb_per_sec": round(total_bytes / 2**20 / wall, 2) if wall else None,
+        "rows_per_sec": round(rows_read / wall, 1) if wall else None,
+        # Vazão por segundo de CPU das tarefas (= por núcleo ocupado) e uso do pool
+        "mb_per_sec_per_core": round(total_bytes / 2**20 / busy, 2) if busy else None,
+        "rows_per_sec_per_core": round(rows_read / busy, 1) if busy else None,
+        "pool_efficiency": round(busy / (wall * workers), 3) if wall else None,
+        "per_worker": {str(pid): w for pid, w in per_worker.items()},
+    }
+
+
+def print_report(report: dict):
+    d = report["dropped"]
+    print(
+        f">> Ingestão: {report['rows_read']} linhas lidas, {report['rows_kept']} em purchases_clean "
+        f"({report['bad_lines']} com nº de campos errado; descartes: {d['no_customer']} sem cliente, "
+        f"{d['bad_datetime']} sem data válida, {d['no_destination']} sem destino)"
+    )
+    print(
+        f">> {report['bytes'] / 2**20:.1f} MB em {report['seconds']:.2f}s com {report['workers']} processo(s): "
+        f"{report['mb_per_sec']} MB/s, {report['rows_per_sec']:.0f} linhas/s | por núcleo "
+        f"{report['mb_per_sec_per_core']} MB/s, {report['rows_per_sec_per_core']:.0f} linhas/s "
+        f"(uso do pool {report['pool_efficiency']:.0%})"
+    )
+    for pid, w in report["per_worker"].items():
+        print(f"   processo {pid}: {w['tasks']} faixas, {w['mb_per_sec']} MB/s, "
+              f"{w['rows_per_sec']:.0f} linhas/s (CPU {w['cpu_seconds']}s)")
+
+
+# -----------------------------
+# Paridade com as regras do T-SQL
+# -----------------------------
+# Casos de borda (linhas do CSV bruto): espaços, '0', vazios, datas inválidas,
+# frações de segundo, arredondamento e estouro de DECIMAL/INT, semana ISO.
+_C = "a" * 64
+_D = "b" * 64
+EDGE_CASES = [
+    f"L1,{_C},2019-01-05,08:00:00,o,{_D},0,0,c,1,89.09,1",
+    f"L2,  {_C} ,2019-01-05,08:00:00, o ,  {_D}  , 0 ,,0, 0 , 89.094 , 2 ",
+    f"L3,{_C},2019-02-30,08:00:00,o,{_D},0,0,c,1,10,1",
+    f"L4,{_C},2020-02-29,23:59:59.5,o,{_D},0,0,c,1,1.005,1",
+    f"L5,{_C},2019-01-05,,o,{_D},0,0,c,1,-1,1",
+    f"L6,{_C},,08:15,o,{_D},0,0,c,1,-0.001,1",
+    f"L7,{_C},,,o,{_D},0,0,c,1,.5,2.0",
+    f"L8,{_C},2019-1-5,8:5:7,o,{_D},0,0,c,1,5.,2147483648",
+    f"L9,{_C},2019-01-05,24:00:00,o,{_D},0,0,c,1,1,1",
+    f"L10,{_C},2019-01-05,08:00:00,o,0,0,0,c,1,1,1",
+    f"L11,{_C},2019-01-05,08:00:00,o,,0,0,c,1,1,1",
+    f"L12,,2019-01-05,08:00:00,o,{_D},0,0,c,1,1,1",
+    f"L13,   ,2019-01-05,08:00:00,o,   ,0,0,c,1,1,1",
+    f"L14,{_C},2021-01-03,05:59:59,o,{_D},0,0,c,1,12345678901,-3",
+    f"L15,{_C},2021-01-04,06:00:00,o,{_D},0,0,c,1,9999999999.994,+7",
+    f"L16,{_C},2020-12-31,11:59:59,o,{_D},0,0,c,1,9999999999.995,00000000001",
+    f"L17,{_C},2019-12-30,12:00:00,o,{_D},0,0,c,1,1e3,1",
+    f"L18,{_C},2019-12-29,17:59:59,o,{_D},0,0,c,1,1.2.3,1",
+    f"L19,{_C},2019-06-15,18:00:00,o,{_D},0,0,c,1,+0000000000012.5,-2147483648",
+    f"L20,{_C},9999-12-31,23:59:59.5,o,{_D},0,0,c,1,1,1",
+    f"L21,{_C},2019-01-05T08:00:00,,o,{_D},0,0,c,1,1,1",
+    f"L22,{_C},2019-01-05,08:00:00,o,{_D},0,0,c,1,1",
+    f"L23,{_C},2019-01-05,08:00:00,o,{_D},0,0,c,1,1,1,extra",
+    f"L24,{_C}, 2019-01-05 , 08:00 ,o,{_D},0,0,c,1,  ,x",
+]
+
+# Resultado esperado de cada caso, pelas regras do SQL Server (não derivado de
+# reference_row): (purchase_datetime, gmv_success, total_tickets_qty,
+# purchase_week, purchase_period); DROPPED = removida pelo WHERE,
+# BAD_LINE = nº de campos diferente de 12.
+DROPPED, BAD_LINE = "descartada", "campos"
+EDGE_EXPECTED = {
+    "L1": (datetime(2019, 1, 5, 8, 0, 0), 89.09, 1, 1, "morning"),
+    "L2": (datetime(2019, 1, 5, 8, 0, 0), 89.09, 2, 1, "morning"),       # trims; '0' -> NULL
+    "L3": DROPPED,                                                        # 30/02 inválido
+    "L4": (datetime(2020, 3, 1, 0, 0, 0), 1.01, 1, 9, "night"),          # .5 s arredonda o dia
+    "L5": (datetime(2019, 1, 5, 0, 0, 0), None, 1, 1, "night"),          # GMV negativo
+    "L6": (datetime(1900, 1, 1, 8, 15, 0), 0.0, 1, 1, "morning"),        # sem data -> 1900-01-01
+    "L7": (datetime(1900, 1, 1, 0, 0, 0), 0.5, None, 1, "night"),        # '2.0' não é INT
+    "L8": (datetime(2019, 1, 5, 8, 5, 7), 5.0, None, 1, "morning"),      # INT estoura
+    "L9": DROPPED,                                                        # 24:00:00
+    "L10": DROPPED,                                                       # destino '0'
+    "L11": DROPPED,                                                       # destino vazio
+    "L12": DROPPED,                                                       # sem customer_id
+    "L13": (datetime(2019, 1, 5, 8, 0, 0), 1.0, 1, 1, "morning"),        # '   ' vira '', não NULL
+    "L14": (datetime(2021, 1, 3, 5, 59, 59), None, -3, 53, "night"),     # DECIMAL(12,2) estoura
+    "L15": (datetime(2021, 1, 4, 6, 0, 0), 9999999999.99, 7, 1, "morning"),
+    "L16": (datetime(2020, 12, 31, 11, 59, 59), None, 1, 53, "morning"), # arredondar estoura
+    "L17": (datetime(2019, 12, 30, 12, 0, 0), None, 1, 1, "afternoon"),  # '1e3' não é DECIMAL
+    "L18": (datetime(2019, 12, 29, 17, 59, 59), None, 1, 52, "afternoon"),
+    "L19": (datetime(2019, 6, 15, 18, 0, 0), 12.5, -2147483648, 24, "night"),
+    "L20": DROPPED,                                                       # arredondar passa do ano 9999
+    "L21": (datetime(2019, 1, 5, 8, 0, 0), 1.0, 1, 1, "morning"),        # 'T' na data
+    "L22": BAD_LINE,
+    "L23": BAD_LINE,
+    "L24": (datetime(2019, 1, 5, 8, 0, 0), None, None, 1, "morning"),
+}
+
+_REF_DATETIME = re.compile(_DATETIME_RE, re.ASCII)
+_REF_DECIMAL = re.compile(r"^ *[+-]?(\d+\.?\d*|\.\d+) *$", re.ASCII)
+_REF_INT = re.compile(r"^ *[+-]?\d+ *$", re.ASCII)
+
+
+def _sql_trim(value):
+    return None if value is None else value.strip(" ")
+
+
+def _sql_nullif_zero(value):
+    value = _sql_trim(value)
+    return None if value == "0" else value
+
+
+def _ref_datetime(date, time_):
+    m = _REF_DATETIME.match(f"{date or ''} {time_ or ''}")
+    if m is None:
+        return None
+    g = m.groupdict()
+    try:
+        day = datetime(int(g["y"]), int(g["m"]), int(g["d"])) if g["y"] else datetime(1900, 1, 1)
+        value = day + timedelta(hours=int(g["h"] or 0), minutes=int(g["mi"] or 0), seconds=int(g["s"] or 0))
+    except ValueError:
+        return None
+    if int(g["h"] or 0) > 23 or int(g["mi"] or 0) > 59 or int(g["s"] or 0) > 59:
+        return None
+    if g["f"] and int(g["f"][0]) >= 5:
+        try:
+            value += timedelta(seconds=1)
+        except OverflowError:
+            return None
+    return value
+
+
+def _ref_decimal(text):
+    if text is None or not _REF_DECIMAL.match(text):
+        return None
+    value = Decimal(text.strip(" ")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    if abs(value) >= Decimal(10) ** 10:
+        return None
+    return float(value) if value >= 0 else None
+
+
+def _ref_int(text):
+    if text is None or not _REF_INT.match(text):
+        return None
+    value = int(text.strip(" "))
+    return value if _INT_RANGE[0] <= value <= _INT_RANGE[1] else None
+
+
+def reference_row(fields: list):
+    """Uma linha pelas regras do T-SQL, em Python puro (None = descartada pelo WHERE)."""
+    raw = dict(zip(RAW_COLUMNS, fields))
+    when = _ref_datetime(raw["date_purchase"], raw["time_purchase"])
+    row = {
+        "customer_id": _sql_trim(raw["fk_contact"]),
+        "purchase_datetime": when,
+        **{out: _sql_nullif_zero(raw[src]) for out, src in NULLIF_COLUMNS.items()},
+        "gmv_success": _ref_decimal(raw["gmv_success"]),
+        "total_tickets_qty": _ref_int(raw["total_tickets_quantity_success"]),
+    }
+    if row["customer_id"] is None or when is None or row["place_destination_departure"] is None:
+        return None
+    hour = when.hour
+    row.update({
+        "purchase_month": when.month,
+        "purchase_week": when.isocalendar()[1],
+        "purchase_dayofweek": when.isoweekday(),
+        "purchase_period": "morning" if 6 <= hour <= 11 else "afternoon" if 12 <= hour <= 17 else "night",
+    })
+    return row
+
+
+def _split_line(line: str):
+    fields = line.rstrip("\r\n").rstrip("\r").split(",")
+    if len(fields) != len(RAW_COLUMNS):
+        return None
+    return [f if f != "" else None for f in fields]
+
+
+def check_parity(csv_path=None, rows=CHECK_ROWS) -> dict:
+    """Limpeza vetorizada x reference_row nas primeiras `rows` linhas do arquivo + EDGE_CASES."""
+    lines = list(EDGE_CASES)
+    if csv_path:
+        with open(csv_path, encoding="utf-8", newline="") as fh:
+            fh.readline()
+            for i, line in enumerate(fh):
+                if i >= rows:
+                    break
+                if line.strip("\r\n"):
+                    lines.append(line.rstrip("\n"))
+
+    raw, rejected = parse_csv(("\n".join(lines) + "\n").encode("utf-8"))
+    ours, _ = clean_table(raw)
+    ours = ours.to_pylist()
+
+    expected = []
+    bad_lines = 0
+    for line in lines:
+        fields = _split_line(line)
+        if fields is None:
+            bad_lines += 1
+            continue
+        row = reference_row(fields)
+        if row is not None:
+            expected.append(row)
+
+    mismatches = {name: 0 for name in CLEAN_SCHEMA.names}
+    examples = []
+    for a, b in zip(ours, expected):
+        for name in CLEAN_SCHEMA.names:
+            if a[name] != b[name]:
+                mismatches[name] += 1
+                if len(examples) < 10:
+                    examples.append((name, a[name], b[name]))
+    return {
+        "lines": len(lines),
+        "rows_python": len(ours),
+        "rows_reference": len(expected),
+        "bad_lines_python": len(rejected),
+        "bad_lines_reference": bad_lines,
+        "mismatches": mismatches,
+        "examples": examples,
+    }
+
+
+def _clean_line(line: str):
+    """Uma linha pela limpeza vetorizada: a tupla de EDGE_EXPECTED, DROPPED ou BAD_LINE."""
+    raw, rejected = parse_csv((line + "\n").encode("utf-8"))
+    if len(rejected):
+        return BAD_LINE
+    rows = clean_table(raw)[0].to_pylist()
+    if not rows:
+        return DROPPED
+    row = rows[0]
+    return (row["purchase_datetime"], row["gmv_success"], row["total_tickets_qty"],
+            row["purchase_week"], row["purchase_period"])
+
+
+def _expect(ok: bool, message: str):
+    # raise explícito: continua valendo com python -O
+    if not ok:
+        raise AssertionError(message)
+
+
+def self_test():
+    """Casos de borda contra EDGE_EXPECTED e contra reference_row; AssertionError na primeira divergência."""
+    _expect(set(EDGE_EXPECTED) == {line.split(",", 1)[0] for line in EDGE_CASES},
+            "EDGE_EXPECTED e EDGE_CASES têm casos diferentes")
+    for line in EDGE_CASES:
+        tag = line.split(",", 1)[0]
+        got = _clean_line(line)
+        _expect(got == EDGE_EXPECTED[tag], f"{tag}: {got!r} (vetorizado) x {EDGE_EXPECTED[tag]!r} (esperado)")
+
+    report = check_parity()
+    _expect(report["rows_python"] == report["rows_reference"],
+            f"linhas mantidas: {report['rows_python']} x {report['rows_reference']} (referência)")
+    _expect(report["bad_lines_python"] == report["bad_lines_reference"],
+            f"linhas com nº de campos errado: {report['bad_lines_python']} x {report['bad_lines_reference']}")
+    _expect(not any(report["mismatches"].values()), f"divergências com reference_row: {report['examples']}")
+    print(f">> Autoteste da limpeza: {len(EDGE_CASES)} casos de borda OK")
+
+
+def print_parity(report: dict) -> bool:
+    ok = (report["rows_python"] == report["rows_reference"]
+          and report["bad_lines_python"] == report["bad_lines_reference"]
+          and not any(report["mismatches"].values()))
+    print(
+        f">> Paridade com as regras do T-SQL: {report['lines']} linhas, "
+        f"{report['rows_python']} x {report['rows_reference']} mantidas, "
+        f"{report['bad_lines_python']} x {report['bad_lines_reference']} com nº de campos errado"
+    )
+    for col, n in report["mismatches"].items():
+        print(f"   {'OK ' if n == 0 else 'ERR'} {col}: {n} divergências")
+    for name, ours, ref in report["examples"]:
+        print(f"   ex.: {name}: {ours!r} (vetorizado) x {ref!r} (referência)")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Limpa df_t.csv em paralelo e grava purchases_clean em Parquet.")
+    parser.add_argument("--csv", default=CSV_PATH, help="CSV bruto (formato de bronze.df_t)")
+    parser.add_argument("--out", default=OUT_DIR, help="pasta do Parquet particionado")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processos do pool")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2**20, help="MB do CSV por tarefa")
+    parser.add_argument("--check", action="store_true",
+                        help="compara a limpeza com a transcrição das regras do T-SQL")
+    parser.add_argument("--check-rows", type=int, default=CHECK_ROWS)
+    parser.add_argument("--check-only", action="store_true", help="só roda a paridade, sem gravar")
+    parser.add_argument("--self-test", action="store_true", help="só roda o autoteste dos casos de borda")
+    args = parser.parse_args()
+
+    # Barato: uma regressão na limpeza para a ingestão antes de gravar qualquer coisa
+    self_test()
+    if args.self_test:
+        raise SystemExit(0)
+    if not args.check_only:
+        print_report(ingest(args.csv, args.out, args.workers, int(args.chunk_mb * 2**20)))
+    if args.check or args.check_only:
+        if not print_parity(check_parity(args.csv, args.check_rows)):
+            raise SystemExit(1)
@@ -0,0 +1,342 @@
+# ============================================
+# RoadWise - ClickBus | Instrumentação do Pipeline
+# Tempo, CPU, memória e linhas por etapa, gravados a cada execução
+# ============================================
+#
+# Uma execução (Run) fica ativa no processo; os módulos marcam as etapas com
+#
+#     with stage("gold_write", rows_in=len(df)) as s:
+#         ...
+#         s.rows_out = n
+#
+# e, sem Run ativo, stage() não faz nada (score.py, train.py etc. continuam
+# funcionando sozinhos). Para cada etapa:
+#   - tempo de parede e de CPU do processo;
+#   - pico de RSS (VmHWM, zerado no início da etapa quando o kernel permite)
+#     e, com trace_memory, pico do tracemalloc (Python + NumPy);
+#   - linhas de entrada/saída e linhas/s.
+#
+# Saída: run_metrics.json (lido pelo dashboard) e, opcionalmente,
+# run_metrics.prom no formato texto do Prometheus (textfile collector).
+# Uma etapa pode ser perfilada com cProfile (.prof) ou pyinstrument (.html).
+
+import json
+import os
+import platform
+import resource
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+METRICS_PATH = "run_metrics.json"
+PROM_PATH = "run_metrics.prom"
+PROM_PREFIX = "roadwise_pipeline"
+
+_active = None   # Run em andamento neste processo
+
+
+# -----------------------------
+# Memória do processo
+# -----------------------------
+def _proc_status(field: str):
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024   # kB -> MB
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb() -> float:
+    """RSS atual (Linux); fora do Linux, o pico do processo."""
+    current = _proc_status("VmRSS")
+    return current if current is not None else peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = _proc_status("VmHWM")
+    if peak is not None:
+        return peak
+    # ru_maxrss: KB no Linux, bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+
+def reset_peak_rss() -> bool:
+    """Zera o VmHWM do processo (Linux >= 4.0). Devolve False se não for possível."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+# -----------------------------
+# Etapas
+# -----------------------------
+class Stage:
+    def __init__(self, name: str, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.status = "running"
+        self.error = None
+        self.started_at = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.rss_start_mb = None
+        self.rss_peak_mb = None
+        self.rss_peak_is_stage = False   # False: pico do processo desde o início
+        self.tracemalloc_peak_mb = None
+        self.concurrent = False          # rodou junto com outra etapa (CPU/memória compartilhados)
+        self.profile = None
+
+    @property
+    def throughput(self):
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        if not rows or not self.wall_seconds:
+            return None
+        return rows / self.wall_seconds
+
+    def to_dict(self) -> dict:
+        out = {k: v for k, v in vars(self).items()}
+        out["rows_per_sec"] = round(self.throughput, 1) if self.throughput else None
+        for key in ("wall_seconds", "cpu_seconds"):
+            if out[key] is not None:
+                out[key] = round(out[key], 4)
+        for key in ("rss_start_mb", "rss_peak_mb", "tracemalloc_peak_mb"):
+            if out[key] is not None:
+                out[key] = round(out[key], 1)
+        return out
+
+
+class _NullStage(Stage):
+    """Devolvida por stage() quando não há Run ativo: aceita rows_in/rows_out e some."""
+
+
+class Run:
+    def __init__(self, name="predictions", trace_memory=False, profile_stage=None,
+                 profiler="cprofile", profile_dir="."):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.stages = []
+        self.status = "running"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._start = None
+        self._lock = threading.Lock()
+        self._running = 0
+        self._own_tracemalloc = False
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError(f"Já existe uma execução instrumentada ativa ({_active.run_id}).")
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start = time.perf_counter()
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = None
+        self.finished_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.status = "ok" if exc_type is None else "failed"
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        return False
+
+    @contextmanager
+    def stage(self, name: str, rows_in=None):
+        record = Stage(name, rows_in)
+        with self._lock:
+            self.stages.append(record)
+            self._running += 1
+            alone = self._running == 1
+            if not alone:
+                for other in self.stages:
+                    if other.status == "running":
+                        other.concurrent = True
+        # Picos só são zerados quando a etapa roda sozinha
+        record.rss_peak_is_stage = alone and reset_peak_rss()
+        record.rss_start_mb = rss_mb()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if alone:
+                tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+
+        profiler = self._start_profiler(name)
+        record.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+            record.status = "ok"
+        except BaseException as exc:
+            record.status = "failed"
+            record.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            record.wall_seconds = time.perf_counter() - t0
+            record.cpu_seconds = time.process_time() - c0
+            record.rss_peak_mb = peak_rss_mb()
+            if tracing and tracemalloc.is_tracing():
+                record.tracemalloc_peak_mb = (tracemalloc.get_traced_memory()[1] - traced_start) / 2**20
+            if profiler is not None:
+                record.profile = self._stop_profiler(name, profiler)
+            with self._lock:
+                self._running -= 1
+            _print_stage(record)
+
+    # Perfil opcional de uma etapa
+    def _start_profiler(self, name):
+        if name != self.profile_stage:
+            return None
+        if self.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print(">> pyinstrument não instalado (pip install pyinstrument); usando cProfile.")
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, name, profiler) -> str:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f"profile_{self.name}_{name}")
+        if hasattr(profiler, "output_html"):
+            profiler.stop()
+            path = base + ".html"
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(profiler.output_html())
+        else:
+            profiler.disable()
+            path = base + ".prof"
+            profiler.dump_stats(path)
+        print(f">> Perfil da etapa {name} salvo em {path}")
+        return path
+
+    # Saída
+    def to_dict(self) -> dict:
+        total = time.perf_counter() - self._start if self._start is not None else None
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_seconds": round(total, 4) if total is not None else None,
+            "host": platform.node(),
+            "cpus": os.cpu_count(),
+            "trace_memory": self.trace_memory,
+            "stages": [s.to_dict() for s in self.stages],
+        }
+
+    def write(self, path=METRICS_PATH, prom_path=None) -> dict:
+        payload = self.to_dict()
+        _write_atomic(path, json.dumps(payload, indent=2, ensure_ascii=False))
+        if prom_path:
+            _write_atomic(prom_path, to_prometheus(payload))
+        return payload
+
+
+def stage(name: str, rows_in=None):
+    """Etapa do Run ativo; sem Run, um contexto vazio."""
+    run = _active
+    if run is None:
+        return _null_stage(name, rows_in)
+    return run.stage(name, rows_in)
+
+
+@contextmanager
+def _null_stage(name, rows_in):
+    yield _NullStage(name, rows_in)
+
+
+def _print_stage(record: Stage):
+    if record.rows_in is not None and record.rows_out is not None:
+        rows_txt = f" | {record.rows_in} -> {record.rows_out} linhas"
+    else:
+        rows = record.rows_out if record.rows_out is not None else record.rows_in
+        rows_txt = f" | {rows} linhas" if rows is not None else ""
+    rate = f" | {record.throughput:,.0f} linhas/s".replace(",", ".") if record.throughput else ""
+    print(
+        f">> [etapa] {record.name}: {record.wall_seconds:.2f}s (CPU {record.cpu_seconds:.2f}s) | "
+        f"pico RSS {record.rss_peak_mb:.0f} MB{rows_txt}{rate}"
+    )
+
+
+def _write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# Prometheus (formato texto)
+# -----------------------------
+_PROM_METRICS = [
+    ("stage_wall_seconds", "wall_seconds", "Tempo de parede da etapa"),
+    ("stage_cpu_seconds", "cpu_seconds", "Tempo de CPU do processo durante a etapa"),
+    ("stage_rss_peak_megabytes", "rss_peak_mb", "Pico de RSS durante a etapa"),
+    ("stage_tracemalloc_peak_megabytes", "tracemalloc_peak_mb", "Pico do tracemalloc durante a etapa"),
+    ("stage_rows_in", "rows_in", "Linhas de entrada da etapa"),
+    ("stage_rows_out", "rows_out", "Linhas de saída da etapa"),
+    ("stage_rows_per_second", "rows_per_sec", "Vazão da etapa"),
+]
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def to_prometheus(payload: dict, prefix=PROM_PREFIX) -> str:
+    run = f'pipeline="{_label(payload["name"])}"'
+    lines = [
+        f"# HELP {prefix}_run_seconds Duração total da execução",
+        f"# TYPE {prefix}_run_seconds gauge",
+        f"{prefix}_run_seconds{{{run}}} {payload['total_seconds'] or 0}",
+        f"# HELP {prefix}_run_success 1 se a última execução terminou sem erro",
+        f"# TYPE {prefix}_run_success gauge",
+        f"{prefix}_run_success{{{run}}} {1 if payload['status'] == 'ok' else 0}",
+    ]
+    for metric, key, help_text in _PROM_METRICS:
+        samples = [(s["name"], s[key]) for s in payload["stages"] if s.get(key) is not None]
+        if not samples:
+            continue
+        lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} gauge"]
+        lines += [f'{prefix}_{metric}{{{run},stage="{_label(name)}"}} {value}' for name, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+def load_last_run(path=METRICS_PATH) -> dict:
+    """Última execução gravada (None se ainda não houver)."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
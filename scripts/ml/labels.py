@@ -0,0 +1,130 @@
+# ============================================
+# RoadWise - ClickBus | Labels de Recompra (point-in-time)
+# Conjunto de treino com vários snapshots a partir de silver.purchases_clean
+# ============================================
+#
+# Para cada data de snapshot S:
+#   - features = feature_engine com o histórico até o fim do dia S (@today = S),
+#     exatamente o que a Silver mostraria naquele dia;
+#   - label_Nd = 1 se o cliente comprou de novo nos N dias seguintes
+#     (purchase_datetime em [S + 1 dia, S + 1 dia + N dias)).
+#
+# Só entram clientes com alguma compra até S. Histórico e labels saem da
+# mesma linha do tempo ordenada (CustomerTimeline): dois searchsorted por
+# snapshot e horizonte, sem loops por cliente nem self-join. Todos os
+# snapshots são montados na mesma passada sobre cada bloco de clientes.
+#
+# Uso: python labels.py [--parquet compras.parquet] [--snapshots 6] [--step 30]
+#                       [--out training_set.parquet]
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_engine import (BATCH_ROWS, BUCKETS, CustomerTimeline, compute_features,
+                            epoch_day, epoch_seconds)
+from ids import write_parquet
+
+# label -> horizonte em dias
+HORIZONS = {"label_7d": 7, "label_30d": 30}
+
+SNAPSHOTS = 6       # quantidade de snapshots
+STEP_DAYS = 30      # intervalo entre snapshots
+OUT_PATH = "training_set.parquet"
+
+_DAY = 86_400
+
+
+def snapshot_dates(last_purchase, count=SNAPSHOTS, step_days=STEP_DAYS, horizons=HORIZONS) -> list:
+    """Snapshots espaçados de step_days, o mais recente com o maior horizonte já observado."""
+    last_day = pd.Timestamp(last_purchase).normalize()
+    newest = last_day - pd.Timedelta(days=max(horizons.values()))
+    return [newest - pd.Timedelta(days=step_days * i) for i in range(count - 1, -1, -1)]
+
+
+def label_block(block: pd.DataFrame, snapshots, horizons=HORIZONS) -> pd.DataFrame:
+    """Features point-in-time + labels de todos os snapshots para um bloco de clientes completos."""
+    if block.empty:
+        return pd.DataFrame()
+    # Categorias: o fatoramento repetido por snapshot vira operação sobre códigos
+    block = block.assign(
+        customer_id=block["customer_id"].astype("category"),
+        place_destination_departure=block["place_destination_departure"].astype("category"),
+    )
+    ts = epoch_seconds(block["purchase_datetime"])
+    tl = CustomerTimeline(block["customer_id"], ts)
+
+    parts = []
+    for snapshot in snapshots:
+        cutoff = (epoch_day(snapshot) + 1) * _DAY      # fim do dia do snapshot
+        history_end = tl.index_at(cutoff)
+        eligible = history_end > tl.starts
+        if not eligible.any():
+            continue
+
+        features = compute_features(block[ts < cutoff], today=snapshot)
+        features.insert(1, "snapshot_date", pd.Timestamp(snapshot))
+        for label, days in horizons.items():
+            label_end = tl.index_at(cutoff + days * _DAY)
+            features[label] = (label_end[eligible] > history_end[eligible]).astype(np.int8)
+        parts.append(features)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def build_training_set(blocks, snapshots, horizons=HORIZONS) -> pd.DataFrame:
+    start = time.perf_counter()
+    parts = [label_block(block, snapshots, horizons) for block in blocks]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        raise ValueError("Nenhum cliente com histórico antes dos snapshots informados.")
+    df = pd.concat(parts, ignore_index=True)
+    rates = ", ".join(f"{label} = {df[label].mean():.1%}" for label in horizons)
+    print(
+        f">> Conjunto de treino: {len(df)} linhas ({len(snapshots)} snapshots) "
+        f"em {time.perf_counter() - start:.2f}s | {rates}"
+    )
+    return df
+
+
+def training_set_from_sql(conn, settings=None, snapshots=None, count=SNAPSHOTS,
+                          step_days=STEP_DAYS, batch_size=BATCH_ROWS) -> pd.DataFrame:
+    from data_access import max_purchase_datetime
+    from feature_engine import sql_blocks
+
+    if snapshots is None:
+        snapshots = snapshot_dates(max_purchase_datetime(conn, settings), count, step_days)
+    return build_training_set(sql_blocks(conn, settings, batch_size), snapshots)
+
+
+def training_set_from_parquet(path, snapshots=None, count=SNAPSHOTS, step_days=STEP_DAYS,
+                              buckets=BUCKETS, batch_size=BATCH_ROWS) -> pd.DataFrame:
+    from feature_engine import parquet_blocks, parquet_max_datetime
+
+    if snapshots is None:
+        snapshots = snapshot_dates(parquet_max_datetime(path), count, step_days)
+    return build_training_set(parquet_blocks(path, buckets, batch_size), snapshots)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera o conjunto de treino com labels point-in-time.")
+    parser.add_argument("--parquet", default=None,
+                        help="Parquet de compras (padrão: lê silver.purchases_clean)")
+    parser.add_argument("--snapshots", type=int, default=SNAPSHOTS)
+    parser.add_argument("--step", type=int, default=STEP_DAYS, help="dias entre snapshots")
+    parser.add_argument("--buckets", type=int, default=BUCKETS)
+    parser.add_argument("--out", default=OUT_PATH)
+    args = parser.parse_args()
+
+    if args.parquet:
+        training = training_set_from_parquet(args.parquet, count=args.snapshots,
+                                             step_days=args.step, buckets=args.buckets)
+    else:
+        from data_access import connect, load_settings
+        settings = load_settings()
+        conn = connect(settings)
+        training = training_set_from_sql(conn, settings, count=args.snapshots, step_days=args.step)
+        conn.close()
+    write_parquet(training, args.out)
+    print(f">> Arquivo {args.out} salvo com sucesso:", training.shape)
@@ -0,0 +1,99 @@
+# ============================================
+# RoadWise - ClickBus | Registro de Modelos
+# Artefatos versionados: treina uma vez, pontua quantas vezes quiser
+# ============================================
+#
+# Layout:
+#   models/
+#     LATEST                      -> nome da versão mais recente
+#     <versão>/
+#       scaler.json               -> média e escala do StandardScaler
+#       centroids.npy             -> centróides do KMeans (espaço padronizado)
+#       booster_7d.ubj            -> XGBoost em formato binário nativo (UBJSON)
+#       booster_30d.ubj
+#       metadata.json             -> listas de features, parâmetros e dados do treino
+#
+# Nada é serializado com pickle: os artefatos podem ser lidos em outra
+# versão de scikit-learn/XGBoost sem surpresa.
+
+import json
+import os
+import time
+
+import numpy as np
+import xgboost as xgb
+
+MODEL_DIR = "models"
+LATEST_FILE = "LATEST"
+
+
+def new_version() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+def save_models(bundle: dict, model_dir: str = MODEL_DIR, version: str = None) -> str:
+    """Grava o bundle treinado numa pasta versionada e atualiza o ponteiro LATEST."""
+    version = version or bundle.get("version") or new_version()
+    path = os.path.join(model_dir, version)
+    os.makedirs(path, exist_ok=True)
+
+    with open(os.path.join(path, "scaler.json"), "w", encoding="utf-8") as fh:
+        json.dump({"mean": bundle["scaler_mean"].tolist(),
+                   "scale": bundle["scaler_scale"].tolist()}, fh)
+    np.save(os.path.join(path, "centroids.npy"), bundle["centroids"])
+    for horizon, booster in bundle["boosters"].items():
+        booster.save_model(os.path.join(path, f"booster_{horizon}.ubj"))
+
+    metadata = {
+        **bundle.get("metadata", {}),
+        "version": version,
+        "features_cluster": bundle["features_cluster"],
+        "features_ml": bundle["features_ml"],
+        "horizons": list(bundle["boosters"]),
+    }
+    with open(os.path.join(path, "metadata.json"), "w", encoding="utf-8") as fh:
+        json.dump(metadata, fh, indent=2, default=str)
+
+    # Ponteiro atualizado por último: quem lê nunca pega uma versão incompleta
+    tmp = os.path.join(model_dir, LATEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(version)
+    os.replace(tmp, os.path.join(model_dir, LATEST_FILE))
+
+    bundle["version"] = version
+    print(f">> Modelos salvos em {path}")
+    return version
+
+
+def latest_version(model_dir: str = MODEL_DIR) -> str:
+    with open(os.path.join(model_dir, LATEST_FILE), encoding="utf-8") as fh:
+        return fh.read().strip()
+
+
+def load_models(model_dir: str = MODEL_DIR, version: str = None) -> dict:
+    """Carrega uma versão (por padrão a LATEST) sem nenhum refit."""
+    version = version or latest_version(model_dir)
+    path = os.path.join(model_dir, version)
+
+    with open(os.path.join(path, "metadata.json"), encoding="utf-8") as fh:
+        metadata = json.load(fh)
+    with open(os.path.join(path, "scaler.json"), encoding="utf-8") as fh:
+        scaler = json.load(fh)
+
+    boosters = {}
+    for horizon in metadata["horizons"]:
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(path, f"booster_{horizon}.ubj"))
+        boosters[horizon] = booster
+
+    print(f">> Modelos carregados: versão {version}")
+    return {
+        "version": version,
+        "scaler_mean": np.asarray(scaler["mean"], dtype=np.float64),
+        "scaler_scale": np.asarray(scaler["scale"], dtype=np.float64),
+        "centroids": np.load(os.path.join(path, "centroids.npy")),
+        "boosters": boosters,
+        "features_cluster": metadata["features_cluster"],
+        "features_ml": metadata["features_ml"],
+        "metadata": metadata,
+    }
@@ -0,0 +1,143 @@
+# ============================================
+# RoadWise - ClickBus | Paginação e Exportação do Ranking
+# Só a página corrente vai para o navegador
+# ============================================
+#
+# A tabela (AgGrid ou st.dataframe) recebe apenas page_size linhas; a
+# ordenação acontece aqui, no servidor, sobre as posições já filtradas pelo
+# FilterIndex. O CSV do conjunto filtrado só é gerado quando pedido, em
+# blocos, direto para um arquivo temporário. customer_id fica no binário
+# (ids.py) até aqui: o hex é gerado só para as linhas exibidas ou exportadas.
+#
+# Os arquivos de exportação têm prefixo próprio (EXPORT_PREFIX): sessões
+# encerradas não avisam o servidor, então sweep_exports() remove os que
+# passaram de EXPORT_TTL_S a cada nova exportação.
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from ids import fixed_width, is_compact, readable, to_hex
+
+PAGE_SIZES = (25, 50, 100)
+CSV_CHUNK_ROWS = 50_000
+EXPORT_PREFIX = "roadwise_export_"
+EXPORT_TTL_S = 3600   # idade máxima de um CSV exportado
+
+
+def page_count(total: int, page_size: int) -> int:
+    return max(1, -(-int(total) // int(page_size)))
+
+
+def _sort_key(values: np.ndarray, ascending: bool) -> np.ndarray:
+    key = values.astype(np.float64)
+    if not ascending:
+        key = -key
+    key[np.isnan(key)] = np.inf   # nulos sempre no fim
+    return key
+
+
+def page_positions(df: pd.DataFrame, positions: np.ndarray, page: int, page_size: int,
+                   sort_by=None, ascending=False) -> np.ndarray:
+    """Posições de linha da página pedida.
+
+    Sem sort_by as posições já estão na ordem de score (vindas do índice) e a
+    página é só um slice. Com outra coluna numérica, usa seleção parcial
+    (argpartition) até o fim da página em vez de ordenar o conjunto todo.
+    """
+    start = int(page) * int(page_size)
+    stop = min(start + int(page_size), len(positions))
+    if start >= stop:
+        return positions[:0]
+    if sort_by is None:
+        return positions[start:stop]
+
+    if is_compact(df[sort_by]):
+        # IDs binários: a ordem dos bytes é a ordem do hex
+        idx = np.argsort(fixed_width(df[sort_by])[positions], kind="stable")
+        if not ascending:
+            idx = idx[::-1]
+        return positions[idx[start:stop]]
+
+    values = df[sort_by].to_numpy()[positions]
+    if pd.api.types.is_numeric_dtype(df[sort_by].dtype):
+        key = _sort_key(values, ascending)
+        if stop < len(key):
+            idx = np.argpartition(key, stop - 1)[:stop]
+            idx = idx[np.argsort(key[idx], kind="stable")]
+        else:
+            idx = np.argsort(key, kind="stable")
+    else:
+        idx = np.argsort(values.astype(str), kind="stable")
+        if not ascending:
+            idx = idx[::-1]
+    return positions[idx[start:stop]]
+
+
+def quick_filter(df: pd.DataFrame, positions: np.ndarray, text: str, columns) -> np.ndarray:
+    """Busca textual (substring) no servidor, restrita às posições recebidas."""
+    text = (text or "").strip().lower()
+    if not text:
+        return positions
+    sub = df.iloc[positions]
+    mask = np.zeros(len(positions), dtype=bool)
+    for col in columns:
+        if col in sub.columns:
+            values = pd.Series(to_hex(sub[col])).fillna("") if is_compact(sub[col]) else sub[col].astype(str)
+            mask |= values.str.lower().str.contains(text, regex=False).to_numpy()
+    return positions[mask]
+
+
+def iter_csv_chunks(df: pd.DataFrame, columns, positions: np.ndarray, chunk_rows=CSV_CHUNK_ROWS):
+    """Gera o CSV em blocos de bytes (cabeçalho só no primeiro)."""
+    if not len(positions):
+        yield readable(df.iloc[:0][columns]).to_csv(index=False).encode("utf-8")
+        return
+    for start in range(0, len(positions), chunk_rows):
+        chunk = readable(df.iloc[positions[start:start + chunk_rows]][columns])
+        yield chunk.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+
+def export_csv(df: pd.DataFrame, columns, positions: np.ndarray, chunk_rows=CSV_CHUNK_ROWS,
+               directory=None) -> str:
+    """Grava o CSV filtrado em blocos num arquivo temporário e devolve o caminho."""
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=".csv", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            for block in iter_csv_chunks(df, columns, positions, chunk_rows):
+                fh.write(block)
+    except Exception:
+        remove_export(path)
+        raise
+    return path
+
+
+def remove_export(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def sweep_exports(directory=None, max_age=EXPORT_TTL_S) -> int:
+    """Remove exportações com mais de max_age segundos (sessões que não limparam)."""
+    directory = directory or tempfile.gettempdir()
+    limit = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not (entry.name.startswith(EXPORT_PREFIX) and entry.name.endswith(".csv")):
+            continue
+        try:
+            if entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
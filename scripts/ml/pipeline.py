@@ -0,0 +1,465 @@
+# ============================================
+# RoadWise - ClickBus | ML Layer - Pipeline com Checkpoints
+# Etapas declaradas, cache por conteúdo e retomada após falha
+# ============================================
+#
+# O pipeline completo (predictions.py) roda em etapas:
+#
+#   extract -> segment -> train -> score -> publish
+#
+#   extract  features atuais da Silver + conjunto de treino point-in-time (labels.py)
+#   segment  scaler + centróides do KMeans, sobre as features
+#   train    boosters de todos os horizontes, sobre o conjunto de treino
+#   score    registra o bundle segment + train (model_registry.py) e pontua as features
+#   publish  Gold Layer + artefato do dashboard
+#
+# Cada etapa grava a saída em checkpoints/<etapa>/<chave>/ (Parquet, .npy,
+# .ubj, JSON) com um meta.json. A chave é o hash dos parâmetros da etapa e do
+# hash do conteúdo dos arquivos de que ela depende; a extract usa uma
+# impressão barata da Silver (contagens e máximos, data_access.silver_fingerprint).
+# Etapa cuja chave já tem checkpoint é reaproveitada sem rodar: se o Gold
+# falhar, a próxima execução retoma da publicação, sem refazer KMeans nem
+# XGBoost. Uma etapa refeita com o mesmo resultado não invalida as seguintes.
+#
+# Uso: python pipeline.py run [--until ETAPA] [--force ETAPA ...|all] [--mode incremental|full]
+#                             [--metrics run_metrics.json] [--prometheus run_metrics.prom]
+#                             [--tracemalloc] [--profile ETAPA [--profiler cprofile|pyinstrument]]
+#      python pipeline.py status
+#      python pipeline.py invalidate ETAPA [ETAPA ...] [--downstream]
+#      python pipeline.py prune [--keep N]
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from artifacts import ARROW_PATH, content_hash
+from data_access import (ConnectionPool, load_settings, read_features_parallel,
+                         silver_fingerprint, writer_backend)
+from ids import read_parquet, write_parquet
+from inference import PRIORITY_BONUS, PRIORITY_SEGMENT, PRIORITY_WEIGHTS, THREADS, InferenceEngine
+from instrumentation import METRICS_PATH, Run, stage
+from labels import HORIZONS, SNAPSHOTS, STEP_DAYS, training_set_from_sql
+from model_registry import MODEL_DIR, load_models, save_models
+from score import GOLD_MODE, publish_predictions, score_customers
+from segmentation import METHOD, MINIBATCH_SIZE, N_CLUSTERS, SAMPLE_SIZE
+from summary_cube import cube_path
+from train import (FEATURES_CLUSTER, FEATURES_ML, LABELS, align_segmentation, fit_boosters,
+                   fit_segmentation, make_bundle)
+from training import EARLY_STOPPING_ROUNDS, NUM_BOOST_ROUND, VALID_SIZE, XGB_PARAMS
+
+CHECKPOINT_DIR = "checkpoints"
+META_FILE = "meta.json"
+KEEP = 2   # checkpoints mantidos por etapa no prune
+
+STAGES = ["extract", "segment", "train", "score", "publish"]
+# Incremente ao mudar o que uma etapa produz: os checkpoints antigos deixam de casar
+STAGE_VERSION = {"extract": 2, "segment": 1, "train": 1, "score": 1, "publish": 2}
+
+FEATURES_FILE = "features.parquet"
+TRAINING_FILE = "training_set.parquet"
+SCORED_FILE = "scored.parquet"
+
+
+def _hash(payload) -> str:
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# -----------------------------
+# Checkpoints
+# -----------------------------
+class CheckpointStore:
+    """checkpoints/<etapa>/<chave>/ com os arquivos da etapa e o meta.json.
+
+    A pasta é montada em <chave>.tmp-<pid> e publicada com rename: um
+    checkpoint existe por inteiro ou não existe (falha no meio não deixa meia saída).
+    """
+
+    def __init__(self, root=CHECKPOINT_DIR):
+        self.root = root
+
+    def path(self, stage_name: str, key: str) -> str:
+        return os.path.join(self.root, stage_name, key)
+
+    def get(self, stage_name: str, key: str):
+        """meta.json do checkpoint (None se a etapa ainda não rodou com essa chave)."""
+        try:
+            with open(os.path.join(self.path(stage_name, key), META_FILE), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, stage_name: str, key: str, inputs: dict, write) -> dict:
+        """write(pasta) grava os arquivos da etapa e devolve campos extras para o meta.json."""
+        final = self.path(stage_name, key)
+        tmp = f"{final}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            start = time.perf_counter()
+            extra = write(tmp) or {}
+            files = {name: content_hash(os.path.join(tmp, name)) for name in sorted(os.listdir(tmp))}
+            meta = {
+                "stage": stage_name,
+                "key": key,
+                # Hash do conteúdo: é o que as etapas seguintes usam na chave
+                "digest": _hash(files) if files else _hash(extra),
+                "files": files,
+                "inputs": inputs,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": round(time.perf_counter() - start, 2),
+                **extra,
+            }
+            with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as fh:
+                json.dump(meta, fh, indent=2, default=str)
+            shutil.rmtree(final, ignore_errors=True)   # --force: substitui o checkpoint anterior
+            os.replace(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return meta
+
+    def entries(self, stage_name: str) -> list:
+        """Checkpoints completos da etapa, do mais recente para o mais antigo."""
+        base = os.path.join(self.root, stage_name)
+        if not os.path.isdir(base):
+            return []
+        metas = [self.get(stage_name, key) for key in os.listdir(base) if ".tmp-" not in key]
+        return sorted((m for m in metas if m), key=lambda m: m["created_at"], reverse=True)
+
+    def invalidate(self, stage_name: str) -> int:
+        base = os.path.join(self.root, stage_name)
+        count = len(self.entries(stage_name))
+        shutil.rmtree(base, ignore_errors=True)
+        return count
+
+    def prune(self, stage_name: str, keep=KEEP) -> int:
+        """Apaga os checkpoints além dos `keep` mais recentes (e sobras de execuções interrompidas)."""
+        base = os.path.join(self.root, stage_name)
+        if not os.path.isdir(base):
+            return 0
+        kept = {m["key"] for m in self.entries(stage_name)[:keep]}
+        removed = 0
+        for name in os.listdir(base):
+            if name not in kept:
+                shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+                removed += 1
+        return removed
+
+
+def _dir_size_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+# -----------------------------
+# Execução
+# -----------------------------
+class PipelineRun:
+    """Estado de uma execução: conexões sob demanda, meta das etapas e saídas já em memória."""
+
+    def __init__(self, store: CheckpointStore, settings: dict = None, force=(), mode=GOLD_MODE,
+                 segmentation=METHOD, threads=THREADS, model_dir=MODEL_DIR):
+        self.store = store
+        self.settings = settings or load_settings()
+        self.force = set(STAGES if "all" in force else force)
+        self.mode = mode
+        self.segmentation = segmentation
+        self.threads = threads
+        self.model_dir = model_dir
+        self.metas = {}
+        self.executed = []
+        self._frames = {}
+        self._pool = None
+
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            with stage("connect"):
+                self._pool = ConnectionPool(self.settings)
+                with self._pool.connection():
+                    pass   # abre (e devolve ao pool) a primeira conexão
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def source(self) -> dict:
+        """Base de origem (sem credenciais), parte da chave da extract e da publish."""
+        s = self.settings
+        if s["dialect"] == "mssql":
+            return {"dialect": "mssql", "server": s["server"], "database": s["database"]}
+        return {"dialect": s["dialect"], "path": os.path.abspath(s["path"])}
+
+    def path(self, stage_name: str) -> str:
+        """Pasta do checkpoint usado (ou gravado) pela etapa nesta execução."""
+        return self.store.path(stage_name, self.metas[stage_name]["key"])
+
+    def file(self, stage_name: str, name: str) -> str:
+        return os.path.join(self.path(stage_name), name)
+
+    def keep(self, stage_name: str, name: str, df: pd.DataFrame):
+        self._frames[(stage_name, name)] = df
+
+    def frame(self, stage_name: str, name: str, release=False) -> pd.DataFrame:
+        """Parquet de uma etapa: da memória, se ela rodou nesta execução, ou do checkpoint."""
+        df = self._frames.pop((stage_name, name), None)
+        if df is None:
+            with stage(f"load_{stage_name}") as s:
+                df = read_parquet(self.file(stage_name, name))
+                s.rows_out = len(df)
+        if not release:
+            self._frames[(stage_name, name)] = df
+        return df
+
+    def step(self, name: str, inputs: dict, write) -> dict:
+        """Reaproveita o checkpoint de (etapa, chave) ou roda write(pasta) e grava um novo."""
+        key = _hash({"stage": name, "version": STAGE_VERSION[name], **inputs})
+        meta = None if name in self.force else self.store.get(name, key)
+        if meta is not None:
+            print(f">> Etapa {name}: checkpoint {key[:12]} reaproveitado (de {meta['created_at']})")
+        else:
+            print(f">> Etapa {name}: executando (chave {key[:12]})")
+            meta = self.store.save(name, key, inputs, write)
+            self.executed.append(name)
+        self.metas[name] = meta
+        return meta
+
+
+# -----------------------------
+# Etapas
+# -----------------------------
+def extract(run: PipelineRun) -> dict:
+    with run.pool.connection() as conn:
+        fingerprint = silver_fingerprint(conn, run.settings)
+    inputs = {"source": run.source(), "silver": fingerprint,
+              "snapshots": SNAPSHOTS, "step_days": STEP_DAYS, "horizons": HORIZONS}
+
+    def write(path):
+        with stage("read") as s:
+            df = read_features_parallel(run.pool)
+            s.rows_out = len(df)
+        with stage("labels") as s:
+            with run.pool.connection() as conn:
+                training_set = training_set_from_sql(conn, run.settings)   # labels point-in-time
+            s.rows_out = len(training_set)
+        with stage("checkpoint_extract", rows_in=len(df) + len(training_set)):
+            write_parquet(df, os.path.join(path, FEATURES_FILE))
+            write_parquet(training_set, os.path.join(path, TRAINING_FILE))
+        run.keep("extract", FEATURES_FILE, df)
+        run.keep("extract", TRAINING_FILE, training_set)
+        return {"rows": {"features": len(df), "training_set": len(training_set)}}
+
+    return run.step("extract", inputs, write)
+
+
+def _save_segments(path: str, segments: dict):
+    with open(os.path.join(path, "scaler.json"), "w", encoding="utf-8") as fh:
+        json.dump({"mean": segments["scaler_mean"].tolist(), "scale": segments["scaler_scale"].tolist(),
+                   "segmentation": segments["segmentation"], "n_rows": segments["n_rows"]}, fh)
+    np.save(os.path.join(path, "centroids.npy"), segments["centroids"])
+
+
+def _load_segments(path: str) -> dict:
+    with open(os.path.join(path, "scaler.json"), encoding="utf-8") as fh:
+        scaler = json.load(fh)
+    return {
+        "scaler_mean": np.asarray(scaler["mean"], dtype=np.float64),
+        "scaler_scale": np.asarray(scaler["scale"], dtype=np.float64),
+        "centroids": np.load(os.path.join(path, "centroids.npy")),
+        "segmentation": scaler["segmentation"],
+        "n_rows": scaler["n_rows"],
+    }
+
+
+def segment(run: PipelineRun) -> dict:
+    inputs = {"features": run.metas["extract"]["files"][FEATURES_FILE],
+              "features_cluster": FEATURES_CLUSTER, "n_clusters": N_CLUSTERS,
+              "method": run.segmentation, "sample_size": SAMPLE_SIZE, "minibatch_size": MINIBATCH_SIZE}
+
+    def write(path):
+        # Centróides na numeração do próprio ajuste: o alinhamento com o
+        # registro é barato e fica para o score (a versão anterior pode mudar)
+        segments = fit_segmentation(run.frame("extract", FEATURES_FILE), run.segmentation)
+        _save_segments(path, segments)
+        return {"rows": segments["n_rows"]}
+
+    return run.step("segment", inputs, write)
+
+
+def train(run: PipelineRun) -> dict:
+    inputs = {"training_set": run.metas["extract"]["files"][TRAINING_FILE],
+              "features_ml": FEATURES_ML, "labels": LABELS, "xgb_params": XGB_PARAMS,
+              "num_boost_round": NUM_BOOST_ROUND, "early_stopping_rounds": EARLY_STOPPING_ROUNDS,
+              "valid_size": VALID_SIZE}
+
+    def write(path):
+        training_set = run.frame("extract", TRAINING_FILE, release=True)
+        boosters, training = fit_boosters(training_set, run.threads)
+        for horizon, booster in boosters.items():
+            booster.save_model(os.path.join(path, f"booster_{horizon}.ubj"))
+        # Métricas (com tempos de treino) vão no meta.json, fora do digest:
+        # refazer o treino com o mesmo resultado não muda a chave do score
+        return {"rows": training["n_training_rows"], "horizons": list(boosters), "training": training}
+
+    return run.step("train", inputs, write)
+
+
+def _load_boosters(path: str, meta: dict) -> dict:
+    boosters = {}
+    for horizon in meta["horizons"]:
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(path, f"booster_{horizon}.ubj"))
+        boosters[horizon] = booster
+    return boosters
+
+
+def register(run: PipelineRun) -> dict:
+    """Bundle de segment + train no registro de modelos; só grava versão nova se ainda não estiver lá."""
+    origin = {"segment": run.metas["segment"]["digest"], "train": run.metas["train"]["digest"]}
+    try:
+        previous = load_models(run.model_dir)
+    except FileNotFoundError:
+        previous = None   # primeiro treino: numeração do próprio KMeans
+    if previous is not None and previous["metadata"].get("pipeline") == origin:
+        return previous
+
+    # Mantém a numeração dos segmentos da versão anterior
+    segments = align_segmentation(_load_segments(run.path("segment")), previous)
+    boosters = _load_boosters(run.path("train"), run.metas["train"])
+    bundle = make_bundle(segments, boosters, run.metas["train"]["training"])
+    bundle["metadata"]["pipeline"] = origin
+    with stage("save_models"):
+        save_models(bundle, run.model_dir)
+    return bundle
+
+
+def score(run: PipelineRun) -> dict:
+    bundle = register(run)
+    inputs = {"features": run.metas["extract"]["files"][FEATURES_FILE], "model_version": bundle["version"],
+              "priority": {"weights": PRIORITY_WEIGHTS, "segment": PRIORITY_SEGMENT, "bonus": PRIORITY_BONUS}}
+
+    def write(path):
+        df = run.frame("extract", FEATURES_FILE, release=True)
+        with stage("score", rows_in=len(df)) as s:
+            df = score_customers(df, bundle, InferenceEngine(bundle, run.threads))
+            s.rows_out = len(df)
+        print(">> Score de prioridade calculado.")
+        with stage("checkpoint_score", rows_in=len(df)):
+            write_parquet(df, os.path.join(path, SCORED_FILE))
+        run.keep("score", SCORED_FILE, df)
+        return {"rows": len(df), "model_version": bundle["version"]}
+
+    return run.step("score", inputs, write)
+
+
+def publish(run: PipelineRun) -> dict:
+    if not all(os.path.exists(p) for p in (ARROW_PATH, cube_path(ARROW_PATH))):
+        run.force.add("publish")   # artefato ou cubo apagado: publica de novo mesmo sem mudança
+    inputs = {"scored": run.metas["score"]["files"][SCORED_FILE], "target": run.source(),
+              "mode": run.mode, "artifact": os.path.abspath(ARROW_PATH)}
+
+    def write(path):
+        df = run.frame("score", SCORED_FILE, release=True)
+        with run.pool.connection() as conn:
+            publish_predictions(df, writer_backend(conn, run.settings), mode=run.mode)
+        return {"rows": len(df)}
+
+    return run.step("publish", inputs, write)
+
+
+STEPS = {"extract": extract, "segment": segment, "train": train, "score": score, "publish": publish}
+
+
+def run_pipeline(run: PipelineRun, until: str = STAGES[-1]) -> dict:
+    """Roda as etapas até `until` (inclusive), reaproveitando os checkpoints válidos."""
+    try:
+        for name in STAGES[:STAGES.index(until) + 1]:
+            STEPS[name](run)
+    finally:
+        run.close()
+    skipped = [name for name in run.metas if name not in run.executed]
+    print(f">> Pipeline até {until}: executadas {run.executed or '-'} | do checkpoint {skipped or '-'}")
+    return run.metas
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _print_status(store: CheckpointStore):
+    for name in STAGES:
+        entries = store.entries(name)
+        if not entries:
+            print(f">> {name:<8} sem checkpoint")
+            continue
+        for i, meta in enumerate(entries):
+            label = name if i == 0 else ""
+            size = _dir_size_mb(store.path(name, meta["key"]))
+            print(f">> {label:<8} {meta['key'][:12]}  {meta['created_at']}  {meta['seconds']:>8.2f}s  "
+                  f"{size:>8.1f} MB  linhas {meta.get('rows')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline em etapas com checkpoints.")
+    parser.add_argument("--checkpoints", default=CHECKPOINT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = commands.add_parser("run", help="roda o pipeline reaproveitando os checkpoints")
+    run_cmd.add_argument("--until", choices=STAGES, default=STAGES[-1], help="última etapa a rodar")
+    run_cmd.add_argument("--force", nargs="+", choices=STAGES + ["all"], default=[],
+                         help="refaz as etapas mesmo com checkpoint válido")
+    run_cmd.add_argument("--mode", choices=["incremental", "full"], default=GOLD_MODE)
+    run_cmd.add_argument("--segmentation", choices=["sample", "minibatch", "full"], default=METHOD)
+    run_cmd.add_argument("--threads", type=int, default=THREADS)
+    run_cmd.add_argument("--metrics", default=METRICS_PATH, help="JSON com as métricas por etapa")
+    run_cmd.add_argument("--prometheus", default=None, help="também grava as métricas no formato texto do Prometheus")
+    run_cmd.add_argument("--tracemalloc", action="store_true", help="mede o pico de memória Python/NumPy por etapa")
+    run_cmd.add_argument("--profile", default=None, help="etapa a perfilar (ex.: score, gold_write)")
+    run_cmd.add_argument("--profiler", choices=["cprofile", "pyinstrument"], default="cprofile")
+
+    commands.add_parser("status", help="lista os checkpoints de cada etapa")
+
+    invalidate_cmd = commands.add_parser("invalidate", help="apaga os checkpoints de etapas")
+    invalidate_cmd.add_argument("stages", nargs="+", choices=STAGES)
+    invalidate_cmd.add_argument("--downstream", action="store_true", help="apaga também as etapas seguintes")
+
+    prune_cmd = commands.add_parser("prune", help="mantém só os checkpoints mais recentes")
+    prune_cmd.add_argument("--keep", type=int, default=KEEP)
+    args = parser.parse_args(argv)
+
+    store = CheckpointStore(args.checkpoints)
+    if args.command == "status":
+        _print_status(store)
+    elif args.command == "invalidate":
+        names = set(args.stages)
+        if args.downstream:
+            names = set(STAGES[min(STAGES.index(n) for n in names):])
+        for name in STAGES:
+            if name in names:
+                print(f">> Etapa {name}: {store.invalidate(name)} checkpoint(s) apagado(s)")
+    elif args.command == "prune":
+        for name in STAGES:
+            print(f">> Etapa {name}: {store.prune(name, args.keep)} checkpoint(s) apagado(s)")
+    else:
+        run = Run("predictions", trace_memory=args.tracemalloc, profile_stage=args.profile,
+                  profiler=args.profiler)
+        pipeline = PipelineRun(store, force=args.force, mode=args.mode,
+                               segmentation=args.segmentation, threads=args.threads)
+        try:
+            with run:
+                run_pipeline(pipeline, args.until)
+        finally:
+            run.write(args.metrics, args.prometheus)
+            print(f">> Métricas da execução ({run.status}) gravadas em {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# ============================================
+# RoadWise - ClickBus | Cache de Resultados do Dashboard
+# LRU compartilhado entre sessões para filtros e KPIs
+# ============================================
+#
+# Chave = (versão do dataset, tupla normalizada de filtros). O valor guarda
+# as posições filtradas (no rank do FilterIndex) e os agregados derivados,
+# então mexer só no slider de conversão ou repetir um preset não refaz nada.
+# O tamanho é limitado por número de entradas e por bytes dos arrays.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_filters(personas=(), score_min=0.0, ticket_min=0.0, search="",
+                      days_max=None, today_day=None) -> tuple:
+    """Tupla canônica dos filtros: mesma seleção => mesma chave, em qualquer sessão."""
+    return (
+        tuple(sorted(set(personas or ()))),
+        round(float(score_min), 4),
+        round(float(ticket_min), 2),
+        (search or "").strip().lower(),
+        None if days_max is None else int(days_max),
+        # a recência depende do dia corrente
+        None if days_max is None else today_day,
+    )
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 0
+
+
+def compact_ranks(ranks: np.ndarray) -> np.ndarray:
+    """int32 quando possível e somente leitura (o array é compartilhado entre sessões)."""
+    if len(ranks) and ranks.max() < np.iinfo(np.int32).max:
+        ranks = ranks.astype(np.int32)
+    ranks.setflags(write=False)
+    return ranks
+
+
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key][0]
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            # Evicção LRU (sempre mantém a entrada recém-inserida)
+            while len(self._data) > 1 and (
+                len(self._data) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, (_, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def drop_version(self, version):
+        """Remove todas as entradas de uma versão de dataset."""
+        with self._lock:
+            for key in [k for k in self._data if k[0] == version]:
+                self._bytes -= self._data.pop(key)[1]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,167 @@
+# ============================================
+# RoadWise - ClickBus | ML Layer - Pontuação
+# Aplica os modelos do registro sem nenhum refit
+# ============================================
+#
+# Carrega scaler, centróides e boosters salvos por train.py, pontua
+# silver.clients_features e publica no Gold + artefato do dashboard, junto
+# com o cubo de resumo dos KPIs (summary_cube.py).
+#
+# Modo em blocos (padrão): a Silver é lida em blocos de --chunk-size linhas
+# (keyset por customer_id); cada bloco é pontuado e enviado direto para o
+# Gold e para o artefato, então a memória fica limitada ao tamanho do bloco.
+#
+# Uso: python score.py [--version VERSÃO] [--chunk-size N] [--mode full|incremental] [--threads N]
+#      (--chunk-size 0 pontua a tabela inteira de uma vez)
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ARROW_PATH, CSV_PATH, ArtifactStream, artifact_version, export_predictions
+from gold_writer import GoldWriter, replace_table
+from instrumentation import stage
+from inference import (PRIORITY_BONUS, PRIORITY_SEGMENT, PRIORITY_WEIGHTS, THREADS,
+                       InferenceEngine)
+from segmentation import nearest_centroid
+from summary_cube import CUBE_COLUMNS, CUBE_TABLE, CubeBuilder, build_cube, cube_path
+
+GOLD_BATCH_SIZE = 50_000   # linhas por executemany no Gold
+GOLD_MODE = "incremental"  # "incremental" (upsert por row_hash) ou "full" (recarga completa)
+EXPORT_CSV = True          # mantém predictions.csv como fallback do artefato Arrow
+CHUNK_SIZE = 100_000       # linhas por bloco no modo em blocos
+
+
+def assign_segments(X: np.ndarray, bundle: dict) -> np.ndarray:
+    """Segmento = centróide mais próximo no espaço padronizado (igual ao KMeans.predict)."""
+    X_scaled = (X - bundle["scaler_mean"]) / bundle["scaler_scale"]
+    return nearest_centroid(X_scaled, bundle["centroids"])
+
+
+def priority_score(prob_7d, prob_30d, segment):
+    return (PRIORITY_WEIGHTS["7d"] * prob_7d + PRIORITY_WEIGHTS["30d"] * prob_30d
+            + np.where(segment == PRIORITY_SEGMENT, PRIORITY_BONUS, 0))
+
+
+def score_customers(df: pd.DataFrame, bundle: dict, engine: InferenceEngine = None) -> pd.DataFrame:
+    """Adiciona segment, prob_repurchase_7d/30d e score_priority ao DataFrame."""
+    engine = engine or InferenceEngine(bundle)
+    return engine.score_frame(df)
+
+
+def publish_cube(cube, backend, artifact_paths) -> int:
+    """Cubo de resumo no Gold e em summary_cube.arrow, marcado com as versões dos artefatos exportados."""
+    replace_table(backend, CUBE_TABLE, cube.to_frame(), CUBE_COLUMNS, GOLD_BATCH_SIZE)
+    path = cube_path(ARROW_PATH)
+    cube.write(path, [artifact_version(p)["version"] for p in artifact_paths])
+    print(f">> Cubo de resumo salvo em {path}: {len(cube)} células ({cube.meta['rows']} clientes)")
+    return len(cube)
+
+
+def publish_predictions(df: pd.DataFrame, backend, mode=GOLD_MODE):
+    """Grava no Gold Layer, exporta o artefato do dashboard e o cubo de resumo."""
+    with stage("gold_write", rows_in=len(df)) as s:
+        gold_writer = GoldWriter(backend, batch_size=GOLD_BATCH_SIZE)
+        stats = gold_writer.publish(df, mode=mode)
+        s.rows_out = stats["rows"]   # linhas efetivamente gravadas
+    print(">> Dados gravados no Gold Layer com sucesso:", df.shape)
+
+    with stage("arrow_export", rows_in=len(df)) as s:
+        export_predictions(df, ARROW_PATH)
+        s.rows_out = len(df)
+    print(f">> Arquivo {ARROW_PATH} salvo com sucesso:", df.shape)
+    if EXPORT_CSV:
+        with stage("csv_export", rows_in=len(df)) as s:
+            export_predictions(df, CSV_PATH)
+            s.rows_out = len(df)
+        print(f">> Arquivo {CSV_PATH} salvo com sucesso:", df.shape)
+
+    with stage("summary_cube", rows_in=len(df)) as s:
+        s.rows_out = publish_cube(build_cube(df), backend, [ARROW_PATH] + ([CSV_PATH] if EXPORT_CSV else []))
+
+
+def score_stream(chunks, bundle: dict, backend, mode=GOLD_MODE, nthread=THREADS) -> dict:
+    """Pontua e publica bloco a bloco (blocos em ordem de customer_id)."""
+    engine = InferenceEngine(bundle, nthread)
+    gold_writer = GoldWriter(backend, batch_size=GOLD_BATCH_SIZE)
+    exports = [ArtifactStream(ARROW_PATH)] + ([ArtifactStream(CSV_PATH)] if EXPORT_CSV else [])
+    cube = CubeBuilder()
+
+    start = time.perf_counter()
+    total = 0
+    gold_writer.open_stream(mode)
+    try:
+        for i, chunk in enumerate(chunks, start=1):
+            t0 = time.perf_counter()
+            chunk = score_customers(chunk, bundle, engine)
+            gold_writer.write_chunk(chunk, upper=chunk["customer_id"].iloc[-1])
+            for export in exports:
+                export.write(chunk)
+            cube.add(chunk)
+            total += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(
+                f">> Bloco {i}: {len(chunk)} linhas em {time.perf_counter() - t0:.2f}s | "
+                f"total {total} | {total / elapsed:,.0f} linhas/s".replace(",", ".")
+            )
+        # Artefatos terminados (tmp fechado e versão calculada) antes do commit do
+        # Gold: depois dele só resta a troca dos arquivos
+        for export in exports:
+            export.finish()
+        stats = gold_writer.close_stream()
+    except Exception:
+        gold_writer.abort_stream()
+        for export in exports:
+            export.abort()
+        raise
+
+    for i, export in enumerate(exports):
+        try:
+            export.publish()
+        except Exception:
+            print(
+                f">> ATENÇÃO: Gold já publicado, mas {export.path} não foi atualizado; "
+                "Gold e artefato estão divergentes até a próxima pontuação."
+            )
+            for pending in exports[i:]:
+                pending.abort()
+            raise
+        print(f">> Arquivo {export.path} salvo com sucesso: {export.rows} linhas")
+    with stage("summary_cube", rows_in=total) as s:
+        s.rows_out = publish_cube(cube.result(), backend, [export.path for export in exports])
+    elapsed = time.perf_counter() - start
+    print(f">> Pontuação em blocos concluída: {total} clientes em {elapsed:.2f}s")
+    return {"rows": total, "seconds": elapsed, "gold": stats}
+
+
+if __name__ == "__main__":
+    from data_access import (ConnectionPool, iter_feature_chunks, load_settings,
+                             read_features_parallel, writer_backend)
+    from model_registry import load_models
+
+    parser = argparse.ArgumentParser(description="Pontua clientes com os modelos do registro.")
+    parser.add_argument("--version", default=None, help="versão do registro (padrão: LATEST)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="linhas por bloco; 0 = tabela inteira de uma vez")
+    parser.add_argument("--mode", choices=["incremental", "full"], default=GOLD_MODE)
+    parser.add_argument("--partitions", type=int, default=None,
+                        help="faixas de customer_id lidas em paralelo com --chunk-size 0 "
+                             "(padrão: RW_DB_POOL_SIZE)")
+    parser.add_argument("--threads", type=int, default=THREADS, help="threads da inferência")
+    args = parser.parse_args()
+
+    bundle = load_models(version=args.version)
+    settings = load_settings()
+    with ConnectionPool(settings) as pool:
+        if args.chunk_size > 0:
+            with pool.connection() as conn:
+                chunks = iter_feature_chunks(conn, args.chunk_size, settings=settings)
+                score_stream(chunks, bundle, writer_backend(conn, settings), args.mode, args.threads)
+        else:
+            df = read_features_parallel(pool, args.partitions)
+            df = score_customers(df, bundle, InferenceEngine(bundle, args.threads))
+            print(">> Score de prioridade calculado.")
+            with pool.connection() as conn:
+                publish_predictions(df, writer_backend(conn, settings), mode=args.mode)
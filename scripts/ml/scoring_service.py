@@ -0,0 +1,368 @@
+# ============================================
+# RoadWise - ClickBus | Serviço de Pontuação Online
+# Score sob demanda para um cliente ou micro-lotes, com os modelos em memória
+# ============================================
+#
+# Servidor HTTP local (biblioteca padrão, uma thread por conexão) que mantém
+# scaler, centróides e boosters da versão do registro carregados:
+#
+#   POST /score               -> pontua vetores de features enviados no corpo
+#                                {"customers": [{"customer_id": ..., <features>}, ...]}
+#                                (ou um único objeto)
+#   GET  /customers/<id>      -> último score pré-calculado (artefato do dashboard)
+#   GET  /metrics             -> latência p50/p99 por rota, lotes e cache
+#   GET  /health              -> versão dos modelos e do artefato
+#
+# Requisições concorrentes entram numa fila e são agrupadas em micro-lotes
+# (até MAX_BATCH linhas ou MAX_WAIT_MS de espera) antes de chegar aos
+# boosters: uma chamada de inplace_predict atende várias requisições.
+# Vetores repetidos saem de um cache LRU (result_cache.ResultCache).
+#
+# Uso: python scoring_service.py [--port 8502] [--version VERSÃO]
+#                                [--max-batch 256] [--max-wait-ms 2]
+
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from artifacts import ARROW_PATH, PERSONAS, read_predictions, resolve_path
+from dataset_store import DatasetStore
+from ids import fixed_width, parse_id
+from inference import THREADS, InferenceEngine
+from result_cache import ResultCache
+
+HOST = "127.0.0.1"
+PORT = 8502
+MAX_BATCH = 256           # linhas por chamada aos boosters
+MAX_WAIT_MS = 2.0         # espera máxima para completar um micro-lote
+CACHE_ENTRIES = 100_000   # vetores de features no LRU
+LATENCY_WINDOW = 10_000   # últimas requisições consideradas no p50/p99
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+LOOKUP_COLUMNS = ["segment", "persona", "prob_repurchase_7d", "prob_repurchase_30d",
+                  "score_priority", "days_since_last_purchase", "last_purchase", "ticket_medio"]
+
+
+# -----------------------------
+# Micro-lotes
+# -----------------------------
+class MicroBatcher:
+    """Agrupa pedidos concorrentes numa única chamada ao InferenceEngine."""
+
+    def __init__(self, engine: InferenceEngine, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.engine = engine
+        self.max_batch = int(max_batch)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, X: np.ndarray) -> Future:
+        """X: matriz (n, len(engine.columns)) float32. O Future devolve o dict de saída."""
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        items, rows = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # repassa o sinal de parada para o loop principal
+                break
+            items.append(item)
+            rows += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            items = self._collect(first)
+            try:
+                X = items[0][0] if len(items) == 1 else np.concatenate([x for x, _ in items])
+                out = self.engine.score_matrix(X)
+            except Exception as exc:
+                for _, future in items:
+                    future.set_exception(exc)
+                continue
+            start = 0
+            for x, future in items:
+                stop = start + len(x)
+                future.set_result({k: v[start:stop] for k, v in out.items()})
+                start = stop
+            with self._lock:
+                self.batches += 1
+                self.rows += len(X)
+                self.requests += len(items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "requests": self.requests,
+                "avg_batch_rows": self.rows / self.batches if self.batches else 0.0,
+                "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            }
+
+
+# -----------------------------
+# Latência
+# -----------------------------
+class LatencyTracker:
+    """Janela deslizante de latências (ms) por rota."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = int(window)
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, ms: float):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(ms)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {route: np.fromiter(s, dtype=np.float64) for route, s in self._samples.items()}
+            counts = dict(self._counts)
+        out = {}
+        for route, values in samples.items():
+            p50, p99 = np.percentile(values, [50, 99]) if len(values) else (0.0, 0.0)
+            out[route] = {"count": counts[route], "p50_ms": round(float(p50), 3),
+                          "p99_ms": round(float(p99), 3), "max_ms": round(float(values.max()), 3)}
+        return out
+
+
+# -----------------------------
+# Serviço
+# -----------------------------
+def load_lookup(path: str):
+    """Artefato do dashboard + índice ordenado de customer_id (32 bytes) para busca binária."""
+    df = read_predictions(path)
+    ids = fixed_width(df["customer_id"])
+    order = np.argsort(ids, kind="stable")
+    return df, {"ids": ids[order], "rows": order}
+
+
+class ScoringService:
+    def __init__(self, bundle: dict, artifact_path: str = None, nthread=THREADS,
+                 max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, cache_entries=CACHE_ENTRIES):
+        self.bundle = bundle
+        self.version = bundle.get("version")
+        self.engine = InferenceEngine(bundle, nthread, batch_rows=max(int(max_batch), 1))
+        self.batcher = MicroBatcher(self.engine, max_batch, max_wait_ms)
+        self.cache = ResultCache(max_entries=cache_entries)
+        self.latency = LatencyTracker()
+        self.artifact_path = artifact_path
+        self.store = DatasetStore(load_lookup)
+
+    def close(self):
+        self.batcher.close()
+
+    # Pontuação de vetores enviados
+    def _matrix(self, records: list) -> np.ndarray:
+        X = np.empty((len(records), len(self.engine.columns)), dtype=np.float32)
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                raise ValueError(f"Registro {i}: esperado um objeto com as features.")
+            missing = [c for c in self.engine.columns if c not in record]
+            if missing:
+                raise ValueError(f"Registro {i}: features ausentes ({', '.join(missing)}).")
+            try:
+                X[i] = [np.nan if record[c] is None else float(record[c]) for c in self.engine.columns]
+            except (TypeError, ValueError):
+                raise ValueError(f"Registro {i}: features precisam ser numéricas.") from None
+        np.nan_to_num(X, copy=False, nan=0.0)   # mesmo tratamento do lote (fillna(0))
+        return X
+
+    def _result(self, out: dict, i: int) -> dict:
+        segment = int(out["segment"][i])
+        result = {"segment": segment, "persona": PERSONAS.get(segment, "n/a")}
+        for horizon in self.engine.boosters:
+            result[f"prob_repurchase_{horizon}"] = round(float(out[f"prob_repurchase_{horizon}"][i]), 6)
+        result["score_priority"] = round(float(out["score_priority"][i]), 6)
+        return result
+
+    def score(self, records: list) -> list:
+        X = self._matrix(records)
+        keys = [(self.version, row.tobytes()) for row in X]
+        results = [self.cache.get(key) for key in keys]
+        pending = [i for i, r in enumerate(results) if r is None]
+        if pending:
+            out = self.batcher.submit(X[pending]).result()
+            for j, i in enumerate(pending):
+                results[i] = self._result(out, j)
+                self.cache.put(keys[i], results[i])
+        scored = []
+        for record, result in zip(records, results):
+            item = {"customer_id": record.get("customer_id"), **result, "model_version": self.version}
+            scored.append(item)
+        return scored
+
+    # Último score pré-calculado
+    def lookup(self, customer_id: str):
+        path = self.artifact_path or resolve_path()
+        dataset = self.store.get(path)
+        df, index = dataset["df"], dataset["index"]
+        ids, key = index["ids"], parse_id(customer_id)
+        if key is None:
+            return None
+        pos, end = np.searchsorted(ids, key, side="left"), np.searchsorted(ids, key, side="right")
+        if pos == end:
+            return None
+        row = df.iloc[int(index["rows"][pos])]
+        result = {"customer_id": customer_id}
+        for col in LOOKUP_COLUMNS:
+            if col in df.columns:
+                value = row[col]
+                if pd.isna(value):
+                    value = None
+                elif hasattr(value, "isoformat"):
+                    value = value.isoformat()
+                elif hasattr(value, "item"):
+                    value = value.item()
+                result[col] = value
+        result["artifact_version"] = dataset["version"]
+        return result
+
+    def metrics(self) -> dict:
+        return {
+            "model_version": self.version,
+            "latency": self.latency.snapshot(),
+            "batching": self.batcher.stats(),
+            "cache": self.cache.stats(),
+        }
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+class ScoringHandler(BaseHTTPRequestHandler):
+    service: ScoringService = None   # definido em make_server
+    server_version = "RoadWiseScoring/1.0"
+
+    def log_message(self, format, *args):
+        pass   # o acesso é acompanhado por /metrics
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _timed(self, route: str, handler):
+        start = time.perf_counter()
+        try:
+            status, payload = handler()
+        except ValueError as exc:
+            status, payload = 400, {"error": str(exc)}
+        except Exception as exc:
+            status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+        self._send(status, payload)
+        self.service.latency.record(route, (time.perf_counter() - start) * 1000.0)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.startswith("/customers/"):
+            customer_id = unquote(path[len("/customers/"):])
+            self._timed("lookup", lambda: self._lookup(customer_id))
+        elif path == "/metrics":
+            self._send(200, self.service.metrics())
+        elif path == "/health":
+            self._send(200, {"status": "ok", "model_version": self.service.version})
+        else:
+            self._send(404, {"error": f"Rota não encontrada: {path}"})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path != "/score":
+            self._send(404, {"error": f"Rota não encontrada: {path}"})
+            return
+        self._timed("score", self._score)
+
+    def _lookup(self, customer_id):
+        result = self.service.lookup(customer_id)
+        if result is None:
+            return 404, {"error": f"Cliente não encontrado: {customer_id}"}
+        return 200, result
+
+    def _score(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_BYTES:
+            raise ValueError(f"Corpo ausente ou maior que {MAX_BODY_BYTES} bytes.")
+        try:
+            body = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"JSON inválido: {exc}") from None
+        records = body.get("customers", [body]) if isinstance(body, dict) else body
+        if not isinstance(records, list) or not records:
+            raise ValueError('Envie um objeto de features ou {"customers": [...]}.')
+        return 200, {"results": self.service.score(records)}
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # backlog do listen(); o padrão (5) derruba rajadas concorrentes
+
+
+def make_server(service: ScoringService, host=HOST, port=PORT) -> ScoringServer:
+    handler = type("BoundScoringHandler", (ScoringHandler,), {"service": service})
+    return ScoringServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    from model_registry import load_models
+
+    parser = argparse.ArgumentParser(description="Serviço HTTP de pontuação online.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--version", default=None, help="versão do registro (padrão: LATEST)")
+    parser.add_argument("--artifact", default=None,
+                        help=f"artefato para a busca por customer_id (padrão: {ARROW_PATH} ou CSV)")
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--cache-entries", type=int, default=CACHE_ENTRIES)
+    args = parser.parse_args()
+
+    service = ScoringService(load_models(version=args.version), args.artifact, args.threads,
+                             args.max_batch, args.max_wait_ms, args.cache_entries)
+    server = make_server(service, args.host, args.port)
+    print(f">> Serviço de pontuação em http://{args.host}:{args.port} (modelos {service.version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,78 @@
+# ============================================
+# RoadWise - ClickBus | Segmentação
+# KMeans em amostra / mini-batch + IDs de segmento estáveis entre treinos
+# ============================================
+#
+# Ajuste:
+#   "sample"    -> KMeans (n_init=10) numa amostra de até SAMPLE_SIZE clientes
+#   "minibatch" -> MiniBatchKMeans sobre a base inteira, em lotes
+#   "full"      -> KMeans na base inteira (comportamento original)
+#
+# Atribuição: centróide mais próximo, em blocos de CHUNK_SIZE linhas, então a
+# memória não cresce com o tamanho da base.
+#
+# A numeração do KMeans é arbitrária a cada ajuste, mas o dashboard
+# (PERSONAS) e o score de prioridade (bônus do segmento 0) dependem dela. Os
+# novos centróides são reordenados para casar com os do treino anterior
+# (atribuição húngara sobre as distâncias, na escala original das features):
+# o segmento 0 continua sendo o mesmo grupo de clientes e a mesma persona.
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+N_CLUSTERS = 4
+METHOD = "sample"
+SAMPLE_SIZE = 200_000
+MINIBATCH_SIZE = 4_096
+CHUNK_SIZE = 500_000
+
+
+def fit_centroids(X_scaled: np.ndarray, n_clusters=N_CLUSTERS, method=METHOD,
+                  sample_size=SAMPLE_SIZE, random_state=42) -> np.ndarray:
+    """Centróides no espaço padronizado."""
+    if method == "full":
+        model = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+        return model.fit(X_scaled).cluster_centers_
+    if method == "sample":
+        rng = np.random.default_rng(random_state)
+        if len(X_scaled) > sample_size:
+            X_scaled = X_scaled[rng.choice(len(X_scaled), sample_size, replace=False)]
+        model = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+        return model.fit(X_scaled).cluster_centers_
+    if method == "minibatch":
+        model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=MINIBATCH_SIZE,
+                                n_init=3, random_state=random_state)
+        return model.fit(X_scaled).cluster_centers_
+    raise ValueError(f"Método de segmentação inválido: {method!r} (use 'sample', 'minibatch' ou 'full').")
+
+
+def nearest_centroid(X_scaled: np.ndarray, centroids: np.ndarray, chunk_size=CHUNK_SIZE) -> np.ndarray:
+    """Segmento = centróide mais próximo (igual ao KMeans.predict), em blocos de linhas."""
+    labels = np.empty(len(X_scaled), dtype=np.int64)
+    c_norm = (centroids ** 2).sum(axis=1)[None, :]
+    for start in range(0, len(X_scaled), chunk_size):
+        block = X_scaled[start:start + chunk_size]
+        # ||x - c||² sem materializar o tensor (n, k, d); ||x||² não muda o argmin
+        dist = c_norm - 2.0 * block @ centroids.T
+        labels[start:start + chunk_size] = dist.argmin(axis=1)
+    return labels
+
+
+def align_centroids(centroids, scaler_mean, scaler_scale, previous: dict):
+    """Reordena os centróides para casar com os do bundle anterior.
+
+    A comparação é feita na escala original (o scaler muda a cada treino).
+    Devolve (centróides reordenados, deslocamento de cada segmento).
+    """
+    new_raw = centroids * scaler_scale + scaler_mean
+    old_raw = previous["centroids"] * previous["scaler_scale"] + previous["scaler_mean"]
+    if new_raw.shape != old_raw.shape:
+        return centroids, None
+    # Distância em unidades do scaler novo, para nenhuma feature dominar
+    diff = (old_raw[:, None, :] - new_raw[None, :, :]) / scaler_scale
+    cost = (diff ** 2).sum(axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    order = cols[np.argsort(rows)]
+    shift = np.sqrt(cost[np.arange(len(order)), order])
+    return centroids[order], shift
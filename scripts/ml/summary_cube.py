@@ -0,0 +1,303 @@
+# ============================================
+# RoadWise - ClickBus | Cubo de Resumo do Dashboard
+# Contagens e somas pré-agregadas para os KPIs e os chips de filtro
+# ============================================
+#
+# KPIs e chips do dashboard são somas, médias e proporções. Em vez de varrer
+# os clientes, o pipeline publica um cubo agrupado por
+#
+#   persona (segmento) × faixa de score × faixa de ticket × faixa de recência
+#
+# com contagem de clientes, clientes quentes, Σ ticket, Σ ticket × prob_30d e
+# Σ das probabilidades/score. O tamanho depende só das faixas, não da base.
+#
+# As faixas casam com os controles do dashboard: score em passos de 0.05,
+# ticket em múltiplos de R$ 10 (até R$ 500, depois mais largas) e recência em
+# múltiplos de 10 dias contados da data de referência do cubo. Um filtro em
+# cima de uma borda é respondido somando células inteiras, com o mesmo
+# resultado da varredura. Filtro fora da grade (busca por ID, ticket
+# quebrado, recência com o cubo de outro dia) devolve None e o dashboard
+# volta ao FilterIndex.
+#
+# Saída: gold.customer_summary_cube + summary_cube.arrow (ao lado do artefato).
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from artifacts import PERSONAS
+from filter_index import HOT_SCORE, NO_DATE, epoch_days, today_epoch_day
+
+CUBE_PATH = "summary_cube.arrow"
+CUBE_TABLE = "customer_summary_cube"
+
+# Bordas inferiores (score, ticket) e limites superiores inclusivos (recência, em dias)
+SCORE_EDGES = np.round(np.arange(0.0, 1.0001, 0.05), 2).astype(np.float32)
+TICKET_EDGES = np.array([*range(0, 500, 10), *range(500, 1000, 50), *range(1000, 3000, 250),
+                         3000, 5000, 10000], dtype=np.float64)
+RECENCY_EDGES = np.array([0, 10, 20, 30, 60, 90, 120, 180, 270, 360, 540, 720,
+                          1080, 1440, 1800, 2520, 3600], dtype=np.int64)
+NO_RECENCY = -1   # cliente sem data de última compra
+BLOCK_ROWS = 1_000_000   # clientes por bloco na montagem do cubo
+
+DIMENSIONS = ["segment", "persona", "score_bucket", "ticket_bucket", "recency_bucket"]
+MEASURES = ["customers", "hot_customers", "ticket_sum", "revenue_30d",
+            "prob_7d_sum", "prob_30d_sum", "score_sum"]
+
+# (coluna, tipo SQL, conversão) no formato do gold_writer
+CUBE_COLUMNS = [
+    ("as_of", "DATETIME2(0) NOT NULL", "datetime"),
+    ("segment", "INT", "int"),
+    ("persona", "NVARCHAR(64) NOT NULL", "str"),
+    ("score_bucket", "TINYINT NOT NULL", "int"),
+    ("score_from", "DECIMAL(4,2)", 2),
+    ("ticket_bucket", "SMALLINT NOT NULL", "int"),
+    ("ticket_from", "DECIMAL(12,2)", 2),
+    ("recency_bucket", "SMALLINT NOT NULL", "int"),
+    ("recency_days_max", "INT", "int"),
+    ("customers", "INT NOT NULL", "int"),
+    ("hot_customers", "INT NOT NULL", "int"),
+    ("ticket_sum", "DECIMAL(18,2)", 2),
+    ("revenue_30d", "DECIMAL(18,2)", 2),
+    ("prob_7d_sum", "DECIMAL(18,4)", 4),
+    ("prob_30d_sum", "DECIMAL(18,4)", 4),
+    ("score_sum", "DECIMAL(18,4)", 4),
+]
+
+
+def _unit(series: pd.Series) -> np.ndarray:
+    # Mesmo tipo do artefato (float32) e mesma sanitização do dashboard
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float32)
+    return np.clip(np.nan_to_num(values, nan=0.0), 0, 1)
+
+
+def _cells(df: pd.DataFrame, as_of_day: int):
+    """Células de um bloco de clientes + (menor, maior) idade da última compra (None sem datas)."""
+    score = _unit(df["score_priority"])
+    prob30 = _unit(df["prob_repurchase_30d"])
+    prob7 = _unit(df["prob_repurchase_7d"])
+    ticket = pd.to_numeric(df["ticket_medio"], errors="coerce").to_numpy(dtype=np.float64)
+    ticket = np.clip(np.nan_to_num(ticket, nan=0.0), 0, None)
+
+    if "persona" in df.columns:
+        persona = df["persona"].astype(str).to_numpy()
+    else:
+        persona = df["segment"].map(PERSONAS).fillna("n/a").to_numpy()
+
+    ages = None
+    recency = np.full(len(df), NO_RECENCY, dtype=np.int64)
+    if "last_purchase" in df.columns:
+        last_day = epoch_days(df["last_purchase"]).astype(np.int64)
+        dated = last_day != NO_DATE
+        age = as_of_day - last_day[dated]
+        # faixa i: RECENCY_EDGES[i-1] < idade <= RECENCY_EDGES[i] (acima da última: faixa aberta)
+        recency[dated] = np.searchsorted(RECENCY_EDGES, age, side="left")
+        if len(age):
+            ages = (int(age.min()), int(age.max()))
+
+    rows = pd.DataFrame({
+        "segment": pd.to_numeric(df["segment"], errors="coerce").fillna(-1).astype(np.int64).to_numpy(),
+        "persona": persona,
+        "score_bucket": np.searchsorted(SCORE_EDGES, score, side="right") - 1,
+        "ticket_bucket": np.searchsorted(TICKET_EDGES, ticket, side="right") - 1,
+        "recency_bucket": recency,
+        "customers": 1,
+        "hot_customers": (score >= HOT_SCORE).astype(np.int64),
+        "ticket_sum": ticket,
+        "revenue_30d": ticket * prob30.astype(np.float64),
+        "prob_7d_sum": prob7.astype(np.float64),
+        "prob_30d_sum": prob30.astype(np.float64),
+        "score_sum": score.astype(np.float64),
+    })
+    return rows.groupby(DIMENSIONS, sort=False, as_index=False)[MEASURES].sum(), ages
+
+
+class CubeBuilder:
+    """Acumula o cubo bloco a bloco (células são aditivas): serve ao modo em blocos do score.py."""
+
+    COMBINE_EVERY = 16   # blocos acumulados antes de consolidar as células
+
+    def __init__(self, as_of=None):
+        self.as_of = pd.Timestamp.today().normalize() if as_of is None else pd.Timestamp(as_of).normalize()
+        self.as_of_day = int(np.datetime64(self.as_of.date(), "D").astype("int64"))
+        self.rows = 0
+        self.has_recency = False
+        self._ages = None
+        self._parts = []
+
+    def add(self, df: pd.DataFrame):
+        cells, ages = _cells(df, self.as_of_day)
+        self._parts.append(cells)
+        self.rows += len(df)
+        self.has_recency |= "last_purchase" in df.columns
+        if ages is not None:
+            self._ages = ages if self._ages is None else (min(self._ages[0], ages[0]),
+                                                          max(self._ages[1], ages[1]))
+        if len(self._parts) >= self.COMBINE_EVERY:
+            self._parts = [self._combine()]
+
+    def _combine(self) -> pd.DataFrame:
+        cells = pd.concat(self._parts, ignore_index=True)
+        return cells.groupby(DIMENSIONS, sort=True, as_index=False)[MEASURES].sum()
+
+    def result(self) -> "SummaryCube":
+        cells = self._combine() if self._parts else pd.DataFrame(columns=DIMENSIONS + MEASURES)
+        meta = {
+            "as_of": str(self.as_of.date()),
+            "as_of_day": self.as_of_day,
+            "rows": self.rows,
+            "has_recency": self.has_recency,
+            "min_age": None if self._ages is None else self._ages[0],
+            "max_age": None if self._ages is None else self._ages[1],
+        }
+        return SummaryCube(cells, meta)
+
+
+def build_cube(df: pd.DataFrame, as_of=None, block_rows=BLOCK_ROWS) -> "SummaryCube":
+    # Em blocos: os temporários por linha ficam limitados ao bloco
+    builder = CubeBuilder(as_of)
+    for start in range(0, max(len(df), 1), block_rows):
+        builder.add(df.iloc[start:start + block_rows])
+    return builder.result()
+
+
+# -----------------------------
+# Consulta
+# -----------------------------
+def _edge_index(edges: np.ndarray, value):
+    """Índice da borda igual a value (None se value não cair numa borda)."""
+    i = int(np.searchsorted(edges, value, side="left"))
+    return i if i < len(edges) and edges[i] == value else None
+
+
+class SummaryCube:
+    def __init__(self, cells: pd.DataFrame, meta: dict):
+        self.cells = cells.reset_index(drop=True)
+        self.meta = meta
+        self.as_of_day = int(meta["as_of_day"])
+        self.personas = sorted(self.cells["persona"].astype(str).unique())
+        self._persona = self.cells["persona"].astype(str).to_numpy()
+        self._score = self.cells["score_bucket"].to_numpy(dtype=np.int64)
+        self._ticket = self.cells["ticket_bucket"].to_numpy(dtype=np.int64)
+        self._recency = self.cells["recency_bucket"].to_numpy(dtype=np.int64)
+        self._measures = {m: self.cells[m].to_numpy(dtype=np.float64) for m in MEASURES}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _recency_mask(self, days_max, today_day):
+        dated = self._recency != NO_RECENCY
+        if self.meta["max_age"] is None:
+            return dated   # nenhum cliente com data: nada passa
+        # last_day >= hoje - days_max  <=>  idade (na data do cubo) <= days_max - (hoje - as_of)
+        limit = int(days_max) - (int(today_day) - self.as_of_day)
+        if limit >= self.meta["max_age"]:
+            return dated
+        if limit < self.meta["min_age"]:
+            return np.zeros_like(dated)
+        i = _edge_index(RECENCY_EDGES, limit)
+        if i is None:
+            return None
+        return dated & (self._recency <= i)
+
+    def mask(self, personas=(), score_min=0.0, ticket_min=0.0, search="",
+             days_max=None, today_day=None):
+        """Células que compõem o filtro (mesmos argumentos do FilterIndex); None se fora da grade."""
+        if search and search.strip():
+            return None
+        mask = np.ones(len(self.cells), dtype=bool)
+        if personas:
+            mask &= np.isin(self._persona, list(personas))
+        if np.float32(score_min) > SCORE_EDGES[0]:
+            i = _edge_index(SCORE_EDGES, np.float32(score_min))
+            if i is None:
+                return None
+            mask &= self._score >= i
+        if ticket_min:
+            i = _edge_index(TICKET_EDGES, float(ticket_min))
+            if i is None:
+                return None
+            mask &= self._ticket >= i
+        if days_max is not None and self.meta["has_recency"]:
+            today_day = today_epoch_day() if today_day is None else today_day
+            recency = self._recency_mask(days_max, today_day)
+            if recency is None:
+                return None
+            mask &= recency
+        return mask
+
+    def summary(self, **filters):
+        """Agregados dos chips (mesmo formato de FilterIndex.summary) ou None se o cubo não cobre o filtro."""
+        mask = self.mask(**filters)
+        if mask is None:
+            return None
+        totals = {m: float(values[mask].sum()) for m, values in self._measures.items()}
+        n = int(totals["customers"])
+        if not n:
+            return {"count": 0, "pct_quentes": 0.0, "ticket_medio": 0.0,
+                    "receita_pot": 0.0, "ticket_sum": 0.0}
+        return {
+            "count": n,
+            "pct_quentes": totals["hot_customers"] / n * 100,
+            "ticket_medio": totals["ticket_sum"] / n,
+            "receita_pot": totals["revenue_30d"],
+            "ticket_sum": totals["ticket_sum"],
+        }
+
+    # -----------------------------
+    # Gold e artefato
+    # -----------------------------
+    def to_frame(self) -> pd.DataFrame:
+        """Células com as bordas legíveis, no formato de gold.customer_summary_cube."""
+        cells = self.cells
+        recency = cells["recency_bucket"].to_numpy(dtype=np.int64)
+        # Limite superior da faixa; nulo para "sem data" e para a faixa aberta
+        in_grid = (recency >= 0) & (recency < len(RECENCY_EDGES))
+        days_max = pd.Series(RECENCY_EDGES[np.clip(recency, 0, len(RECENCY_EDGES) - 1)], dtype="Int64")
+        return pd.DataFrame({
+            "as_of": pd.Timestamp(self.meta["as_of"]),
+            "segment": cells["segment"].to_numpy(),
+            "persona": cells["persona"].to_numpy(),
+            "score_bucket": cells["score_bucket"].to_numpy(),
+            "score_from": SCORE_EDGES[cells["score_bucket"].to_numpy(dtype=np.int64)].astype(np.float64),
+            "ticket_bucket": cells["ticket_bucket"].to_numpy(),
+            "ticket_from": TICKET_EDGES[cells["ticket_bucket"].to_numpy(dtype=np.int64)],
+            "recency_bucket": recency,
+            "recency_days_max": days_max.mask(~in_grid).to_numpy(),
+            **{m: cells[m].to_numpy() for m in MEASURES},
+        })
+
+    def write(self, path=CUBE_PATH, artifact_versions=()):
+        """Grava o cubo (Arrow IPC) com os metadados e as versões do artefato a que ele corresponde."""
+        meta = {**self.meta, "artifact_versions": list(artifact_versions)}
+        table = pa.Table.from_pandas(self.cells, preserve_index=False)
+        table = table.replace_schema_metadata({"roadwise_cube": json.dumps(meta)})
+        tmp = path + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+        self.meta = meta
+
+
+def load_cube(path=CUBE_PATH, artifact_version=None):
+    """Cubo gravado pelo pipeline; None se não existir ou se for de outra versão do artefato."""
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    meta = json.loads((table.schema.metadata or {}).get(b"roadwise_cube", b"{}"))
+    if "as_of_day" not in meta:
+        return None
+    if artifact_version is not None and artifact_version not in meta.get("artifact_versions", []):
+        return None
+    return SummaryCube(table.to_pandas(), meta)
+
+
+def cube_path(artifact_path: str) -> str:
+    """summary_cube.arrow na mesma pasta do artefato de predições."""
+    return os.path.join(os.path.dirname(artifact_path), CUBE_PATH)
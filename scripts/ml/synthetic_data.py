@@ -0,0 +1,274 @@
+# ============================================
+# RoadWise - ClickBus | Dados Sintéticos
+# Bases no formato de silver.purchases_clean / silver.clients_features
+# ============================================
+#
+# Gerador determinístico (seed) para medir o pipeline e o dashboard em
+# escala, sem depender da base real:
+#   - customer_id: 64 hex (mesmo formato dos IDs reais, que são hashes);
+#   - destinos/origens/empresas: sha256 de inteiros, como na base real;
+#   - compras por cliente com cauda longa (binomial negativa): a maioria
+#     compra 1-3 vezes e poucos clientes concentram dezenas/centenas;
+#   - atividade entre a primeira compra e um "abandono" que depende da
+#     frequência, então recência e janelas de 30/90/180 dias ficam realistas;
+#   - ticket por cliente (lognormal) com variação por compra.
+#
+# As features saem do próprio feature_engine sobre as compras geradas, então
+# as duas tabelas são consistentes entre si. Tudo é gerado em blocos de
+# clientes e gravado em Parquet particionado (memória limitada ao bloco).
+#
+# Saída: <out>/<escala>/purchases/part-*.parquet
+#        <out>/<escala>/clients_features/part-*.parquet
+#        <out>/<escala>/manifest.json
+#        <out>/<escala>/df_t.csv (com --raw-csv: as compras no formato bruto de
+#        bronze.df_t, entrada de ingest.py)
+#
+# Uso: python synthetic_data.py --scale 10k|1m|20m [--out synthetic] [--seed 42] [--raw-csv]
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from feature_engine import _period, compute_features, epoch_day
+from ids import arrow_table, write_parquet
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "20m": 20_000_000}
+OUT_DIR = "synthetic"
+SEED = 42
+TODAY = "2024-04-01"         # @today da base sintética (data da compra mais recente)
+HISTORY_DAYS = 11 * 365      # primeira compra possível: ~11 anos antes de TODAY
+CHUNK_CUSTOMERS = 500_000    # clientes por bloco / arquivo
+
+N_PLACES = 4_000             # origens/destinos distintos
+N_COMPANIES = 120            # empresas de ônibus
+ROUND_TRIP_RATE = 0.25
+
+_DAY = 86_400
+_HEX = np.array([f"{i:02x}".encode() for i in range(256)], dtype="S2")
+
+
+# -----------------------------
+# IDs
+# -----------------------------
+def hex_ids(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n IDs de 64 caracteres hexadecimais (32 bytes aleatórios cada)."""
+    raw = rng.integers(0, 256, size=(n, 32), dtype=np.uint8)
+    hexed = np.ascontiguousarray(_HEX[raw]).view("S64").ravel()
+    return pa.array(hexed, type=pa.binary()).cast(pa.string()).to_numpy(zero_copy_only=False)
+
+
+def hashed_values(n: int) -> np.ndarray:
+    """sha256 de "1".."n": o mesmo formato das colunas de local/empresa da base real."""
+    return np.array([hashlib.sha256(str(i).encode()).hexdigest() for i in range(1, n + 1)], dtype=object)
+
+
+def _zipf_index(rng, n: int, size, a=1.3) -> np.ndarray:
+    # Popularidade com cauda longa, truncada no tamanho do catálogo
+    return (rng.zipf(a, size) - 1) % n
+
+
+# -----------------------------
+# Geração
+# -----------------------------
+def customer_profiles(rng: np.random.Generator, n: int, today_day: int) -> dict:
+    counts = 1 + np.minimum(rng.negative_binomial(0.6, 0.18, n), 2_000)
+    first_day = today_day - rng.integers(0, HISTORY_DAYS, n)
+    # Clientes frequentes ficam ativos por mais tempo
+    span = rng.exponential(120.0 * np.sqrt(counts))
+    last_day = np.minimum(first_day + span.astype(np.int64), today_day)
+    return {
+        "counts": counts,
+        "first_day": first_day,
+        "last_day": last_day,
+        "ticket": rng.lognormal(np.log(140.0), 0.55, n),
+        "home": _zipf_index(rng, N_PLACES, n),
+        "origin": _zipf_index(rng, N_PLACES, n),
+    }
+
+
+def purchases_block(rng: np.random.Generator, customer_ids: np.ndarray, profiles: dict,
+                    first_purchase_id: int, places: np.ndarray, companies: np.ndarray) -> pd.DataFrame:
+    """Compras de um bloco de clientes, contíguas por cliente (formato de purchases_clean)."""
+    counts = profiles["counts"]
+    owner = np.repeat(np.arange(len(counts)), counts)
+    n = len(owner)
+
+    span = profiles["last_day"] - profiles["first_day"] + 1
+    day = profiles["first_day"][owner] + (rng.random(n) * span[owner]).astype(np.int64)
+    seconds = day * _DAY + rng.integers(0, _DAY, n)
+    # Ordem cronológica dentro de cada cliente
+    order = np.lexsort((seconds, owner))
+    seconds = seconds[order]
+    purchase_dt = pd.DatetimeIndex(seconds.astype("datetime64[s]")).as_unit("ns")
+
+    # 60% das viagens para o destino "de casa", o resto pelo catálogo
+    dest = np.where(rng.random(n) < 0.6, profiles["home"][owner], _zipf_index(rng, N_PLACES, n))
+    origin = profiles["origin"][owner]
+    round_trip = rng.random(n) < ROUND_TRIP_RATE
+    company = _zipf_index(rng, N_COMPANIES, n, a=1.6)
+
+    gmv = np.round(profiles["ticket"][owner] * rng.lognormal(0.0, 0.3, n), 2)
+    qty = 1 + rng.poisson(0.3, n)
+
+    def places_at(codes, mask=None):
+        codes = codes.astype(np.int32)
+        if mask is not None:
+            codes = np.where(mask, codes, -1)
+        return pd.Categorical.from_codes(codes, categories=places)
+
+    hour = purchase_dt.hour.to_numpy()
+    return pd.DataFrame({
+        "purchase_id": np.arange(first_purchase_id, first_purchase_id + n, dtype=np.int64),
+        "customer_id": pd.Categorical.from_codes(owner.astype(np.int32), categories=customer_ids),
+        "purchase_datetime": purchase_dt,
+        "place_origin_departure": places_at(origin),
+        "place_destination_departure": places_at(dest),
+        "place_origin_return": places_at(dest, round_trip),
+        "place_destination_return": places_at(origin, round_trip),
+        "departure_bus_company": pd.Categorical.from_codes(company.astype(np.int32), categories=companies),
+        "return_bus_company": pd.Categorical.from_codes(
+            np.where(round_trip, company, -1).astype(np.int32), categories=companies),
+        "gmv_success": gmv,
+        "total_tickets_qty": qty.astype(np.int32),
+        "purchase_month": purchase_dt.month.to_numpy(dtype=np.int8),
+        "purchase_week": purchase_dt.isocalendar().week.to_numpy(dtype=np.int8),
+        "purchase_dayofweek": (purchase_dt.dayofweek.to_numpy() + 1).astype(np.int8),
+        "purchase_period": pd.Categorical(_period(hour)),
+    })
+
+
+def plain_table(df: pd.DataFrame) -> pa.Table:
+    """Categorias viram texto simples, como num export da Silver (o Parquet ainda comprime por dicionário)."""
+    table = arrow_table(df)
+    fields = [pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f
+              for f in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+def iter_blocks(n_customers: int, seed=SEED, today=TODAY, chunk_customers=CHUNK_CUSTOMERS):
+    """(compras, features) por bloco de clientes. Mesmos parâmetros => mesmos dados."""
+    today_day = epoch_day(today)
+    places = hashed_values(N_PLACES)
+    companies = hashed_values(N_COMPANIES)
+    next_purchase_id = 1
+    for i, start in enumerate(range(0, n_customers, chunk_customers)):
+        rng = np.random.default_rng([seed, i])
+        n = min(chunk_customers, n_customers - start)
+        ids = hex_ids(rng, n)
+        purchases = purchases_block(rng, ids, customer_profiles(rng, n, today_day),
+                                    next_purchase_id, places, companies)
+        next_purchase_id += len(purchases)
+        yield purchases, compute_features(purchases, today)
+
+
+def generate(scale, out_dir=OUT_DIR, seed=SEED, today=TODAY,
+             chunk_customers=CHUNK_CUSTOMERS, purchases=True) -> dict:
+    """Grava compras e features da escala pedida ("10k", "1m", "20m" ou um inteiro)."""
+    n_customers = SCALES[scale] if scale in SCALES else int(scale)
+    base = os.path.join(out_dir, str(scale))
+    dirs = {"purchases_path": os.path.join(base, "purchases"),
+            "features_path": os.path.join(base, "clients_features")}
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith("part-"):
+                os.remove(os.path.join(path, name))
+
+    start = time.perf_counter()
+    n_purchases = 0
+    for i, (block, features) in enumerate(iter_blocks(n_customers, seed, today, chunk_customers)):
+        name = f"part-{i:05d}.parquet"
+        if purchases:
+            pq.write_table(plain_table(block), os.path.join(dirs["purchases_path"], name))
+        write_parquet(features, os.path.join(dirs["features_path"], name))
+        n_purchases += len(block)
+        print(f">> Bloco {i}: {len(features)} clientes, {len(block)} compras "
+              f"({time.perf_counter() - start:.1f}s)")
+
+    manifest = {
+        "scale": str(scale), "customers": n_customers, "purchases": n_purchases,
+        "seed": seed, "today": str(pd.Timestamp(today).date()), "chunk_customers": chunk_customers,
+        "generated_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - start, 2),
+        **dirs,
+    }
+    with open(os.path.join(base, "manifest.json"), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def write_raw_csv(purchases_path: str, csv_path: str, seed=SEED) -> int:
+    """Compras da base sintética no formato de bronze.df_t (df_t.csv), lote a lote.
+
+    Sem retorno: locais "0" e empresa "1", como no arquivo real.
+    """
+    from ingest import RAW_COLUMNS
+
+    tmp = csv_path + ".tmp"
+    rows = 0
+    options = pcsv.WriteOptions(include_header=False, quoting_style="none")
+    dataset = ds.dataset(purchases_path, format="parquet")
+    with open(tmp, "wb") as fh:
+        fh.write((",".join(RAW_COLUMNS) + "\n").encode("utf-8"))
+        for i, batch in enumerate(dataset.to_batches()):
+            if batch.num_rows == 0:
+                continue
+            rng = np.random.default_rng([seed, 7, i])
+            when = batch.column("purchase_datetime").cast(pa.timestamp("s"))
+            raw = pa.table([
+                pa.array(hex_ids(rng, batch.num_rows)),
+                batch.column("customer_id"),
+                pc.strftime(when, "%Y-%m-%d"),
+                pc.strftime(when, "%H:%M:%S"),
+                pc.fill_null(batch.column("place_origin_departure"), "0"),
+                pc.fill_null(batch.column("place_destination_departure"), "0"),
+                pc.fill_null(batch.column("place_origin_return"), "0"),
+                pc.fill_null(batch.column("place_destination_return"), "0"),
+                pc.fill_null(batch.column("departure_bus_company"), "0"),
+                pc.fill_null(batch.column("return_bus_company"), "1"),
+                pc.cast(batch.column("gmv_success"), pa.string()),
+                pc.cast(batch.column("total_tickets_qty"), pa.string()),
+            ], names=RAW_COLUMNS)
+            pcsv.write_csv(raw, fh, options)
+            rows += raw.num_rows
+    os.replace(tmp, csv_path)
+    return rows
+
+
+def load_manifest(scale, out_dir=OUT_DIR) -> dict:
+    with open(os.path.join(out_dir, str(scale), "manifest.json"), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera bases sintéticas de compras e features.")
+    parser.add_argument("--scale", default="10k", help="10k, 1m, 20m ou a quantidade de clientes")
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--today", default=TODAY)
+    parser.add_argument("--chunk", type=int, default=CHUNK_CUSTOMERS, help="clientes por bloco")
+    parser.add_argument("--no-purchases", action="store_true", help="grava só clients_features")
+    parser.add_argument("--raw-csv", action="store_true",
+                        help="grava também as compras no formato bruto de bronze.df_t (df_t.csv)")
+    args = parser.parse_args()
+
+    manifest = generate(args.scale, args.out, args.seed, args.today, args.chunk,
+                        purchases=not args.no_purchases)
+    if args.raw_csv and not args.no_purchases:
+        csv_path = os.path.join(args.out, str(args.scale), "df_t.csv")
+        rows = write_raw_csv(manifest["purchases_path"], csv_path, args.seed)
+        print(f">> {rows} compras no formato bruto -> {csv_path}")
+    print(
+        f">> Base sintética {manifest['scale']}: {manifest['customers']} clientes, "
+        f"{manifest['purchases']} compras em {manifest['seconds']:.1f}s"
+    )
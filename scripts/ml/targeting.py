@@ -0,0 +1,228 @@
+# ============================================
+# RoadWise - ClickBus | Seleção de Público para Campanhas
+# Máxima receita esperada com orçamento de contatos e limites por persona
+# ============================================
+#
+# O Top N e os presets do dashboard ordenam por score_priority. Para uma
+# campanha o que importa é quanto cada contato deve render:
+#     receita_esperada = ticket_medio × prob_repurchase_30d
+# e o problema é escolher até B clientes (orçamento de contatos) que somam a
+# maior receita esperada, com no máximo cap[p] clientes de cada persona e,
+# opcionalmente, só contatos acima de um valor mínimo (ex.: o custo do contato).
+#
+# Como as restrições são só de quantidade (total e por persona), a escolha
+# gulosa é ótima: os cap[p] melhores de cada persona formam os candidatos e,
+# entre eles, ficam os B melhores. As duas etapas são seleções parciais
+# (np.argpartition, O(n)); só a lista final é ordenada. A comparação com o
+# Top B por score mostra quanto a seleção ganha sobre o ranking atual.
+#
+# Uso: python targeting.py --budget 50000 [--cap "Clientes Inativos ou Perdidos=5%"]
+#                          [--cap "Clientes Frequentes e Fiéis=20000"] [--min-value 5]
+#                          [--data predictions.arrow] [--out campaign_targets.csv]
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import PERSONAS, read_predictions, resolve_path
+from paging import iter_csv_chunks
+
+OUT_PATH = "campaign_targets.csv"
+VALUE_COLUMN = "expected_revenue_30d"
+TARGET_COLUMNS = ["campaign_rank", "customer_id", "persona", "ticket_medio",
+                  "prob_repurchase_30d", VALUE_COLUMN, "score_priority"]
+
+
+# -----------------------------
+# Núcleo
+# -----------------------------
+def expected_revenue(ticket, prob_30d) -> np.ndarray:
+    """ticket_medio × prob_repurchase_30d por cliente.
+
+    Regra única para o CLI e o dashboard: nulos contam como 0, ticket negativo
+    vira 0 e a probabilidade fica em [0, 1].
+    """
+    ticket = np.clip(np.nan_to_num(np.asarray(ticket, dtype=np.float64), nan=0.0), 0, None)
+    prob = np.clip(np.nan_to_num(np.asarray(prob_30d, dtype=np.float64), nan=0.0), 0, 1)
+    return ticket * prob
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Índices (sem ordem) dos k maiores valores, por seleção parcial."""
+    k = int(k)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= len(values):
+        return np.arange(len(values))
+    return np.argpartition(-values, k - 1)[:k]
+
+
+def _by_value(idx: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # Valor desc; empate pela posição, para a lista ser determinística
+    return idx[np.lexsort((idx, -values[idx]))]
+
+
+def select_targets(values: np.ndarray, groups: np.ndarray, budget: int, caps=None,
+                   min_value=0.0, candidates=None) -> np.ndarray:
+    """Posições escolhidas, da maior para a menor receita esperada.
+
+    groups: código da persona por posição; caps: {código: máximo de contatos}
+    (persona fora do dict = sem limite). Só entram valores > min_value e, se
+    dado, posições de `candidates` (ex.: o conjunto filtrado do dashboard).
+    """
+    if candidates is not None:
+        candidates = np.asarray(candidates)
+        picked = select_targets(values[candidates], groups[candidates], budget, caps, min_value)
+        return candidates[picked]
+
+    keep = values > float(min_value)
+    for code, cap in (caps or {}).items():
+        if cap is None:
+            continue
+        members = np.flatnonzero(keep & (groups == code))
+        if len(members) > cap:
+            keep[members] = False
+            keep[members[top_k(values[members], cap)]] = True
+    pool = np.flatnonzero(keep)
+    return _by_value(pool[top_k(values[pool], budget)], values)
+
+
+def score_baseline(score: np.ndarray, budget: int, candidates=None) -> np.ndarray:
+    """O que o ranking atual contataria: o Top B por score_priority."""
+    if candidates is None:
+        return top_k(score, budget)
+    candidates = np.asarray(candidates)
+    return candidates[top_k(score[candidates], budget)]
+
+
+def plan_summary(values: np.ndarray, groups: np.ndarray, names, selected: np.ndarray,
+                 caps=None, baseline=None) -> dict:
+    """Totais da seleção, quebra por persona e ganho sobre o Top B por score."""
+    codes = groups[selected]
+    known = codes >= 0   # -1 = sem persona
+    counts = np.bincount(codes[known], minlength=len(names))
+    revenue = np.bincount(codes[known], weights=values[selected][known], minlength=len(names))
+    total = float(values[selected].sum())
+    out = {
+        "contacts": int(len(selected)),
+        "expected_revenue": total,
+        "revenue_per_contact": total / len(selected) if len(selected) else 0.0,
+        "min_selected_value": float(values[selected].min()) if len(selected) else None,
+        "personas": [
+            {"persona": name, "contacts": int(counts[i]), "expected_revenue": float(revenue[i]),
+             "cap": (caps or {}).get(i)}
+            for i, name in enumerate(names)
+        ],
+    }
+    if baseline is not None:
+        base = float(values[baseline].sum())
+        out["baseline_revenue"] = base
+        out["lift_pct"] = (total / base - 1) * 100 if base > 0 else None
+    return out
+
+
+# -----------------------------
+# Limites por persona
+# -----------------------------
+def parse_cap(spec: str, budget: int):
+    """'Persona=5%' (fração do orçamento) ou 'Persona=2000' -> (persona, máximo)."""
+    name, sep, amount = spec.rpartition("=")
+    if not sep or not name.strip():
+        raise ValueError(f"Limite inválido: {spec!r} (use 'Persona=N' ou 'Persona=N%').")
+    amount = amount.strip()
+    if amount.endswith("%"):
+        cap = int(budget * float(amount[:-1]) / 100)
+    else:
+        cap = int(amount)
+    if cap < 0:
+        raise ValueError(f"Limite negativo: {spec!r}")
+    return name.strip(), cap
+
+
+def cap_codes(caps_by_name: dict, names) -> dict:
+    """{persona: máximo} -> {código: máximo}; persona desconhecida é erro."""
+    index = {name: i for i, name in enumerate(names)}
+    unknown = sorted(set(caps_by_name) - set(index))
+    if unknown:
+        raise ValueError(f"Personas desconhecidas: {', '.join(unknown)} (disponíveis: {', '.join(names)})")
+    return {index[name]: cap for name, cap in caps_by_name.items()}
+
+
+# -----------------------------
+# Lote (CLI)
+# -----------------------------
+def campaign_arrays(df: pd.DataFrame):
+    """(receita esperada, score, código da persona, nomes) a partir do artefato."""
+    persona = df["persona"] if "persona" in df.columns else df["segment"].map(PERSONAS).fillna("n/a")
+    persona = persona.astype("category")
+    if persona.isna().any():
+        persona = persona.cat.add_categories("n/a").fillna("n/a")
+    values = expected_revenue(df["ticket_medio"], df["prob_repurchase_30d"])
+    score = df["score_priority"].fillna(0.0).to_numpy(dtype=np.float64)
+    names = [str(p) for p in persona.cat.categories]
+    return values, score, persona.cat.codes.to_numpy(), names
+
+
+def write_targets(df: pd.DataFrame, selected: np.ndarray, values: np.ndarray, path=OUT_PATH) -> int:
+    """Lista de alvos em CSV (ordem de receita esperada), em blocos e com troca atômica."""
+    # Só as linhas escolhidas são copiadas; as colunas novas entram nesse recorte
+    out = df.iloc[selected].reset_index(drop=True)
+    out[VALUE_COLUMN] = values[selected]
+    out["campaign_rank"] = np.arange(1, len(selected) + 1, dtype=np.int32)
+    columns = [c for c in TARGET_COLUMNS if c in out.columns]
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        for block in iter_csv_chunks(out, columns, np.arange(len(out))):
+            fh.write(block)
+    os.replace(tmp, path)
+    return len(selected)
+
+
+def print_plan(plan: dict, budget: int):
+    print(
+        f">> Campanha: {plan['contacts']} de {budget} contatos, receita esperada "
+        f"R$ {plan['expected_revenue']:,.2f} (R$ {plan['revenue_per_contact']:,.2f} por contato)"
+    )
+    if plan.get("baseline_revenue") is not None:
+        lift = f"{plan['lift_pct']:+.1f}%" if plan["lift_pct"] is not None else "n/a"
+        print(f">> Top {budget} por score: R$ {plan['baseline_revenue']:,.2f} -> ganho {lift}")
+    for row in plan["personas"]:
+        cap = "sem limite" if row["cap"] is None else f"limite {row['cap']}"
+        print(f"   {row['persona']}: {row['contacts']} contatos, R$ {row['expected_revenue']:,.2f} ({cap})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seleciona o público de campanha que maximiza a receita esperada.")
+    parser.add_argument("--budget", type=int, required=True, help="máximo de contatos")
+    parser.add_argument("--cap", action="append", default=[],
+                        help="limite por persona: 'Persona=N' ou 'Persona=N%%' do orçamento (repetível)")
+    parser.add_argument("--min-value", type=float, default=0.0,
+                        help="receita esperada mínima por contato (ex.: custo do contato)")
+    parser.add_argument("--data", default=None, help="artefato de predições (padrão: predictions.arrow/.csv)")
+    parser.add_argument("--out", default=OUT_PATH, help="CSV com a lista de alvos")
+    args = parser.parse_args()
+    if args.budget <= 0:
+        parser.error("--budget precisa ser positivo")
+
+    t0 = time.perf_counter()
+    df = read_predictions(args.data or resolve_path())
+    values, score, groups, names = campaign_arrays(df)
+    try:
+        caps = cap_codes(dict(parse_cap(spec, args.budget) for spec in args.cap), names)
+    except ValueError as exc:
+        parser.error(str(exc))
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    selected = select_targets(values, groups, args.budget, caps, args.min_value)
+    t_select = time.perf_counter() - t0
+    baseline = score_baseline(score, args.budget)
+
+    plan = plan_summary(values, groups, names, selected, caps, baseline)
+    print_plan(plan, args.budget)
+    rows = write_targets(df, selected, values, args.out)
+    print(f">> {rows} alvos -> {args.out} (leitura {t_load:.2f}s, seleção {t_select * 1000:.0f} ms "
+          f"sobre {len(df)} clientes)")
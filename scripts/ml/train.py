@@ -0,0 +1,180 @@
+# ============================================
+# RoadWise - ClickBus | ML Layer - Treino
+# Segmentação (KMeans) + modelos de recompra (XGBoost)
+# ============================================
+#
+# Roda no seu próprio agendamento e grava os artefatos no registro de
+# modelos (model_registry.py). A pontuação diária fica em score.py.
+#
+# O KMeans usa as features atuais da Silver; os boosters usam o conjunto de
+# treino point-in-time de labels.py (vários snapshots com label_7d/label_30d).
+# A segmentação (segmentation.py) é ajustada em amostra ou mini-batch e os
+# centróides são alinhados aos da versão anterior do registro, mantendo os
+# IDs de segmento (e as personas) entre treinos. Os boosters de todos os
+# horizontes treinam em paralelo (training.py).
+#
+# Uso: python train.py [--training-set training_set.parquet]
+#                      [--segmentation sample|minibatch|full]
+
+import argparse
+
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from instrumentation import stage
+from labels import HORIZONS
+from segmentation import METHOD, N_CLUSTERS, align_centroids, fit_centroids
+from training import THREADS, XGB_PARAMS, train_horizons
+
+FEATURES_CLUSTER = [
+    "days_since_last_purchase",
+    "purchases_last_90d",
+    "ticket_medio",
+    "total_purchases_lifetime"
+]
+
+FEATURES_ML = [
+    "days_since_last_purchase",
+    "purchases_last_30d",
+    "purchases_last_90d",
+    "purchases_last_180d",
+    "total_purchases_lifetime",
+    "ticket_medio"
+]
+
+# horizonte do booster -> coluna de label (labels.HORIZONS)
+LABELS = {label.removeprefix("label_"): label for label in HORIZONS}
+
+
+def _check_labels(training_set: pd.DataFrame):
+    missing = [label for label in LABELS.values() if label not in training_set.columns]
+    if missing:
+        raise ValueError(f"Labels ausentes ({', '.join(missing)}): gere o conjunto de treino com labels.py.")
+
+
+def fit_segmentation(df: pd.DataFrame, segmentation=METHOD) -> dict:
+    """Scaler + centróides do KMeans sobre as features atuais (numeração do próprio ajuste)."""
+    with stage("segment", rows_in=len(df)):
+        X_cluster = df[FEATURES_CLUSTER].fillna(0)
+
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X_cluster)
+
+        centroids = fit_centroids(X_scaled, N_CLUSTERS, segmentation)
+
+    print(f">> Segmentação concluída ({segmentation}).")
+    return {
+        "scaler_mean": scaler.mean_,
+        "scaler_scale": scaler.scale_,
+        "centroids": centroids,
+        "segmentation": segmentation,
+        "n_rows": int(len(df)),
+    }
+
+
+def align_segmentation(segments: dict, previous: dict = None) -> dict:
+    """Reordena os centróides para manter a numeração dos segmentos do bundle anterior."""
+    centroids, alignment = segments["centroids"], None
+    if previous is not None and previous.get("features_cluster") == FEATURES_CLUSTER:
+        centroids, shift = align_centroids(centroids, segments["scaler_mean"],
+                                           segments["scaler_scale"], previous)
+        if shift is not None:
+            alignment = {"previous_version": previous.get("version"),
+                         "centroid_shift": [round(float(d), 4) for d in shift]}
+            print(f">> Segmentos alinhados à versão {previous.get('version')}")
+    return {**segments, "centroids": centroids, "alignment": alignment}
+
+
+def fit_boosters(training_set: pd.DataFrame, threads=THREADS):
+    """Treina os boosters de todos os horizontes; devolve (boosters, resumo do treino)."""
+    _check_labels(training_set)
+    boosters, metrics = train_horizons(training_set, FEATURES_ML, LABELS, threads=threads)
+
+    print(">> Modelos de previsão concluídos.")
+
+    snapshots = []
+    if "snapshot_date" in training_set.columns:
+        snapshots = sorted(str(d.date()) for d in pd.to_datetime(training_set["snapshot_date"].unique()))
+    return boosters, {
+        "metrics": metrics,
+        "n_training_rows": int(len(training_set)),
+        "label_rates": {label: float(training_set[label].mean()) for label in LABELS.values()},
+        "snapshots": snapshots,
+    }
+
+
+def make_bundle(segments: dict, boosters: dict, training: dict) -> dict:
+    """Bundle no formato do registro de modelos (model_registry.save_models)."""
+    return {
+        "scaler_mean": segments["scaler_mean"],
+        "scaler_scale": segments["scaler_scale"],
+        "centroids": segments["centroids"],
+        "boosters": boosters,
+        "features_cluster": FEATURES_CLUSTER,
+        "features_ml": FEATURES_ML,
+        "metadata": {
+            "trained_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "n_rows": segments["n_rows"],
+            "n_training_rows": training["n_training_rows"],
+            "n_clusters": int(len(segments["centroids"])),
+            "segmentation": segments["segmentation"],
+            "segment_alignment": segments.get("alignment"),
+            "xgb_params": XGB_PARAMS,
+            "metrics": training["metrics"],
+            "label_rates": training["label_rates"],
+            "snapshots": training["snapshots"],
+        },
+    }
+
+
+def train_models(df: pd.DataFrame, training_set: pd.DataFrame = None,
+                 previous: dict = None, segmentation=METHOD, threads=THREADS) -> dict:
+    """Ajusta scaler, KMeans e os dois XGBoost; devolve o bundle para o registro.
+
+    df: features atuais (segmentação). training_set: linhas com label_7d/label_30d
+    (labels.py); se omitido, df precisa trazer as labels. previous: bundle da
+    versão anterior, para manter a numeração dos segmentos.
+    """
+    training_set = df if training_set is None else training_set
+    _check_labels(training_set)
+
+    # ============================================
+    # 1. Segmentação de Clientes (KMeans)
+    # ============================================
+    segments = align_segmentation(fit_segmentation(df, segmentation), previous)
+
+    # ============================================
+    # 2. Previsão de Recompra (XGBoost)
+    # ============================================
+    boosters, training = fit_boosters(training_set, threads)
+
+    return make_bundle(segments, boosters, training)
+
+
+if __name__ == "__main__":
+    from data_access import ConnectionPool, read_features_parallel
+    from ids import compact, read_parquet
+    from labels import training_set_from_sql
+    from model_registry import load_models, save_models
+
+    parser = argparse.ArgumentParser(description="Treina segmentação e modelos de recompra.")
+    parser.add_argument("--training-set", default=None,
+                        help="Parquet gerado por labels.py (padrão: gera a partir de silver.purchases_clean)")
+    parser.add_argument("--segmentation", choices=["sample", "minibatch", "full"], default=METHOD)
+    args = parser.parse_args()
+
+    try:
+        previous = load_models()
+    except FileNotFoundError:
+        previous = None   # primeiro treino: numeração do próprio KMeans
+
+    with ConnectionPool() as pool:
+        df = read_features_parallel(pool)
+        if args.training_set:
+            training_set = compact(read_parquet(args.training_set))
+        else:
+            with pool.connection() as conn:
+                training_set = training_set_from_sql(conn, pool.settings)
+
+    bundle = train_models(df, training_set, previous, args.segmentation)
+    save_models(bundle)
@@ -0,0 +1,152 @@
+# ============================================
+# RoadWise - ClickBus | Treino dos Modelos de Recompra
+# Todos os horizontes em paralelo sobre uma única matriz float32
+# ============================================
+#
+#   - a matriz de features é montada uma vez (float32 contígua); os cortes
+#     dos histogramas (QuantileDMatrix, tree_method="hist") são calculados uma
+#     vez, na matriz do primeiro horizonte, e os demais os reaproveitam (ref=).
+#     Cada horizonte ainda tem a sua cópia quantizada (a label mora no DMatrix
+#     e o XGBoost não fatia QuantileDMatrix): são N passes de binning e N
+#     cópias em memória durante o treino, mas só um cálculo de quantis;
+#   - um único split de validação, por cliente (os snapshots de um mesmo
+#     cliente ficam todos do mesmo lado), serve a todos os horizontes para
+#     early stopping e métricas;
+#   - os horizontes treinam ao mesmo tempo, dividindo um orçamento de threads:
+#     o tempo total fica perto do horizonte mais lento.
+#
+# Novos horizontes (60d, 90d, ...) entram só em labels.HORIZONS.
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import log_loss, roc_auc_score
+
+from ids import id_hash
+from instrumentation import stage
+
+XGB_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "logloss",
+    "tree_method": "hist",
+    "max_depth": 5,
+    "eta": 0.1,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "max_bin": 256,
+    "seed": 42,
+}
+NUM_BOOST_ROUND = 400
+EARLY_STOPPING_ROUNDS = 30
+VALID_SIZE = 0.3
+THREADS = os.cpu_count() or 1   # orçamento total, dividido entre os horizontes
+
+
+def feature_matrix(df: pd.DataFrame, features) -> np.ndarray:
+    return np.ascontiguousarray(df[features].fillna(0).to_numpy(dtype=np.float32))
+
+
+def holdout_mask(customer_ids, valid_size=VALID_SIZE, seed=42) -> np.ndarray:
+    """Split por cliente via hash: estável entre execuções e sem vazamento entre snapshots.
+
+    O hash sai direto dos 32 bytes do customer_id (ids.id_hash), sem passar por hex.
+    """
+    bucket = id_hash(customer_ids, seed) % np.uint64(10_000)
+    return bucket < int(valid_size * 10_000)
+
+
+def quantized_matrices(X_train, X_valid, splits: dict, max_bin=256, nthread=THREADS) -> dict:
+    """{horizonte: (dtrain, dvalid)}; os quantis saem só da matriz do primeiro horizonte.
+
+    splits: {horizonte: (y_train, y_valid)}. O binning usa o orçamento inteiro
+    de threads, antes do treino em paralelo.
+    """
+    out, ref = {}, None
+    for horizon, (y_train, y_valid) in splits.items():
+        if ref is None:
+            dtrain = xgb.QuantileDMatrix(X_train, label=y_train, max_bin=max_bin, nthread=nthread)
+            ref = dtrain
+        else:
+            dtrain = xgb.QuantileDMatrix(X_train, label=y_train, ref=ref, nthread=nthread)
+        # a validação precisa referenciar o próprio dtrain (exigência do xgb.train)
+        out[horizon] = (dtrain, xgb.QuantileDMatrix(X_valid, label=y_valid, ref=dtrain, nthread=nthread))
+    return out
+
+
+def _fit_one(horizon, y_train, y_valid, dtrain, dvalid, params, nthread):
+    start = time.perf_counter()
+    params = {**params, "nthread": nthread}
+    with stage(f"train_{horizon}", rows_in=len(y_train) + len(y_valid)) as s:
+        booster = xgb.train(
+            params, dtrain, num_boost_round=NUM_BOOST_ROUND,
+            evals=[(dvalid, "valid")], early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+            verbose_eval=False,
+        )
+        best = booster.best_iteration + 1
+        booster = booster[:best]   # grava só as árvores até o melhor ponto
+        prob = booster.predict(dvalid)
+        s.rows_out = len(prob)
+
+    metrics = {
+        "auc": float(roc_auc_score(y_valid, prob)) if 0 < y_valid.sum() < len(y_valid) else None,
+        "logloss": float(log_loss(y_valid, prob, labels=[0, 1])),
+        "trees": int(best),
+        "positive_rate": float(y_train.mean()),
+        "n_train": int(len(y_train)),
+        "n_valid": int(len(y_valid)),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    return booster, metrics
+
+
+def train_horizons(training_set: pd.DataFrame, features, labels: dict,
+                   params=XGB_PARAMS, threads=THREADS, valid_size=VALID_SIZE):
+    """Treina um booster por horizonte. labels: {horizonte: coluna de label}.
+
+    Devolve ({horizonte: Booster}, {horizonte: métricas de validação}).
+    """
+    start = time.perf_counter()
+    X = feature_matrix(training_set, features)
+    valid = holdout_mask(training_set["customer_id"], valid_size)
+    X_train, X_valid = X[~valid], X[valid]
+
+    splits = {}
+    for horizon, label in labels.items():
+        y = training_set[label].to_numpy().astype(np.float32)
+        if y[~valid].min() == y[~valid].max():
+            raise ValueError(f"Label {label} sem as duas classes no treino; não há o que aprender.")
+        splits[horizon] = (y[~valid], y[valid])
+
+    # Quantis calculados uma vez (primeiro horizonte); os demais reaproveitam os cortes
+    with stage("quantize", rows_in=len(X)) as s:
+        matrices = quantized_matrices(X_train, X_valid, splits, params.get("max_bin", 256), threads)
+        s.rows_out = len(X)
+    del X, X_train, X_valid
+    per_model = max(1, threads // len(labels))
+
+    with ThreadPoolExecutor(max_workers=len(labels)) as executor:
+        futures = {
+            horizon: executor.submit(
+                _fit_one, horizon, *splits[horizon], *matrices[horizon], params, per_model,
+            )
+            for horizon in labels
+        }
+        results = {horizon: future.result() for horizon, future in futures.items()}
+
+    boosters = {h: booster for h, (booster, _) in results.items()}
+    metrics = {h: m for h, (_, m) in results.items()}
+    for horizon, m in metrics.items():
+        auc = f"{m['auc']:.3f}" if m["auc"] is not None else "n/a"
+        print(
+            f">> Modelo {horizon}: AUC {auc} | logloss {m['logloss']:.4f} | "
+            f"{m['trees']} árvores em {m['seconds']:.2f}s"
+        )
+    print(
+        f">> Treino dos horizontes concluído em {time.perf_counter() - start:.2f}s "
+        f"({len(labels)} em paralelo, {per_model} threads cada)"
+    )
+    return boosters, metrics
@@ -50,3 +50,7 @@ CREATE INDEX IX_silver_purchases_clean_customer_datetime
 
 CREATE INDEX IX_silver_purchases_clean_dest
     ON silver.purchases_clean (customer_id, place_destination_departure);
+
+-- Delta (scripts/ml/incremental.py): compras novas e compras saindo das janelas
+CREATE INDEX IX_silver_purchases_clean_datetime
+    ON silver.purchases_clean (purchase_datetime) INCLUDE (customer_id);